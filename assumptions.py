@@ -39,7 +39,8 @@
         'max_amp':                                     0.4,
         'unconditional_pi2_pulse_linearity_amp_limit': 0.31, # updated by [rabi_probe]
         'unconditional_pi_pulse_linearity_amp_limit':  0.24, # updated by [rabi_probe]
-        'conditional_pi_pulse_linearity_amp_limit':    0.21  # updated by [rabi_probe]
+        'conditional_pi_pulse_linearity_amp_limit':    0.21, # updated by [rabi_probe]
+        # 'precision': 0.01 # target relative standard deviation: npoints updated by [rabi]
     },
     'ramsey': {
         'long_ro_length': 1000,   # see $readout/length?
@@ -116,7 +117,7 @@
     #     'max_amp':                                     0.4,
     #     'unconditional_pi2_pulse_linearity_amp_limit': 0.31, # updated by [rabi_probe]
     #     'unconditional_pi_pulse_linearity_amp_limit':  0.24, # updated by [rabi_probe]
-    #     'conditional_pi_pulse_linearity_amp_limit':    0.21  # updated by [rabi_probe]
+    #     'conditional_pi_pulse_linearity_amp_limit':    0.21, # updated by [rabi_probe]
     # },
     # 'ramsey': {
     #     'long_ro_length': 1000,   # see $readout/length?
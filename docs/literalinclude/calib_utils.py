@@ -1,6 +1,9 @@
 from .default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = None # Assumptions read below, e.g. {'qubit/freq'} (None: any)
+    writes = None # Assumptions updated below, e.g. {'qubit/freq'} (None: any)
+
     def handle_substitutions(self) -> None:
         # Define substitutions here
         super().handle_substitutions()
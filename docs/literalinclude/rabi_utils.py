@@ -1,6 +1,9 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'rabi/{PULSE}_linearity_amp_limit'}
+    writes = {'qubit/{PULSE}_amp'}
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
@@ -0,0 +1,467 @@
+from __future__ import annotations
+import os
+import sys
+import inspect
+import atexit
+import threading
+import traceback
+import subprocess
+from multiprocessing.connection import Listener, Client
+from typing import Callable, List
+from .log import Log
+
+class Job:
+    """Measurement submitted to a :py:class:`Backend`.
+
+    Attributes:
+        meas_path (str): Path to the Exopy measurement file.
+        returncode (int): Exit status of the measurement (``None`` while running).
+    """
+
+    def __init__(self, meas_path: str):
+        self.meas_path  = meas_path
+        self.returncode = None
+
+    def done(self) -> bool:
+        """
+        Returns:
+            ``True`` if the measurement is over.
+        """
+        return self.returncode is not None
+
+    def wait(self) -> int:
+        """Blocks until the measurement is over.
+
+        Returns:
+            Exit status of the measurement.
+        """
+        return self.returncode
+
+    def stop(self) -> None:
+        """Stops the measurement before its end."""
+
+class Backend:
+    """Runs Exopy measurements. Subclasses should override :py:meth:`Backend.submit`.
+
+    """
+
+    def submit(self, log: Log, pre: str, meas_path: str) -> Job:
+        """Starts a measurement and returns without waiting for its end.
+
+        Args:
+            log: Logging object.
+            pre: Prefix of the log entries.
+            meas_path: Path to the Exopy measurement file (``NAME.meas.ini``).
+
+        Returns:
+            Measurement job.
+        """
+        raise NotImplementedError
+
+    def execute(self, log: Log, pre: str, meas_path: str) -> int:
+        """Runs a measurement and waits for its end.
+
+        Args:
+            log: Logging object.
+            pre: Prefix of the log entries.
+            meas_path: Path to the Exopy measurement file (``NAME.meas.ini``).
+
+        Returns:
+            Exit status of the measurement.
+        """
+        returncode = self.submit(log, pre, meas_path).wait()
+        if returncode:
+            log.warn(pre, f'Measurement exited with status {returncode}')
+        return returncode
+
+    def close(self) -> None:
+        """Releases the resources held by the backend."""
+
+######################################################################
+
+class SubprocessJob(Job):
+    def __init__(self, meas_path: str, process: subprocess.Popen, output):
+        super().__init__(meas_path)
+        self.process = process
+        self.output  = output
+
+    def done(self) -> bool:
+        self.returncode = self.process.poll()
+        if self.returncode is not None:
+            self.output.close()
+        return super().done()
+
+    def wait(self) -> int:
+        self.process.wait()
+        self.done()
+        return self.returncode
+
+    def stop(self) -> None:
+        # Exopy is the child process itself (no shell): make sure it no
+        # longer drives the instruments before the next measurement
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.wait()
+
+class SubprocessBackend(Backend):
+    """Spawns ``python -m exopy -s --measurement-execute NAME.meas.ini``
+    for each measurement (default backend). The output of Exopy is written
+    to ``exopy.log`` next to ``NAME.meas.ini`` (in the calibration workspace).
+
+    Args:
+        python (str): Optional. Python interpreter of the Exopy environment
+                      (the current one by default).
+    """
+
+    def __init__(self, python: str = sys.executable):
+        self.python = python
+
+    def submit(self, log: Log, pre: str, meas_path: str) -> Job:
+        output  = open(os.path.join(os.path.dirname(meas_path), 'exopy.log'), 'ab')
+        try:
+            process = subprocess.Popen([self.python, '-m', 'exopy', '-s', '--measurement-execute', meas_path],
+                                       stdout=output, stderr=subprocess.STDOUT)
+        except:
+            output.close()
+            raise
+        return SubprocessJob(meas_path, process, output)
+
+######################################################################
+
+class ServerJob(Job):
+    def __init__(self, meas_path: str, backend: ServerBackend):
+        super().__init__(meas_path)
+        self.backend = backend
+
+    def done(self) -> bool:
+        if self.returncode is None:
+            try:
+                if self.backend.conn.poll():
+                    self.returncode = self.backend.conn.recv()
+            except (EOFError, OSError): # The server died or has been stopped
+                self.backend.close()
+                self.returncode = -1
+        return super().done()
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            try:
+                self.returncode = self.backend.conn.recv()
+            except (EOFError, OSError): # The server died or has been stopped
+                self.backend.close()
+                self.returncode = -1
+        return self.returncode
+
+    def stop(self) -> None:
+        # Exopy cannot be interrupted through the IPC channel while
+        # measuring: stop the server, a new one is started on demand
+        self.backend.close()
+        self.returncode = -1
+
+class ServerBackend(Backend):
+    """Sends measurements to a resident worker process which keeps the Exopy
+    application loaded (workbench, plugins and instrument drivers, see
+    :py:class:`ExopyServer`), instead of starting a new interpreter and
+    reloading Exopy for each measurement. The worker is started on the
+    first measurement and stopped by :py:meth:`ServerBackend.close`.
+
+    If the worker cannot load Exopy, it reports the error instead of
+    accepting measurements, and the backend falls back to a
+    :py:class:`SubprocessBackend` with the same interpreter.
+
+    Only one measurement runs at a time: jobs must be waited for in order.
+
+    Args:
+        python (str): Optional. Python interpreter of the Exopy environment
+                      (the current one by default).
+        timeout (float): Optional. Maximum delay in seconds for the worker to
+                         connect and load Exopy.
+
+    Attributes:
+        process (subprocess.Popen): Worker process (``None`` if not started).
+        conn: Connection to the worker process.
+        fallback (SubprocessBackend): Backend used if the worker cannot load
+                                      Exopy (``None`` otherwise).
+    """
+
+    def __init__(self, python: str = sys.executable, timeout: float = 120.0):
+        self.python   = python
+        self.timeout  = timeout
+        self.process  = None
+        self.conn     = None
+        self.fallback = None
+
+    def start(self, log: Log, pre: str) -> ServerBackend:
+        """Starts the worker process, unless it is already running, and waits
+        until Exopy is loaded.
+
+        Args:
+            log: Logging object.
+            pre: Prefix of the log entries.
+        """
+        if self.process is not None and self.process.poll() is None:
+            return self
+        authkey  = os.urandom(32)
+        listener = Listener(('localhost', 0), authkey=authkey)
+        log.info(pre, f'Starting Exopy measurement server on port {listener.address[1]}')
+        env = {**os.environ, 'QUALIB_AUTHKEY': authkey.hex()}
+        self.process = subprocess.Popen([self.python, '-m', 'qualib.backends', str(listener.address[1])], env=env)
+
+        # Accept the connection of the worker without blocking forever if it fails to start
+        accepted = []
+        thread   = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        listener.close()
+        assert accepted, f'Exopy measurement server did not connect within {self.timeout} s'
+        self.conn = accepted[0]
+        atexit.register(self.close)
+        return self.connected(log, pre)
+
+    def connected(self, log: Log, pre: str) -> ServerBackend:
+        """Waits for the first message of the worker: ``None`` once Exopy is
+        loaded, or the error raised while loading it. In the latter case, the
+        worker is stopped and the next measurements use :py:attr:`fallback`.
+
+        Args:
+            log: Logging object.
+            pre: Prefix of the log entries.
+        """
+        try:
+            error = self.conn.recv() if self.conn.poll(self.timeout) else f'Not ready within {self.timeout} s'
+        except (EOFError, OSError) as e: # The server died while loading Exopy
+            error = f'{type(e).__name__}: {e}'
+        if error:
+            log.warn(pre, f'Exopy measurement server unavailable ({error}), '
+                          f'starting a new Exopy process for each measurement')
+            self.close()
+            self.fallback = SubprocessBackend(self.python)
+        return self
+
+    def submit(self, log: Log, pre: str, meas_path: str) -> Job:
+        if not self.fallback:
+            self.start(log, pre)
+        if self.fallback:
+            return self.fallback.submit(log, pre, meas_path)
+        self.conn.send(meas_path)
+        return ServerJob(meas_path, self)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait()
+            self.process = None
+        atexit.unregister(self.close)
+
+class ExopyServer:
+    """Exopy application loaded once in the worker process of :py:class:`ServerBackend`:
+    the workbench and its plugins (measurement, tasks, instruments and their
+    drivers) are registered and started at creation, as by ``python -m exopy``,
+    but without the main window. Each measurement file is then loaded by the
+    measurement plugin and run by its processor, in the Qt event loop of the
+    worker (Exopy reports the progress of measurements through it).
+
+    Attributes:
+        workbench: Exopy workbench.
+        plugin: Measurement plugin (``exopy.measurement``).
+        app: Qt application (a singleton, created once).
+        measurement: Running measurement (``None`` between measurements).
+        returncode (int): Exit status of the last measurement.
+        over (threading.Event): Set at the end of each measurement.
+    """
+
+    def __init__(self):
+        import enaml # Imported by the worker only
+        from argparse import Namespace
+        from enaml.qt.qt_application import QtApplication
+        from enaml.workbench.workbench import Workbench
+        with enaml.imports():
+            from enaml.workbench.core.core_manifest import CoreManifest
+            from enaml.workbench.ui.ui_manifest import UIManifest
+            from exopy.app.app_manifest import AppManifest
+            from exopy.app.states.manifest import StateManifest
+            from exopy.app.dependencies.manifest import DependenciesManifest
+            from exopy.app.errors.manifest import ErrorsManifest
+            from exopy.app.icons.manifest import IconManagerManifest
+            from exopy.app.preferences.manifest import PreferencesManifest
+            from exopy.app.log.manifest import LogManifest
+            from exopy.app.packages.manifest import PackagesManifest
+            from exopy.instruments.manifest import InstrumentManagerManifest
+            from exopy.tasks.manifest import TasksManagerManifest
+            from exopy.measurement.manifest import MeasureManifest
+            from exopy.measurement.monitors.text_monitor.manifest import TextMonitorManifest
+
+        self.app       = QtApplication()
+        self.workbench = Workbench()
+        for manifest in (CoreManifest, UIManifest, AppManifest, StateManifest, ErrorsManifest,
+                         PreferencesManifest, IconManagerManifest, LogManifest, PackagesManifest,
+                         DependenciesManifest, InstrumentManagerManifest, TasksManagerManifest,
+                         MeasureManifest, TextMonitorManifest):
+            self.workbench.register(manifest())
+        self.workbench.get_plugin('exopy.app').run_app_startup(
+            Namespace(nocapture=True, workspace='measurement', reset_app_folder=False))
+        self.measurement = None
+        self.returncode  = None
+        self.over        = threading.Event()
+        self.plugin      = self.workbench.get_plugin('exopy.measurement')
+        self.plugin.processor.observe('active', self.finished)
+
+    def start(self, meas_path: str) -> None:
+        """Loads a measurement file and starts the measurement (in the Qt event loop).
+
+        Args:
+            meas_path: Path to the Exopy measurement file (``NAME.meas.ini``).
+        """
+        from exopy.measurement.measurement import Measurement
+
+        try:
+            measurement, errors = Measurement.load(self.plugin, meas_path)
+            assert measurement is not None, f'Unable to load "{meas_path}": {errors}'
+            self.measurement = measurement
+            self.plugin.processor.start_measurement(measurement)
+        except Exception:
+            traceback.print_exc()
+            self.measurement = None
+            self.returncode  = 1
+            self.over.set()
+
+    def finished(self, change: dict) -> None:
+        """Called when the processor becomes idle: the measurement is over."""
+        if change['value'] or self.measurement is None:
+            return
+        self.returncode  = 0 if self.measurement.status == 'COMPLETED' else 1
+        self.measurement = None
+        self.over.set()
+
+    def execute(self, meas_path: str) -> int:
+        """Runs a measurement (from another thread than the Qt event loop).
+
+        Args:
+            meas_path: Path to the Exopy measurement file (``NAME.meas.ini``).
+
+        Returns:
+            Exit status of the measurement (``0`` if completed).
+        """
+        from enaml.application import deferred_call
+
+        self.over.clear()
+        deferred_call(self.start, meas_path)
+        self.over.wait()
+        return self.returncode
+
+    def serve(self, conn) -> None:
+        """Executes each ``NAME.meas.ini`` path received on ``conn`` and sends
+        back its exit status, until the connection is closed.
+
+        Args:
+            conn: Connection to the :py:class:`ServerBackend`.
+        """
+        from enaml.application import deferred_call
+
+        def receive():
+            while True:
+                try:
+                    meas_path = conn.recv()
+                except (EOFError, OSError):
+                    break
+                conn.send(self.execute(meas_path))
+            deferred_call(self.app.stop)
+
+        threading.Thread(target=receive, daemon=True).start()
+        self.app.start()
+        self.workbench.unregister('exopy.app')
+
+def serve(port: int, authkey: bytes) -> None:
+    """Worker of :py:class:`ServerBackend`: connects to ``localhost:port``,
+    loads Exopy once (see :py:class:`ExopyServer`), then sends ``None`` and
+    executes the received measurement files. If Exopy cannot be loaded, sends
+    the error instead, and exits.
+
+    Args:
+        port: Port of the listener of the :py:class:`ServerBackend`.
+        authkey: Authentication key of the connection.
+    """
+    conn = Client(('localhost', port), authkey=authkey)
+    try:
+        server = ExopyServer()
+    except Exception as e:
+        traceback.print_exc()
+        conn.send(f'{type(e).__name__}: {e}')
+        conn.close()
+        sys.exit(1)
+    conn.send(None) # Ready
+    server.serve(conn)
+
+######################################################################
+
+class FakeJob(Job):
+    def __init__(self, meas_path: str, thread: threading.Thread):
+        super().__init__(meas_path)
+        self.thread  = thread
+        self.stopped = threading.Event()
+
+    def done(self) -> bool:
+        if self.returncode is None and not self.thread.is_alive():
+            self.returncode = 0
+        return super().done()
+
+    def wait(self) -> int:
+        self.thread.join()
+        self.done()
+        return self.returncode
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.returncode = -1
+
+class FakeBackend(Backend):
+    """Local backend for tests without instruments: each measurement calls
+    ``generator(meas_path)`` (e.g. to write a synthetic HDF5 file) in a
+    thread, after an optional ``duration``. If ``generator`` is a generator
+    function (e.g. writing one point per iteration), the measurement can be
+    stopped between two iterations.
+
+    Args:
+        generator (Callable): Optional. Function called with the path to the
+                              Exopy measurement file.
+        duration (float): Optional. Simulated duration of each measurement in seconds.
+
+    Attributes:
+        jobs (list): Paths to the Exopy measurement files submitted so far.
+    """
+
+    def __init__(self, generator: Callable[[str], None] = None, duration: float = 0.0):
+        self.generator = generator
+        self.duration  = duration
+        self.jobs: List[str] = []
+
+    def submit(self, log: Log, pre: str, meas_path: str) -> Job:
+        self.jobs.append(meas_path)
+        job = None
+        def measure():
+            job.stopped.wait(self.duration)
+            try:
+                if self.generator and not job.stopped.is_set():
+                    steps = self.generator(meas_path)
+                    if inspect.isgenerator(steps):
+                        for _ in steps:
+                            if job.stopped.is_set():
+                                steps.close()
+                                break
+            except:
+                log.error(pre, *traceback.format_exc().splitlines())
+                job.returncode = 1
+        job = FakeJob(meas_path, threading.Thread(target=measure, daemon=True))
+        job.thread.start()
+        return job
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]), bytes.fromhex(os.environ['QUALIB_AUTHKEY']))
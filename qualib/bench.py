@@ -0,0 +1,319 @@
+"""Benchmark of qualib's own overhead: runs calibration sequences with a
+:py:class:`qualib.backends.FakeBackend` writing synthetic HDF5 files (see
+:py:class:`Synthetic`) instead of Exopy, and reports per-phase timings and
+peak memory as JSON::
+
+    python -m qualib.bench --scheme calibration_scheme.py --repeat 4 --output bench.json
+    python -m qualib.bench --sweep 50 --points 401
+
+``python -m qualib.bench --imports`` checks the startup time of ``qualib.main``
+instead (see :py:func:`import_time`), and exits with status 1 if it exceeds
+:py:data:`IMPORT_BUDGET` or imports a heavy dependency.
+"""
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+from typing import List, Dict, Any
+import numpy as np
+
+from .log import Log
+from .load import load_calibration_scheme, load_assumptions
+from .backends import FakeBackend
+from .profiling import load_profile
+
+# Parameters of the simulated device (units of the assumptions: GHz, ns)
+DEVICE = {
+    'readout_freq': 6.34,
+    'qubit_freq':   4.4402,
+    'rabi_period':  0.2,     # Amplitude
+    'T1':           6e3,
+    'T2':           13e3,
+    'detuning':     5e-4     # ramsey_t2
+}
+
+def device_assumptions(assumptions: dict, folder: str) -> dict:
+    """
+    Args:
+        assumptions: Initial assumptions.
+        folder: Directory of the synthetic HDF5 files.
+
+    Returns:
+        Assumptions of a run on synthetic data: ``default_path`` set to ``folder``,
+        no retries, and the Ramsey detuning of the simulated device (:py:data:`DEVICE`).
+    """
+    return {**assumptions, 'default_path': folder, 'retries': 0,
+            'ramsey_t2': {**assumptions.get('ramsey_t2', {}), 'delta': DEVICE['detuning']}}
+
+def iq(signal: np.ndarray, noise: float, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        signal: Real signal.
+        noise: Standard deviation of the Gaussian noise.
+        rng: Random generator.
+
+    Returns:
+        ``I1``, ``Q1`` (signal along a fixed direction, plus noise) and ``I2``, ``Q2`` (reference) datasets.
+    """
+    return {'data/I1': 0.8*signal + noise*rng.standard_normal(signal.shape),
+            'data/Q1': 0.6*signal + noise*rng.standard_normal(signal.shape),
+            'data/I2': noise*rng.standard_normal(signal.shape),
+            'data/Q2': noise*rng.standard_normal(signal.shape)}
+
+class Synthetic:
+    """Writes synthetic measurement files in place of Exopy (``generator`` of
+    :py:class:`qualib.backends.FakeBackend`): Rabi oscillations, Lorentzians,
+    exponential decays, Ramsey fringes and resonator circles with noise, with
+    the datasets read by the report templates.
+
+    Args:
+        folder (str): Directory of the HDF5 files (``default_path`` of the assumptions).
+        points (int): Optional. Number of points of each sweep.
+        noise (float): Optional. Standard deviation of the noise, relative to the signal.
+        seed (int): Optional. Seed of the random generator (the files only
+                    depend on the seed and on their order).
+        device (dict): Optional. Parameters of the simulated device (:py:data:`DEVICE` by default).
+    """
+
+    def __init__(self, folder: str, points: int = 201, noise: float = 0.01,
+                 seed: int = 0, device: dict = None):
+        self.folder = folder
+        self.points = points
+        self.noise  = noise
+        self.seed   = seed
+        self.device = {**DEVICE, **(device or {})}
+        self.count  = 0
+
+    def __call__(self, meas_path: str) -> None:
+        import h5py
+
+        name = os.path.basename(meas_path)[:-len('.meas.ini')]
+        with open(meas_path, encoding='utf-8') as f:
+            filename = re.search(r'^\s*filename = (.*)$', f.read(), re.MULTILINE).group(1).strip()
+        assert hasattr(self, name), f'No synthetic data for "{name}"'
+        rng = np.random.default_rng([self.seed, self.count])
+        self.count += 1
+        with h5py.File(os.path.join(self.folder, filename), 'w') as f:
+            f.create_group('data')
+            f.create_group('parameters')
+            for key, val in getattr(self, name)(rng).items():
+                f[key] = val
+
+    def rabi(self, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        amp = np.linspace(0, 0.4, self.points)
+        return {'data/amp': amp,
+                **iq(np.cos(2*np.pi*amp/self.device['rabi_period']) + 0.5, self.noise, rng)}
+
+    rabi_probe = rabi
+
+    def t1_qubit(self, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        wait = np.linspace(5, 8e3, self.points)
+        return {'data/wait': wait,
+                **iq(np.exp(-wait*4/self.device['T1']) + 0.3, self.noise, rng)}
+
+    def ramsey(self, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        wait = np.linspace(5, 7.5e3, self.points)
+        freq = self.device['qubit_freq'] + np.linspace(-0.7e-3, 0.8e-3, 11) # Qubit between two points
+        t, f = np.meshgrid(wait*4, freq)
+        return {'data/wait': wait, 'parameters/freq': freq,
+                **iq(np.exp(-t/self.device['T2'])*np.cos(2*np.pi*t*np.abs(f-self.device['qubit_freq'])),
+                     self.noise, rng)}
+
+    ramsey_probe = ramsey
+
+    def ramsey_t2(self, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        wait = np.linspace(4, 5e3, self.points)
+        signal = np.exp(-wait*4/self.device['T2'])*np.cos(2*np.pi*wait*4*self.device['detuning'] + 0.2)
+        return {'data/wait': wait, **iq(signal[None], self.noise, rng)}
+
+    def spectro_qubit(self, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        freq = self.device['qubit_freq'] + np.linspace(-37.5e-3, 37.5e-3, self.points)
+        hwhm = 2e-3
+        return {'parameters/freq': freq,
+                **iq(1/(1 + ((freq-self.device['qubit_freq'])/hwhm)**2), self.noise, rng)}
+
+    def spectro_ro(self, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        from .circle_fit import synthetic
+
+        fr = self.device['readout_freq'] + np.linspace(-5e-3, 5e-3, self.points)
+        z  = synthetic(fr, fr=self.device['readout_freq'], delay=2.0, noise=self.noise, rng=rng)
+        z *= np.exp(-1j*fr*94*2*np.pi) # Electrical delay removed by the template
+        return {'parameters/freq': fr, 'data/I': z.real, 'data/Q': z.imag}
+
+def sweep(scheme: list, npoints: int, min_flux: float = -0.5, max_flux: float = 0.5) -> list:
+    """
+    Args:
+        scheme: Calibration sequence.
+        npoints: Number of flux points.
+        min_flux, max_flux: Optional. Flux range.
+
+    Returns:
+        Calibration sequence repeated for each flux (``$flux`` substitution),
+        as run by :py:func:`qualib.flux_sweep.flux_sweep`.
+    """
+    seq = []
+    for flux in np.linspace(min_flux, max_flux, npoints):
+        for calibration in scheme:
+            substitutions = {**(calibration.get('substitutions') or {}), '$flux': str(flux)}
+            seq.append({**calibration, 'substitutions': substitutions})
+    return seq
+
+def run(scheme: list, assumptions: dict, points: int = 201, memory: bool = True,
+        seed: int = 0, **kwargs) -> Dict[str, Any]:
+    """Runs a calibration sequence on synthetic data in a temporary directory.
+
+    Args:
+        scheme: Calibration sequence.
+        assumptions: Initial assumptions (see :py:func:`device_assumptions`).
+        points: Optional. Number of points of each sweep (see :py:class:`Synthetic`).
+        memory: Optional. Run the sequence a second time with :py:mod:`tracemalloc`
+                to measure the peak memory (tracing slows the execution down,
+                so timings come from the first run).
+        seed: Optional. Seed of the synthetic data.
+        kwargs: Optional. Keyword arguments of :py:meth:`qualib.main.Qualib.run_all`
+                (e.g. ``pipeline``, ``workers``).
+
+    Returns:
+        Machine-readable results: total time, time spent measuring (synthetic
+        files), qualib's overhead, per-phase timings (see
+        :py:class:`qualib.profiling.Profile`) and peak memory (bytes).
+    """
+    from .main import Qualib # Circular import
+
+    cwd = os.getcwd()
+    results = {'length': len(scheme), 'points': points, 'options': kwargs}
+    try:
+        for traced in ([False, True] if memory else [False]):
+            with tempfile.TemporaryDirectory(prefix='qualib_bench_') as tmp:
+                os.chdir(tmp)
+                try:
+                    for folder in ('logs', 'reports', 'data'):
+                        os.makedirs(folder)
+                    backend = FakeBackend(Synthetic(os.path.join(tmp, 'data'), points, seed=seed))
+                    if traced:
+                        tracemalloc.start()
+                    start = time.perf_counter()
+                    with contextlib.redirect_stdout(sys.stderr): # Analysis code output and profile summary
+                        Qualib(backend).run_all(json.loads(json.dumps(scheme)),
+                                                device_assumptions(assumptions, os.path.join(tmp, 'data')),
+                                                **kwargs)
+                    total = time.perf_counter()-start
+                    if traced:
+                        results['peak_memory'] = tracemalloc.get_traced_memory()[1]
+                        continue
+                    profile = [name for name in os.listdir('logs') if name.endswith('.profile.json')][0]
+                    profile = load_profile(os.path.join('logs', profile))
+                    measure = profile['phases'].get('measure', {}).get('total', 0.0)
+                    results.update({'total': total, 'measure': measure, 'overhead': total-measure,
+                                    'per_calibration': (total-measure)/len(scheme),
+                                    'phases': profile['phases'], 'calibrations': profile['calibrations']})
+                finally:
+                    tracemalloc.stop()
+                    os.chdir(cwd) # Before removing the directory
+    finally:
+        os.chdir(cwd)
+    return results
+
+# Startup time of qualib.main: cumulative import time (seconds, best of 3)
+# and dependencies that should only be imported on first use
+IMPORT_BUDGET = 0.05
+HEAVY_MODULES = ('numpy', 'scipy', 'nbformat', 'requests', 'h5py', 'matplotlib', 'difflib')
+
+def import_time(module: str = 'qualib.main', repeat: int = 3) -> Dict[str, Any]:
+    """Measures the import time of a module in fresh interpreters, with ``python -X importtime``.
+
+    Args:
+        module: Optional. Module to import.
+        repeat: Optional. Number of measurements (the fastest is kept).
+
+    Returns:
+        Cumulative import time (seconds), budget, heavy dependencies imported
+        (see :py:data:`HEAVY_MODULES`), slowest modules (cumulative time) and
+        ``passed`` (within budget, without heavy dependencies).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env  = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))}
+    best = None
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                env=env, capture_output=True, text=True, check=True).stderr
+        times = {} # Cumulative import time (seconds) of the modules imported by ``module``
+        for line in stderr.splitlines():
+            match = re.match(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$', line)
+            if not match:
+                continue
+            times[match.group(4)] = int(match.group(2))*1e-6
+            if len(match.group(3)) == 1 and match.group(4) != module:
+                times = {} # Top-level import of the interpreter startup (e.g. site)
+        if best is None or times[module] < best[module]:
+            best = times
+    heavy   = sorted({name.split('.')[0] for name in best} & set(HEAVY_MODULES))
+    slowest = sorted(best.items(), key=lambda item: -item[1])[1:11]
+    return {'module': module, 'time': best[module], 'budget': IMPORT_BUDGET, 'heavy': heavy,
+            'slowest': dict(slowest), 'passed': best[module] <= IMPORT_BUDGET and not heavy}
+
+def environment() -> Dict[str, str]:
+    """
+    Returns:
+        Versions of qualib, Python and NumPy, and platform.
+    """
+    try:
+        from importlib.metadata import version
+        qualib_version = version('qualib')
+    except Exception:
+        qualib_version = ''
+    return {'qualib': qualib_version, 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform()}
+
+def main(args: List[str] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(prog='python -m qualib.bench', description=__doc__.splitlines()[0])
+    parser.add_argument('--scheme', default='calibration_scheme.py', help='calibration sequence')
+    parser.add_argument('--assumptions', default='assumptions.py', help='initial assumptions')
+    parser.add_argument('--repeat', type=int, default=1, help='number of repetitions of the sequence')
+    parser.add_argument('--sweep', type=int, default=0, help='number of flux points (flux sweep)')
+    parser.add_argument('--points', type=int, default=201, help='number of points of each sweep')
+    parser.add_argument('--pipeline', action='store_true', help='pipelined post-processing')
+    parser.add_argument('--workers', type=int, default=0, help='concurrent processing (scheduler)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    parser.add_argument('--imports', action='store_true', help='check the startup time of qualib.main')
+    parser.add_argument('--output', default='', help='JSON output file (standard output by default)')
+    args = parser.parse_args(args)
+
+    if args.imports:
+        results = {'environment': environment(), **import_time()}
+    else:
+        import matplotlib
+        matplotlib.use('Agg') # No display
+
+        log = Log()
+        log.initialize('bench')
+        log.path = os.devnull # Loading messages only
+        scheme, _   = load_calibration_scheme(log, args.scheme)
+        assumptions = load_assumptions(log, args.assumptions)
+        scheme = scheme*args.repeat
+        if args.sweep:
+            scheme = sweep(scheme, args.sweep)
+
+        results = {'environment': environment(), 'scheme': args.scheme, 'repeat': args.repeat, 'sweep': args.sweep,
+                   **run(scheme, assumptions, args.points, not args.no_memory, pipeline=args.pipeline, workers=args.workers)}
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output+'\n')
+    else:
+        print(output)
+    if args.imports and not results['passed']:
+        parser.exit(1, f'qualib.main startup: {results["time"]:.3f} s (budget: {IMPORT_BUDGET} s), '
+                       f'heavy dependencies: {", ".join(results["heavy"]) or "none"}\n')
+    return results
+
+if __name__ == '__main__':
+    main()
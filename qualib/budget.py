@@ -0,0 +1,46 @@
+from __future__ import annotations
+import math
+from typing import Dict
+
+LIMITS   = {'npoints': (25, 401), 'averaging': (100, 100_000)} # Bounds of the budgets, by parameter name
+DEADBAND = 1.25 # No change while the precision is within this factor of the target
+MAX_STEP = 2.0  # Maximum factor on the number of shots from one calibration to the next
+
+def shots_factor(precision: float, target: float) -> float:
+    """
+    Args:
+        precision: Largest relative standard deviation of the optimized
+                   parameters (``_opt`` and ``_cov``) of the last calibration.
+        target: Target relative standard deviation.
+
+    Returns:
+        Factor on the number of shots (``npoints`` times ``averaging``) expected
+        to bring the relative standard deviation to ``target``, as it scales with
+        the inverse square root of the number of shots. ``1`` while ``precision``
+        is within :py:data:`DEADBAND` of ``target``; at most :py:data:`MAX_STEP`
+        (or its inverse), so that the budget converges over successive
+        calibrations instead of following the noise of a single fit.
+    """
+    if target/DEADBAND <= precision <= target*DEADBAND:
+        return 1.0
+    return min(max((precision/target)**2, 1/MAX_STEP), MAX_STEP)
+
+def allocate(budget: Dict[str, int], factor: float) -> Dict[str, int]:
+    """Spreads a factor on the number of shots over the budget (e.g. ``npoints``
+    and ``averaging``), equally in logarithm, within :py:data:`LIMITS`: the part of
+    the factor that a bounded parameter cannot take is carried over to the next ones.
+
+    Args:
+        budget: Current values by ``'section/parameter'`` key (e.g. ``'ramsey/npoints'``).
+        factor: Factor on the number of shots (see :py:func:`shots_factor`).
+
+    Returns:
+        New values by ``'section/parameter'`` key.
+    """
+    updated = {}
+    for i, (key, value) in enumerate(budget.items()):
+        low, high    = LIMITS.get(key.rpartition('/')[2], (1, math.inf))
+        new          = min(max(round(value*factor**(1/(len(budget)-i))), low), high)
+        factor      *= value/new
+        updated[key] = new
+    return updated
@@ -1,6 +1,9 @@
 from .default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = None # Assumptions read below, e.g. {'qubit/freq'} (None: any)
+    writes = None # Assumptions updated below, e.g. {'qubit/freq'} (None: any)
+
     def handle_substitutions(self) -> None:
         # Define substitutions here
         super().handle_substitutions()
@@ -8,6 +11,10 @@ class Calibration(DefaultCalibration):
     def pre_process(self) -> None:
         super().pre_process(mapping = {})
 
+    def alternatives(self) -> list:
+        # Alternative pre-placeholders to re-analyze with if the analysis fails
+        return []
+
     def process(self) -> None:
         super().process()
         # Update assumptions here
@@ -1,21 +1,20 @@
 from __future__ import annotations
 import re
 import traceback
-import subprocess
-import requests
-from copy import deepcopy
-import nbformat as nb
-from nbformat.v4 import new_notebook
-from nbformat.v4 import new_markdown_cell as new_md_cell
-from nbformat.v4 import new_code_cell as new_py_cell
 import json
-import numpy as np
-import scipy
-import difflib
 import sys
 import os
-from typing import List, Dict, Generator
+import time
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import List, Dict, Tuple, Optional, Any, Generator
 from ..log import Log
+from ..backends import Job
+from ..checkpoint import truncate_lines
+from ..retry import FitQualityError
+from ..budget import shots_factor, allocate
+from ..template import compile_template, keys_pattern, fields, FIELD, PLACEHOLDER
 
 def get_diff(prev: List[str], next: List[str]) -> Generator[str, None, None]:
     """Generator of diff lines between ``prev`` and ``next``.
@@ -24,6 +23,8 @@ def get_diff(prev: List[str], next: List[str]) -> Generator[str, None, None]:
         prev: First list of lines.
         next: Second list of lines.
     """
+    import difflib # Heavy dependencies are imported on first use (startup time)
+
     return (line for line in difflib.Differ().compare(prev, next)
             if line[0] in ('+', '-'))
 
@@ -53,6 +54,160 @@ def handle_magic_commands(log: Log, pre: str, line: str) -> str:
         return line
     return ''
 
+def load_header() -> list:
+    """
+    Returns:
+        Cells of the report header (``default_header.ipynb``).
+    """
+    import nbformat as nb # Imported on first use (startup time)
+
+    return nb.read(os.path.join(os.path.dirname(__file__), 'default_header.ipynb'), as_version=4).cells
+
+def get_json_log(timestamp: str) -> str:
+    """
+    Args:
+        timestamp: Timestamp used to create the log and report files.
+
+    Returns:
+        Absolute path (without extension) of the JSON log of the calibration sequence.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    root = str(root).replace('\\', '/')
+    return f'{root}/logs/{timestamp}'
+
+######################################################################
+
+class Figures(MutableMapping):
+    """Open figures of ``matplotlib.pyplot`` (``Gcf.figs``, by number), kept
+    per thread: analyses executed concurrently in worker threads (see
+    :py:class:`qualib.scheduler.Scheduler`) each have their own current figure
+    (``plt.gcf()``), and ``plt.close('all')`` only closes the figures of the
+    calling thread. Installed by :py:meth:`Kernel.isolate_figures`.
+
+    Args:
+        figs (OrderedDict): Figures already open, kept by the current thread.
+    """
+
+    def __init__(self, figs: OrderedDict):
+        self.local = threading.local()
+        self.local.figs = figs
+
+    @property
+    def figs(self) -> OrderedDict:
+        """Figures of the current thread."""
+        if not hasattr(self.local, 'figs'):
+            self.local.figs = OrderedDict()
+        return self.local.figs
+
+    def __getitem__(self, num):
+        return self.figs[num]
+
+    def __setitem__(self, num, manager) -> None:
+        self.figs[num] = manager
+
+    def __delitem__(self, num) -> None:
+        del self.figs[num]
+
+    def __iter__(self):
+        return iter(self.figs)
+
+    def __len__(self) -> int:
+        return len(self.figs)
+
+    def values(self):
+        return self.figs.values() # Reversible (Gcf.get_active)
+
+    def move_to_end(self, num, last: bool = True) -> None:
+        self.figs.move_to_end(num, last)
+
+class Kernel:
+    """
+    Long-lived analysis namespace shared by all the calibrations of a sequence.
+    The code cells of the report header (imports, utility functions) are
+    executed once, on the first call to :py:meth:`Kernel.run`; the code of
+    each calibration is then executed in a child scope derived from the
+    header namespace, so that calibrations cannot leak variables into each other.
+    Calibrations processed concurrently (see :py:class:`qualib.scheduler.Scheduler`)
+    are executed in their own child scopes, with their own figures (see
+    :py:meth:`Kernel.isolate_figures`).
+
+    Args:
+        log (Log): Logging object.
+        header (list): Cells of the report header (``default_header.ipynb``).
+        json_log (str): Path substituted for ``{JSON_LOG}`` in the header.
+
+    Attributes:
+        log (Log): Logging object.
+        code (str): Code of the report header.
+        namespace (dict): Namespace resulting from the execution of the header
+                          (``None`` until the header has been executed).
+        lock (threading.Lock): Held while executing the report header.
+    """
+
+    def __init__(self, log: Log, header: list, json_log: str):
+        self.log       = log
+        self.namespace = None
+        self.code      = ''
+        self.lock      = threading.Lock()
+        for cell in header:
+            if cell['cell_type'] == 'code':
+                # Handle magic commands
+                self.code += '\n'+'\n'.join([
+                    handle_magic_commands(log, '', line)
+                    for line in cell['source'].splitlines()
+                ])
+        self.code = self.code.replace('{JSON_LOG}', json_log)
+
+    def start(self, pre: str = '') -> Kernel:
+        """Executes the report header, unless it has already been executed.
+
+        Args:
+            pre: Optional log entry prefix.
+        """
+        with self.lock:
+            if self.namespace is not None:
+                return self
+            self.log.info(pre, 'Executing header')
+            start     = time.perf_counter()
+            namespace = {}
+            with self.log.profile.span('header', pre):
+                exec(self.code, namespace, namespace)
+            self.namespace = namespace
+            self.log.info(pre, f'Header executed in {time.perf_counter()-start:.3f} s')
+            return self
+
+    def isolate_figures(self) -> Kernel:
+        """Keeps the figures of ``matplotlib.pyplot`` per thread (see :py:class:`Figures`),
+        with a non-interactive backend, before executing code in worker threads.
+
+        """
+        import matplotlib # Imported on first use (startup time)
+        import matplotlib._pylab_helpers as helpers
+
+        with self.lock:
+            if not isinstance(helpers.Gcf.figs, Figures):
+                matplotlib.use('Agg') # No display in worker threads
+                helpers.Gcf.figs = Figures(helpers.Gcf.figs)
+        return self
+
+    def run(self, code: str, pre: str = '') -> dict:
+        """Executes ``code`` in a child scope of the header namespace.
+
+        Args:
+            code: Code to execute.
+            pre: Optional log entry prefix.
+
+        Returns:
+            Local variables after the execution of ``code``.
+        """
+        self.start(pre)
+        locs  = dict(self.namespace)
+        start = time.perf_counter()
+        with self.log.profile.span('exec', pre):
+            exec(code, locs, locs)
+        self.log.info(pre, f'Analysis code executed in {time.perf_counter()-start:.3f} s')
+        return locs
+
 ######################################################################
 
 class DefaultCalibration:
@@ -70,6 +225,8 @@ class DefaultCalibration:
         exopy_templ (str): Content of the Exopy measurement template.
         pre (str): Default prefix for log entries.
         timestamp (str): Timestamp used to create the log and report files.
+        kernel (Kernel): Optional. Analysis kernel shared by the calibrations
+                         of the sequence (a private one is created if omitted).
         
     Attributes:
         log (Log): Logging object.
@@ -82,14 +239,34 @@ class DefaultCalibration:
         exopy_templ (str): Exopy measurement template for the current calibration.
         pre (str): Default prefix for log entries.
         timestamp (str): Timestamp used to create the log and report files.
+        kernel (Kernel): Analysis kernel.
         report_templ (list): Cells of the calibration report template.
+        report_compiled (list): Compiled sources of the report template cells.
+        report_fields (dict): Values of the ``{KEY}`` placeholders of the report template.
+        workspace (str): Scratch directory of the calibration
+                         (``workspaces/TIMESTAMP/ID_NAME``).
+        meas_path (str): Path to the generated Exopy measurement file.
         hdf5_path (str): Relative path to the HDF5 measurement file.
         results (dict): Dictionary of results.
+        concurrent (bool): Processed in a worker thread (see :py:class:`qualib.scheduler.Scheduler`):
+                           the report is only updated when the calibration is committed.
+        predictor (Predictor): Predictions from the run history (see :py:meth:`DefaultCalibration.predict`),
+                               set by :py:meth:`qualib.main.Qualib.run` (``None`` if disabled).
+        widen (int): Number of re-measurements after failed analyses (see :py:mod:`qualib.retry`),
+                     set by :py:meth:`qualib.main.Qualib.run`, e.g. to widen the scan.
+        precision (float): Largest relative standard deviation of ``_opt``
+                           (``None`` if not checked, see :py:meth:`DefaultCalibration.check`).
     """
+
+    reads  = None # Assumptions read by the Calibration class ('section/parameter' keys, None: any)
+    writes = None # Assumptions updated by the Calibration class (None: any)
+    predictor = None
+    widen     = 0
+    budget    = () # Assumptions scaled toward the target precision ('section/parameter' keys, see adjust_budget)
     
     def __init__(self, log: Log, report: Report, assumptions: dict, id: int,
                  name: str, substitutions: Dict[str, str], exopy_templ: str,
-                 pre: str, timestamp: str):
+                 pre: str, timestamp: str, kernel: Kernel = None):
         self.log           = log
         self.report        = report
         self.assumptions   = assumptions
@@ -99,12 +276,76 @@ class DefaultCalibration:
         self.exopy_templ   = exopy_templ
         self.pre           = pre
         self.timestamp     = timestamp
+        self.kernel        = kernel or Kernel(log, report.header, get_json_log(timestamp))
 
-        self.report_templ  = nb.read(os.path.join(os.path.dirname(__file__), f'{name}/template_{name}.ipynb'), as_version=4).cells
+        from ..load import load_report_template # Circular import
+        self.report_templ  = load_report_template(log, name, pre)
+        self.report_compiled = [compile_template(cell['source'], FIELD) for cell in self.report_templ]
+        self.report_fields = {'{STATE_POST_PROCESS}': '{STATE_POST_PROCESS}'}
+        self.workspace     = os.path.join('workspaces', timestamp, f'{id:03d}_{pre[:-1]}')
+        self.meas_path     = os.path.abspath(os.path.join(self.workspace, f'{name}.meas.ini'))
         self.hdf5_filename = f'{timestamp}_{id:03d}_{pre[:-1]}.h5'
         self.hdf5_path     = f'{assumptions["default_path"]}/{self.hdf5_filename}'
         self.results       = {}
+        self.concurrent    = False
+        self.precision     = None
     
+    def predict(self, key: str) -> Optional[Tuple[float, Optional[float]]]:
+        """Predicts an assumption at the point of a sweep (e.g. ``$flux``) of the
+        calibration, from the values measured at the previous points of the run
+        (see :py:class:`qualib.predict.Predictor`), e.g. to center a scan.
+
+        Args:
+            key: ``'section/parameter'`` key (e.g. ``'qubit/freq'``).
+
+        Returns:
+            Predicted value and its uncertainty (``None`` if unknown), or ``None``
+            without prediction (predictions disabled, no sweep, or assumption
+            already measured at this point).
+        """
+        prediction = self.predictor and self.predictor.predict(key, self.substitutions)
+        if prediction:
+            value, uncertainty = prediction
+            self.log.info(self.pre, f'Predicted {key}: {value:g}'
+                                    f'{f" ± {uncertainty:.2g}" if uncertainty is not None else ""}')
+        return prediction
+
+    def prior(self, key: str) -> Any:
+        """
+        Args:
+            key: ``'section/parameter'`` key (e.g. ``'qubit/T1'``).
+
+        Returns:
+            Predicted value of an assumption (see :py:meth:`DefaultCalibration.predict`),
+            or its current value, e.g. as an initial guess of a fit.
+        """
+        prediction = self.predict(key)
+        if prediction:
+            return prediction[0]
+        section, _, parameter = key.partition('/')
+        return self.assumptions[section][parameter] if parameter else self.assumptions[section]
+
+    def render_report(self, mapping: Dict[str, str]) -> List[str]:
+        """Renders the report template from the ``{KEY}`` placeholders defined
+        so far, in a single pass over each cell of the original template.
+        
+        Args:
+            mapping: Dictionary of ``'KEY': value`` pairs. Placeholders already
+                     defined by a previous phase keep their value.
+
+        Returns:
+            Unresolved placeholders of markdown cells, and unresolved uppercase
+            placeholders of code cells (lowercase ones may be f-strings fields).
+        """
+        for key, val in fields(mapping).items():
+            self.report_fields.setdefault(key, val)
+        missing = []
+        for cell, templ in zip(self.report_templ, self.report_compiled):
+            cell['source'], unresolved = templ.render(self.report_fields)
+            missing += [key for key in unresolved
+                        if cell['cell_type'] == 'markdown' or key == key.upper()]
+        return missing
+
     def handle_substitutions(self, mapping: Dict[str, str] = {}) -> None:
         """Handles substitutions. Should be called at the
         end of :py:func:`Calibration.handle_substitutions`.
@@ -112,14 +353,14 @@ class DefaultCalibration:
         Args:
             mapping: Dictionary of substitutions.
         """
-        mapping['HDF5_PATH'] = self.hdf5_path
-        for key, val in ({**mapping, **self.substitutions}).items():
-            # Handle substitutions in Exopy template
-            self.exopy_templ = self.exopy_templ.replace(key, val)
+        mapping = {**mapping, 'HDF5_PATH': self.hdf5_path, **self.substitutions}
+
+        # Handle substitutions in Exopy template
+        templ = compile_template(self.exopy_templ, keys_pattern(mapping))
+        self.exopy_templ, _ = templ.render(mapping)
 
-            # Handle substitutions in report template
-            for i in range(len(self.report_templ)):
-                self.report_templ[i].source = self.report_templ[i].source.replace('{'+key+'}', val)
+        # Handle substitutions in report template
+        self.render_report(mapping)
 
     def pre_process(self, mapping: Dict[str, str] = {}) -> None:
         """Handles pre-placeholders. Should be called at
@@ -130,33 +371,36 @@ class DefaultCalibration:
         """
         # Handle pre-placeholders in Exopy template
         exopy_templ_befr = self.exopy_templ.splitlines()
-        pre_placeholders = re.findall(r'(\$([a-z0-9_]+)(?:/([a-z0-9_]+))?)',
-                                      self.exopy_templ,
-                                      re.MULTILINE)
-        for tree, root, leaf in pre_placeholders:
+        filename = self.assumptions['filename']
+        templ    = compile_template(self.exopy_templ, f'{PLACEHOLDER}|{re.escape(filename)}')
+        values   = {filename: self.hdf5_filename}
+        missing  = []
+        for tree in templ.placeholders - values.keys():
+            root, _, leaf = tree[1:].partition('/')
             self.log.debug(self.pre, str((tree, root, leaf)))
-            if leaf:
+            try:
                 # Replace $section/parameter with assumptions[section][parameter]
-                self.exopy_templ = self.exopy_templ.replace(tree, str(self.assumptions[root][leaf]))
-            else:
-                # Replace $parameter with assumptions[parameter]
-                self.exopy_templ = self.exopy_templ.replace(tree, str(self.assumptions[root]))
-        self.exopy_templ = self.exopy_templ.replace(self.assumptions['filename'], self.hdf5_filename)
+                # and $parameter with assumptions[parameter]
+                value = self.assumptions[root][leaf] if leaf else self.assumptions[root]
+                values[tree] = str(value).replace(filename, self.hdf5_filename)
+            except (KeyError, TypeError):
+                missing.append(tree)
+        assert not missing, f'Unresolved placeholders in "{self.name}_template.meas.ini": '\
+                            f'{", ".join(sorted(missing))}'
+        self.exopy_templ, _ = templ.render(values)
         exopy_templ_aftr = self.exopy_templ.splitlines()
         for line in get_diff(exopy_templ_befr, exopy_templ_aftr):
             # Remove unnecessary whitespaces and log exopy_templ diff
             self.log.debug(self.pre, f'{line[0]} {line[1:].strip()}')
 
-        # Generating NAME.meas.ini file
-        meas_path = os.path.join(os.path.dirname(__file__), f'{self.name}/{self.name}.meas.ini')
-        self.log.info(self.pre, f'Generating "{meas_path}"')
-        with open(meas_path, 'w', encoding='utf-8') as f:
+        # Generating NAME.meas.ini file in the calibration workspace
+        self.log.info(self.pre, f'Generating "{self.meas_path}"')
+        os.makedirs(self.workspace, exist_ok=True)
+        with open(self.meas_path, 'w', encoding='utf-8') as f:
             f.write(self.exopy_templ)
 
         # Handle pre-placeholders in report template
-        for key, val in mapping.items():
-            for i in range(len(self.report_templ)):
-                self.report_templ[i]['source'] = self.report_templ[i]['source'].replace('{'+key+'}', val)
+        self.render_report(mapping)
         
         self.pre_process_mapping = mapping
 
@@ -164,26 +408,63 @@ class DefaultCalibration:
         """Executes analysis code and updates assumptions.
 
         """
-        for i, cell in enumerate(self.report_templ):
+        if not self.concurrent:
+            while len(self.report.cells) > self.report.last_calibration:
+                self.report.pop_cell()
+        self.report_fields['{STATE}'] = '{STATE_PROCESS}'
+        self.render_report({})
+        if not self.concurrent:
+            self.report.add_calibration(self)
+
+        self.log.info(self.pre, f'Executing "qualib/calibrations/{self.name}/template_{self.name}.ipynb" code cells')
+        self.check(self.execute())
+
+    def alternatives(self) -> List[Dict[str, str]]:
+        """Alternative pre-placeholders (e.g. other initial guesses) to re-analyze
+        the measurement with if its analysis fails, before measuring it again
+        (see :py:func:`qualib.retry.process`). None by default.
+
+        Returns:
+            List of ``'PRE_PLACEHOLDER': value`` dictionaries, tried in order.
+        """
+        return []
+
+    def reanalyze(self, mapping: Dict[str, str]) -> None:
+        """Processes the measurement again with alternative pre-placeholders.
+
+        Args:
+            mapping: Dictionary of ``'PRE_PLACEHOLDER': value`` pairs
+                     (see :py:meth:`DefaultCalibration.alternatives`).
+        """
+        self.report_fields.update(fields(mapping))
+        self.pre_process_mapping = {**self.pre_process_mapping, **mapping}
+        self.process()
+
+    def analysis_cells(self) -> List[dict]:
+        """
+        Returns:
+            Cells of the report template kept in the current state
+            (as added by :py:meth:`Report.add_calibration`).
+        """
+        cells = []
+        for cell in self.report_templ:
             src = cell['source'].splitlines()
             if keep_cell(src):
-                self.report.cells.pop()
-            self.report_templ[i]['source'] = self.report_templ[i]['source'].replace('{STATE}', '{STATE_PROCESS}')
-        self.report.add_calibration(self)
+                if src[0][:3] == '#if':
+                    src = src[1:]
+                cells.append({'type': 'py' if cell['cell_type'] == 'code' else 'md',
+                              'source': '\n'.join(src)})
+        return cells
 
-        self.log.info(self.pre, 'Executing header')
-        locs = {}
-        code = ''
-        for cell in self.report.header:
-            if cell['cell_type'] == 'code':
-                # Handle magic commands
-                code += '\n'+'\n'.join([
-                    handle_magic_commands(self.log, self.pre, line)
-                    for line in cell['source'].splitlines()
-                ])
+    def execute(self) -> dict:
+        """Executes the code cells of the calibration in the analysis kernel.
 
-        self.log.info(self.pre, f'Executing "qualib/calibrations/{self.name}/template_{self.name}.ipynb" code cells')
-        for cell in self.report.cells[self.report.last_calibration:]:
+        Returns:
+            Variables defined by the code cells, including ``_results``,
+            ``_opt``, ``_cov`` and ``_err``.
+        """
+        code = ''
+        for cell in self.analysis_cells():
             if cell['type'] == 'py':
                 # Handle magic commands
                 code += '\n'+'\n'.join([
@@ -191,29 +472,49 @@ class DefaultCalibration:
                     for line in cell['source'].splitlines()
                 ])
 
-        json_log_path = str(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))).replace('\\', '/')
-        code = code.replace('{JSON_LOG}', f'{json_log_path}/logs/{self.timestamp}')
+        code = code.replace('{JSON_LOG}', get_json_log(self.timestamp))
         try:
-            exec(code, locs, locs)
+            return self.kernel.run(code, self.pre)
         except:
             lines = code.splitlines()
             [self.log.debug(str(i+1).zfill(len(str(len(lines))))+':', line) for i, line in enumerate(lines)]
             raise
-        
+        finally:
+            from ..data import close_measurements # Imported on first use (startup time)
+            close_measurements(self.hdf5_path)
+
+    def check(self, locs: dict) -> bool:
+        """Fetches the results and checks the fit quality (standard deviations
+        against optimized values, user-defined errors).
+        Raises a :py:class:`qualib.retry.FitQualityError` if the checks fail.
+
+        Args:
+            locs: Variables defined by the code cells (see :py:meth:`DefaultCalibration.execute`).
+
+        Returns:
+            ``True`` if the standard deviations have been checked (``_opt`` and ``_cov``).
+        """
+        import numpy as np # Imported on first use (startup time)
+
+        cell = self.analysis_cells()[-1]
+
         # Fetch results
         if '_results' in locs and '_results' in cell['source']:
             self.log.info(self.pre, 'Fetching results')
             self.results = locs['_results']
 
         # Check standard deviations against optimized values
-        if '_opt' in locs and '_cov' in locs and '_opt' in cell['source'] and '_cov' in cell['source']:
+        checked = '_opt' in locs and '_cov' in locs and '_opt' in cell['source'] and '_cov' in cell['source']
+        if checked:
             self.log.info(self.pre, 'Checking standard deviations against optimized values')
             ratios  = np.sqrt(np.diag(locs['_cov'])) / np.abs(locs['_opt'])
+            self.precision = float(np.max(ratios))
             failed  = ', '.join([f'_opt[{ind}]' for ind in np.where(ratios > 0.05)[0]])
             message = f'Standard deviation too large for {failed}\n'\
                         f'  If a parameter is not relevant, exclude it '\
                         f'from _opt and _cov in template_{self.name}.ipynb'
-            assert all(ratios <= 0.05), message
+            if not all(ratios <= 0.05):
+                raise FitQualityError(message)
             
         # Handle user-defined errors
         if '_err' in locs and '_err' in cell['source']:
@@ -223,7 +524,63 @@ class DefaultCalibration:
                 if condition:
                     errors.append(message)
                     self.log.error(self.pre, message)
-            assert not errors, '\n  '+'\n  '.join(errors)
+            if errors:
+                raise FitQualityError('\n  '+'\n  '.join(errors))
+        return checked
+
+    def adjust_budget(self) -> None:
+        """Scales the scan budget of the calibration (``budget`` keys, e.g.
+        ``npoints`` and ``averaging``) toward the target relative standard deviation
+        of ``_opt``, ``assumptions[name]['precision']``, if defined (see
+        :py:mod:`qualib.budget`): the budget shrinks while the fits are more precise
+        than needed, and grows while they are not precise enough. Called once
+        per calibration, after its successful analysis (see :py:func:`qualib.retry.process`).
+        """
+        section = self.assumptions.get(self.name)
+        target  = section.get('precision') if isinstance(section, dict) else None
+        if not target or not self.budget or self.precision is None:
+            return
+        keys    = [tuple(key.split('/')) for key in self.budget]
+        budget  = {key: self.assumptions[root][leaf] for key, (root, leaf) in zip(self.budget, keys)}
+        updated = allocate(budget, shots_factor(self.precision, target))
+        self.log.info(self.pre, f'Precision {self.precision:.2%} (target {target:.2%})',
+                      *[f'{key}: {budget[key]} -> {updated[key]}' for key in self.budget if budget[key] != updated[key]])
+        for key, (root, leaf) in zip(self.budget, keys):
+            self.assumptions[root][leaf] = updated[key]
+
+    def stream(self, job: Job, interval: float) -> bool:
+        """Analyzes the measurement file while it is being acquired (SWMR),
+        every ``interval`` seconds, and stops the measurement as soon as the
+        partial data pass the checks of :py:meth:`DefaultCalibration.check`,
+        including the standard deviations of ``_opt``. Should be called
+        after the submission of the measurement, before :py:meth:`DefaultCalibration.process`.
+
+        Args:
+            job: Running measurement.
+            interval: Delay in seconds between two analyses.
+
+        Returns:
+            ``True`` if the measurement has been stopped early.
+        """
+        self.report_fields['{STATE}'] = '{STATE_PROCESS}'
+        self.render_report({})
+        while not job.done():
+            time.sleep(interval)
+            if job.done() or not os.path.exists(self.hdf5_path):
+                continue
+            try:
+                passed = self.check(self.execute())
+            except Exception as e: # Not enough data yet
+                self.log.debug(self.pre, f'Partial analysis: {type(e).__name__}: {e}'.splitlines()[0])
+                continue
+            finally:
+                if 'matplotlib.pyplot' in sys.modules:
+                    sys.modules['matplotlib.pyplot'].close('all')
+            if passed:
+                self.log.info(self.pre, 'Partial data passed the checks, stopping the measurement')
+                job.stop()
+                return True
+        return False
 
     def post_process(self, mapping: Dict[str, str] = {}) -> None:
         """Handles post-placeholders. Should be called at
@@ -235,15 +592,15 @@ class DefaultCalibration:
         self.log.info(self.pre, f'Handling post_process placeholders defined in "qualib/calibrations/{self.name}/{self.name}_utils.py"')
         self.log.info(self.pre, *self.log.json(mapping))
 
-        mapping['STATE_PROCESS'] = '{STATE_POST_PROCESS}'
-        for key, val in ({**mapping, **self.pre_process_mapping, **self.substitutions}).items():
-            for i in range(len(self.report_templ)):
-                self.report_templ[i].source = self.report_templ[i].source.replace('{'+key+'}', val)
-                
-        for i, cell in enumerate(self.report_templ):
-            src = cell['source'].splitlines()
-            if keep_cell(src):
-                self.report.cells.pop()
+        self.report_fields['{STATE}']         = '{STATE_POST_PROCESS}'
+        self.report_fields['{STATE_PROCESS}'] = '{STATE_POST_PROCESS}'
+        missing = self.render_report({**mapping, **self.pre_process_mapping, **self.substitutions})
+        if missing:
+            self.log.warn(self.pre, f'Unresolved placeholders in "template_{self.name}.ipynb": '
+                                    f'{", ".join(sorted(set(missing)))}')
+
+        while len(self.report.cells) > self.report.last_calibration:
+            self.report.pop_cell()
         self.report.add_calibration(self)
 
 ######################################################################
@@ -256,6 +613,10 @@ class Report:
         assumptions (dict): Dictionary of assumptions.
         calib_scheme_str (str): String representation of the calibration sequence.
         timestamp (str): Timestamp used to create the log and report files.
+        restore (dict): Optional. Report state of an interrupted run to resume
+                        (``{'ops': ..., 'last_calibration': ...}``, see
+                        :py:class:`qualib.checkpoint.Checkpoint`): the cells are
+                        replayed from the journal instead of being created.
             
     Attributes:
         log (Log): Logging object.
@@ -273,15 +634,28 @@ class Report:
         cell_diff (int): Index of the cell containing the differences
                          between the assumptions before and after the
                          current calibration.
+        journal (str): Path to the append-only journal of cell operations
+                       (``reports/report_TIMESTAMP.jsonl``).
+        pending (list): Cell operations not yet flushed to the journal.
+        flushed (int): Number of cell operations flushed to the journal.
+        render_interval (float): Minimum delay in seconds between two renderings
+                                 of the notebook at checkpoints
+                                 (the notebook is always rendered by :py:meth:`Report.close`).
     """
     
-    def __init__(self, log: Log, filename: str, assumptions: dict, calib_scheme: str, timestamp: str):
+    def __init__(self, log: Log, filename: str, assumptions: dict, calib_scheme: str, timestamp: str,
+                 restore: dict = None):
         self.log         = log
         self.filename    = filename
-        self.assumptions = deepcopy(assumptions)
+        self.journal     = f'{os.path.splitext(filename)[0]}.jsonl'
+        self.pending     = []
+        self.flushed     = 0
+        self.rendered    = 0.0
+        self.render_interval = 60.0
+        self.assumptions = assumptions
         self.assump_befr = json.dumps(assumptions, indent=4)
-        self.header      = nb.read(os.path.join(os.path.dirname(__file__), 'default_header.ipynb'), as_version=4).cells
-        self.notebook    = new_notebook()
+        self.header      = load_header()
+        self.notebook    = None # Rendered by Report.update
         self.cells       = []
         self.timestamp   = timestamp
 
@@ -306,20 +680,81 @@ class Report:
             if cell['cell_type'] == 'markdown':
                 self.add_md_cell(cell['source'])
 
+        if restore:
+            # Resume an interrupted run from its journal (see qualib.checkpoint)
+            self.cells   = load_journal(self.journal, restore['ops'])
+            self.pending = []
+            self.flushed = restore['ops']
+            self.last_calibration = restore['last_calibration']
+            truncate_lines(self.journal, self.flushed) # Drop the operations after the checkpoint
+        else:
+            with open(self.journal, 'w', encoding='utf-8'):
+                pass # Truncate the journal
+        self.checkpoint(render=True)
+
+    def record(self, op: str, pos: int, cell: dict = {}) -> Report:
+        """Buffers a cell operation until the next :py:meth:`Report.flush`.
+
+        Args:
+            op: ``'insert'``, ``'set'`` or ``'pop'``.
+            pos: Index of the cell.
+            cell: Inserted or updated cell.
+        """
+        self.pending.append({'op': op, 'pos': pos, **cell})
+        return self
+
+    def flush(self) -> Report:
+        """Appends the buffered cell operations to ``self.journal``.
+        The cost of a flush is proportional to the number of operations
+        since the previous flush, not to the size of the report.
+
+        """
+        if not self.pending:
+            return self
+        with self.log.profile.span('report/flush'), open(self.journal, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(op, ensure_ascii=False)+'\n' for op in self.pending))
+        self.flushed += len(self.pending)
+        self.pending  = []
+        return self
+
+    def checkpoint(self, render: bool = False) -> Report:
+        """Flushes the journal and renders the notebook if ``render`` is ``True``
+        or if the last rendering is older than ``self.render_interval`` seconds.
+
+        Args:
+            render: Force the rendering of the notebook.
+        """
+        self.flush()
+        if render or time.monotonic() - self.rendered >= self.render_interval:
+            self.update()
+        return self
+
+    def close(self) -> Report:
+        """Flushes the journal and renders the notebook. Should be called
+        at the end of the calibration sequence, including on errors.
+
+        """
+        return self.checkpoint(render=True)
+
     def update(self) -> Report:
         """Overwrites ``self.notebook`` and ``reports/report_TIMESTAMP.ipynb``
         from the list of cells ``self.cells``.
         
         """
+        import nbformat as nb # Imported on first use (startup time)
+        from nbformat.v4 import new_notebook, new_markdown_cell as new_md_cell, new_code_cell as new_py_cell
+
+        self.rendered = time.monotonic()
         self.notebook = new_notebook()
 
-        for cell in self.cells:
-            if cell['type'] == 'md':
-                self.notebook['cells'].append(new_md_cell(cell['source']))
-            if cell['type'] == 'py':
-                self.notebook['cells'].append(new_py_cell(cell['source']))
+        with self.log.profile.span('report/render'):
+            for cell in self.cells:
+                if cell['type'] == 'md':
+                    self.notebook['cells'].append(new_md_cell(cell['source']))
+                if cell['type'] == 'py':
+                    self.notebook['cells'].append(new_py_cell(cell['source']))
 
-        nb.write(self.notebook, self.filename, version=4)
+            nb.write(self.notebook, self.filename, version=4)
         return self
     
     def add_calibration(self, calibration) -> Report:
@@ -354,22 +789,52 @@ class Report:
         ))
 
         self.log.info(calibration.pre, 'Updating assumptions after and assumptions diff')
-        self.cells[self.cell_aftr]['source'] = self.assump_aftr+';'
-        self.cells[self.cell_diff]['source'] = ['# Assumptions diff\n\n', '```diff\n', *diff, '```']
-        return self.update()
+        self.set_cell(self.cell_aftr, self.assump_aftr+';')
+        self.set_cell(self.cell_diff, ['# Assumptions diff\n\n', '```diff\n', *diff, '```'])
+        return self.checkpoint()
 
     def add_md_cell(self, src) -> Report:
-        self.cells.append({'type': 'md', 'source': src})
-        return self.update()
+        return self.ins_md_cell(len(self.cells), src)
 
     def add_py_cell(self, src) -> Report:
-        self.cells.append({'type': 'py', 'source': src})
-        return self.update()
+        return self.ins_py_cell(len(self.cells), src)
 
     def ins_md_cell(self, pos: int, src) -> Report:
         self.cells.insert(pos, {'type': 'md', 'source': src})
-        return self.update()
+        return self.record('insert', pos, self.cells[pos])
 
     def ins_py_cell(self, pos: int, src) -> Report:
         self.cells.insert(pos, {'type': 'py', 'source': src})
-        return self.update()
\ No newline at end of file
+        return self.record('insert', pos, self.cells[pos])
+
+    def set_cell(self, pos: int, src) -> Report:
+        self.cells[pos] = {**self.cells[pos], 'source': src}
+        return self.record('set', pos, self.cells[pos])
+
+    def pop_cell(self) -> Report:
+        self.cells.pop()
+        return self.record('pop', len(self.cells))
+
+def load_journal(path: str, count: int = None) -> List[dict]:
+    """Replays a report journal (see :py:meth:`Report.flush`).
+
+    Args:
+        path: Path to ``reports/report_TIMESTAMP.jsonl``.
+        count: Optional. Number of operations to replay (all by default).
+
+    Returns:
+        List of report cells (``{'type': 'md' or 'py', 'source': ...}``).
+    """
+    cells = []
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if count is not None and i >= count:
+                break
+            op = json.loads(line)
+            if op['op'] == 'insert':
+                cells.insert(op['pos'], {'type': op['type'], 'source': op['source']})
+            if op['op'] == 'set':
+                cells[op['pos']] = {'type': op['type'], 'source': op['source']}
+            if op['op'] == 'pop':
+                cells.pop()
+    return cells
\ No newline at end of file
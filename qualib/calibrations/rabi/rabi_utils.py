@@ -1,14 +1,23 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'rabi/{PULSE}_linearity_amp_limit', 'qubit/{PULSE}_amp', 'rabi/precision', 'rabi/npoints'}
+    writes = {'qubit/{PULSE}_amp', 'rabi/npoints'}
+    budget = ('rabi/npoints',) # $averaging is shared with other calibrations
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
     def pre_process(self) -> None:
         super().pre_process(mapping = {
-            'LINEARITY_AMP_LIMIT': str(self.assumptions['rabi'][f'{self.substitutions["PULSE"]}_linearity_amp_limit'])
+            'LINEARITY_AMP_LIMIT': str(self.assumptions['rabi'][f'{self.substitutions["PULSE"]}_linearity_amp_limit']),
+            'A_RABI':              str(self.prior(f'qubit/{self.substitutions["PULSE"]}_amp'))
         })
 
+    def alternatives(self) -> list:
+        # FFT estimate of a_rabi, without its previous or predicted value
+        return [{'A_RABI': '0'}]
+
     def process(self) -> None:
         super().process()
         self.assumptions['qubit'][f'{self.substitutions["PULSE"]}_amp'] = self.results['a_rabi']
@@ -1,6 +1,9 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'rabi_probe/npoints'}
+    writes = {'rabi/npoints'}
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
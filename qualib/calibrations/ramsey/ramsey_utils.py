@@ -1,15 +1,23 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'qubit/freq', 'qubit/T2', 'ramsey/precision', 'ramsey/npoints', 'ramsey/averaging'}
+    writes = {'qubit/freq', 'qubit/T2', 'ramsey/npoints', 'ramsey/averaging'}
+    budget = ('ramsey/npoints', 'ramsey/averaging')
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
     def pre_process(self) -> None:
         super().pre_process(mapping = {
-            'FREQ': str(self.assumptions['qubit']['freq']),
-            'T2':   str(self.assumptions['qubit']['T2'])
+            'FREQ': str(self.prior('qubit/freq')),
+            'T2':   str(self.prior('qubit/T2'))
         })
 
+    def alternatives(self) -> list:
+        t2 = float(self.pre_process_mapping['T2'])
+        return [{'T2': str(t2*factor)} for factor in (0.5, 2)]
+
     def process(self) -> None:
         super().process()
         self.assumptions['qubit']['freq'] = self.results['f_LO']
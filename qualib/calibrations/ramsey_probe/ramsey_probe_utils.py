@@ -1,6 +1,9 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'ramsey/freq'}
+    writes = set()
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
@@ -1,6 +1,10 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'ramsey_t2/delta', 'qubit/T2', 'ramsey_t2/precision', 'ramsey/npoints', 'ramsey/averaging'}
+    writes = {'qubit/T2', 'ramsey/npoints', 'ramsey/averaging'}
+    budget = ('ramsey/npoints', 'ramsey/averaging')
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
@@ -16,5 +20,5 @@ class Calibration(DefaultCalibration):
 
     def post_process(self) -> None:
         super().post_process(mapping = {
-            'qubit_T2': f'{self.results["T2_qubit"]:.3f}',
+            'qubit_T2': f'{self.results["T2_qubit"]/1000:.3f}',
         })
\ No newline at end of file
@@ -2,10 +2,33 @@ from ..default import DefaultCalibration
 import re
 
 class Calibration(DefaultCalibration):
+    reads  = {'spectro_qubit/{TYPE}_sweep_width', 'spectro_qubit/{TYPE}_npoints',
+              'spectro_qubit/{NAME}_pulse_length', 'spectro_qubit/{NAME}_pulse_amp'}
+    writes = {'qubit/freq'}
+
     def handle_substitutions(self) -> None:
         sweep_width   = self.assumptions['spectro_qubit'][f'{self.substitutions["TYPE"]}_sweep_width']
         sweep_npoints = self.assumptions['spectro_qubit'][f'{self.substitutions["TYPE"]}_npoints']
+        prediction    = self.predict('qubit/freq')
+        mapping       = {}
+        if prediction:
+            # Center the scan on the predicted frequency (qubit/freq is only updated
+            # by process), narrow it down to 8 times the uncertainty (MHz) with the
+            # same step, keeping at least 51 points (filter)
+            freq, uncertainty = prediction
+            mapping['$qubit/freq'] = str(freq)
+            if uncertainty is not None and not self.widen:
+                width = min(sweep_width, max(sweep_width/4, 8*uncertainty*1e3))
+                sweep_npoints = max(51, min(sweep_npoints, round((sweep_npoints-1)*width/sweep_width)+1))
+                sweep_width   = width
+                self.log.info(self.pre, f'Scanning {sweep_width:.3g} MHz with {sweep_npoints} points')
+        if self.widen:
+            # No peak found: widen the scan with the same step
+            sweep_width   *= 2**self.widen
+            sweep_npoints  = (sweep_npoints-1)*2**self.widen+1
+            self.log.info(self.pre, f'Scanning {sweep_width:.3g} MHz with {sweep_npoints} points')
         super().handle_substitutions({
+            **mapping,
             '$spectro_qubit/SWEEP_STEP':       f'{sweep_width/(sweep_npoints-1):.4f}',
             '$spectro_qubit/SWEEP_HALF_WIDTH': str(sweep_width/2)
         })
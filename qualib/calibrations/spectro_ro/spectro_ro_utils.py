@@ -1,6 +1,9 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = set()
+    writes = {'readout/freq'}
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
@@ -1,14 +1,21 @@
 from ..default import DefaultCalibration
 
 class Calibration(DefaultCalibration):
+    reads  = {'qubit/T1', 't1_qubit/num_t1', 't1_qubit/wait_max', 'ramsey/wait_max'}
+    writes = {'qubit/T1', 't1_qubit/wait_max', 'ramsey/wait_max'}
+
     def handle_substitutions(self) -> None:
         super().handle_substitutions()
 
     def pre_process(self) -> None:
         super().pre_process({
-            'T1': str(self.assumptions['qubit']['T1'])
+            'T1': str(self.prior('qubit/T1'))
         })
 
+    def alternatives(self) -> list:
+        t1 = float(self.pre_process_mapping['T1'])
+        return [{'T1': str(t1*factor)} for factor in (0.5, 2)]
+
     def process(self) -> None:
         super().process()
         wait_max_limit = int(self.assumptions['t1_qubit']['num_t1'] * self.results['T1_qubit'])
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os
+import json
+import threading
+
+def write_atomic(path: str, text: str) -> None:
+    """Writes a file atomically: the text is written to a temporary file in
+    the same directory, flushed to disk, then renamed over ``path``, so that
+    ``path`` always holds either its previous or its new content.
+
+    Args:
+        path: Path to the file.
+        text: New content.
+    """
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def truncate_lines(path: str, count: int) -> None:
+    """Keeps the first ``count`` lines of a file (atomically, see :py:func:`write_atomic`),
+    e.g. to drop the entries written after a checkpoint.
+
+    Args:
+        path: Path to the file.
+        count: Number of lines to keep.
+    """
+    with open(path, encoding='utf-8') as f:
+        lines = [line for _, line in zip(range(count), f)]
+    write_atomic(path, ''.join(lines))
+
+def save_scheme(path: str, scheme: list) -> None:
+    """Writes the calibration sequence of a run once, next to its checkpoint.
+
+    Args:
+        path: Path to the scheme file (``logs/TIMESTAMP.scheme.json``).
+        scheme: Calibration sequence.
+    """
+    write_atomic(path, json.dumps(scheme, indent=1))
+
+def load_scheme(path: str) -> list:
+    """
+    Args:
+        path: Path to a scheme file (``logs/TIMESTAMP.scheme.json``).
+
+    Returns:
+        Calibration sequence of the run (see :py:func:`save_scheme`).
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load_checkpoint(path: str) -> dict:
+    """
+    Args:
+        path: Path to a checkpoint file (``logs/TIMESTAMP.checkpoint.json``).
+
+    Returns:
+        State of the calibration sequence (see :py:class:`Checkpoint`).
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+class Checkpoint:
+    """Durable state of a calibration sequence, rewritten atomically (see
+    :py:func:`write_atomic`) after each successful calibration, to resume an
+    interrupted sequence from the last successful calibration
+    (``python -m qualib.main --resume TIMESTAMP``).
+
+    Only the small mutable state of the sequence is rewritten: the calibration
+    sequence is written once (``logs/TIMESTAMP.scheme.json``, see :py:func:`save_scheme`),
+    and the assumptions after the last successful calibration are those of the
+    history (``logs/TIMESTAMP.jsonl``) truncated to ``history`` entries. The state holds:
+
+        * ``timestamp``: Timestamp of the log, report and history files.
+        * ``index``: Number of successful calibrations.
+        * ``history``: Number of calibrations recorded in ``logs/TIMESTAMP.jsonl``.
+        * ``report``: Number of operations of the report journal and index of the
+          first cell of the last calibration (see :py:class:`qualib.calibrations.default.Report`).
+        * ``measured``: Ranks of the calibrations measured since the last successful
+          one, whose HDF5 files can be analyzed again instead of being measured again.
+
+    Args:
+        path (str): Path to the checkpoint file (``logs/TIMESTAMP.checkpoint.json``).
+        report (Report): Default report object.
+        state (dict): Initial state.
+
+    Attributes:
+        path (str): Path to the checkpoint file.
+        report (Report): Default report object.
+        state (dict): Current state.
+        lock (Lock): Serializes the updates (measurements are recorded while
+                     the previous calibration is saved, if pipelined).
+    """
+
+    def __init__(self, path: str, report, state: dict):
+        self.path   = path
+        self.report = report
+        self.state  = state
+        self.lock   = threading.RLock()
+
+    def write(self) -> Checkpoint:
+        with self.lock, self.report.log.profile.span('checkpoint'):
+            write_atomic(self.path, json.dumps(self.state))
+        return self
+
+    def save(self, index: int, history: int) -> Checkpoint:
+        """Records a successful calibration. Should be called once its results
+        have been reported.
+
+        Args:
+            index: Rank of the calibration.
+            history: Number of calibrations recorded in the history.
+        """
+        with self.lock:
+            self.state.update({
+                'index':    index,
+                'history':  history,
+                'report':   {'ops': self.report.flushed,
+                             'last_calibration': getattr(self.report, 'last_calibration', 0)},
+                'measured': [id for id in self.state.get('measured', []) if id > index]
+            })
+            return self.write()
+
+    def measured(self, id: int) -> Checkpoint:
+        """Records a completed measurement, if its calibration is still pending
+        (not saved yet, and not already recorded, e.g. when measured again).
+
+        Args:
+            id: Rank of the calibration.
+        """
+        with self.lock:
+            measured = self.state.get('measured', [])
+            if id <= self.state.get('index', 0) or id in measured:
+                return self
+            self.state['measured'] = sorted({*measured, id})
+            return self.write()
@@ -0,0 +1,395 @@
+from __future__ import annotations
+import time
+from typing import Dict, Tuple, Any
+import numpy as np
+from scipy import optimize
+
+# Former path of template_spectro_ro.ipynb, before this module (see benchmark, opt-in)
+QKIT_URL = ('https://raw.githubusercontent.com/qkitgroup/qkit/78dc93cfa48fbca72b8e56ca7ea1b5c1665cbe1b/'
+            'qkit/analysis/circle_fit/circle_fit_2019/circuit.py')
+
+# Inverse of the constraint matrix of the Pratt fit (B² + C² - 4AD = 1)
+PRATT_INV = np.array([[ 0.0, 0.0, 0.0, -0.5],
+                      [ 0.0, 1.0, 0.0,  0.0],
+                      [ 0.0, 0.0, 1.0,  0.0],
+                      [-0.5, 0.0, 0.0,  0.0]])
+
+def fit_circle(z: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Algebraic (Pratt) circle fit of one or several traces at once.
+
+    Args:
+        z: Complex data of shape ``(..., N)``.
+
+    Returns:
+        Centers (complex), radii and RMS distances of the points to the
+        circles, each of shape ``(...)``.
+    """
+    z     = np.asarray(z, dtype=complex)
+    mean  = z.mean(axis=-1, keepdims=True)
+    scale = np.sqrt(np.mean(np.abs(z-mean)**2, axis=-1, keepdims=True))
+    scale = np.where(scale > 0, scale, 1.0)
+    u     = (z-mean)/scale # Centered and scaled for conditioning
+    x, y  = u.real, u.imag
+    cols  = np.stack([x*x+y*y, x, y, np.ones_like(x)], axis=-1)
+    moments = np.einsum('...ni,...nj->...ij', cols, cols)/z.shape[-1]
+
+    # Smallest eigenvalue of M A = eta B A with a positive constraint A^T B A
+    eta, vecs = np.linalg.eig(PRATT_INV @ moments)
+    eta, vecs = eta.real, vecs.real
+    constraint = np.einsum('...ik,ij,...jk->...k', vecs, np.linalg.inv(PRATT_INV), vecs)
+    best = np.argmin(np.where(constraint > 0, eta, np.inf), axis=-1)
+    A, B, C, D = np.moveaxis(np.take_along_axis(vecs, best[..., None, None], axis=-1)[..., 0], -1, 0)
+
+    center = (-B-1j*C)/(2*A)
+    radius = np.sqrt(np.abs(B*B+C*C-4*A*D))/(2*np.abs(A))
+    center = center*scale[..., 0]+mean[..., 0]
+    radius = radius*scale[..., 0]
+    rms    = np.sqrt(np.mean((np.abs(z-center[..., None])-radius[..., None])**2, axis=-1))
+    return center, radius, rms
+
+def fit_delay(f: np.ndarray, z: np.ndarray) -> float:
+    """Estimates the cable delay from the phase slope at both ends of the
+    trace, then refines it by minimizing the relative distance of the
+    corrected data to their fitted circle over successively finer grids
+    (each grid is fitted in a single vectorized call).
+
+    Args:
+        f: Frequencies.
+        z: Complex data.
+
+    Returns:
+        Delay (inverse unit of ``f``, e.g. ns for GHz).
+    """
+    edge   = max(len(f)//10, 2)
+    phase  = np.unwrap(np.angle(z))
+    slopes = [np.polyfit(f[s], phase[s], 1)[0] for s in (slice(None, edge), slice(-edge, None))]
+    delay  = -np.mean(slopes)/(2*np.pi)
+    span   = abs(f[-1]-f[0])
+    for width in (2/span, 0.1/span, 0.005/span):
+        candidates = delay+np.linspace(-width, width, 41)
+        _, radius, rms = fit_circle(z*np.exp(2j*np.pi*np.outer(candidates, f)))
+        delay = candidates[np.argmin(rms/radius)]
+    return delay
+
+def phase_model(f: np.ndarray, theta0: float, Ql: float, fr: float) -> np.ndarray:
+    """Phase around the center of the resonance circle."""
+    return theta0+2*np.arctan(2*Ql*(1-f/fr))
+
+def phase_jac(f: np.ndarray, theta0: float, Ql: float, fr: float) -> np.ndarray:
+    den = 1+(2*Ql*(1-f/fr))**2
+    return np.stack([np.ones_like(f), 4*(1-f/fr)/den, 4*Ql*f/fr**2/den], axis=-1)
+
+def fit_phase(f: np.ndarray, theta: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Fits :py:func:`phase_model` to the unwrapped phase around the center
+    of the circle, from the steepest point of the phase.
+
+    Args:
+        f: Frequencies.
+        theta: Unwrapped phase around the center of the circle.
+
+    Returns:
+        Optimal ``(theta0, Ql, fr)`` and their covariance.
+    """
+    kernel = np.ones(5)/5
+    slope  = np.convolve(np.gradient(theta, f), kernel, mode='same')
+    i      = np.argmax(np.abs(slope[2:-2]))+2
+    fr     = f[i]
+    guess  = (theta[i], -slope[i]*fr/4, fr) # dtheta/df = -4 Ql/fr at resonance
+    return optimize.curve_fit(phase_model, f, theta, guess, jac=phase_jac)
+
+def resonator_model(f: np.ndarray, a: float, alpha: float, delay: float, fr: float, Ql: float,
+                    Qc: float, phi0: float, diameter_ratio: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Resonator response with its environment:
+    ``a exp(i alpha) exp(-2i pi f delay) (1 - diameter_ratio (Ql/Qc) exp(i phi0)/(1 + 2i Ql (f/fr - 1)))``.
+
+    Returns:
+        Complex model, and its derivatives with respect to
+        ``(a, alpha, delay, fr, Ql, Qc, phi0)`` (shape ``(N, 7)``).
+    """
+    env  = a*np.exp(1j*alpha)*np.exp(-2j*np.pi*f*delay)
+    k    = diameter_ratio*Ql/Qc*np.exp(1j*phi0)
+    lor  = 1/(1+2j*Ql*(f/fr-1))
+    res  = 1-k*lor
+    m    = env*res
+    dlor = -1j*lor*lor # d(lor)/du with u = 2 Ql (f/fr - 1)
+    jac  = np.stack([
+        m/a,
+        1j*m,
+        -2j*np.pi*f*m,
+        -env*k*dlor*(-2*Ql*f/fr**2),
+        -env*(k/Ql*lor+k*dlor*2*(f/fr-1)),
+        env*k/Qc*lor,
+        -1j*env*k*lor
+    ], axis=-1)
+    return m, jac
+
+class CirclePort:
+    """Resonator circle fit, with the same interface as the ``circuit.py``
+    module of qkit: ``port = reflection_port(f, z)``, ``port.autofit()``,
+    ``port.fitresults``, ``port.plotall()``.
+
+    The initial estimates are obtained from the cable delay, the circle fit,
+    the phase around the center of the circle and the off-resonant point;
+    then the full complex model (:py:func:`resonator_model`) is refined by
+    least squares, which gives the uncertainties. Subclasses define the
+    resonator model.
+
+    Args:
+        f_data (np.ndarray): Frequencies (e.g. in GHz).
+        z_data_raw (np.ndarray): Complex data.
+
+    Attributes:
+        fitresults (dict): ``fr``, ``fr_err``, ``Ql``, ``Ql_err``, ``Qc``, ``Qc_err``, ``Qi``,
+                           ``delay``, ``a``, ``alpha``, ``chi_square``
+                           (and ``phi0`` for notch ports).
+        z_data_sim (np.ndarray): Fitted model at ``f_data``.
+        conjugate (bool): ``True`` if the data follow the opposite phase convention.
+    """
+
+    diameter_ratio = 1.0    # Diameter of the normalized circle = diameter_ratio*Ql/Qc
+    params = (0, 1, 2, 3, 4, 5) # Fitted parameters (indices in the derivatives of resonator_model)
+
+    def __init__(self, f_data: np.ndarray, z_data_raw: np.ndarray):
+        self.f_data     = np.asarray(f_data, dtype=float)
+        self.z_data_raw = np.asarray(z_data_raw, dtype=complex)
+        self.fitresults: Dict[str, Any] = {}
+        self.z_data_sim = None
+        self.conjugate  = False
+
+    def guess(self, z: np.ndarray) -> Dict[str, float]:
+        """
+        Args:
+            z: Complex data.
+
+        Returns:
+            Initial estimates (``Ql`` is negative if the data follow the opposite phase convention).
+        """
+        f = self.f_data
+        delay = fit_delay(f, z)
+        corrected = z*np.exp(2j*np.pi*f*delay)
+        center, radius, _ = fit_circle(corrected)
+        (theta0, Ql, fr), _ = fit_phase(f, np.unwrap(np.angle(corrected-center)))
+
+        # Environment (amplitude and phase) given by the off-resonant point
+        offres = center+radius*np.exp(1j*(theta0+np.pi))
+        a = np.abs(offres)
+        return {'a': a, 'alpha': np.angle(offres), 'delay': delay, 'fr': fr, 'Ql': Ql,
+                **self.quality_factors(abs(Ql), center/offres, radius/a)}
+
+    def autofit(self) -> Dict[str, Any]:
+        """Fits the data.
+
+        Returns:
+            :py:attr:`fitresults`
+        """
+        f, z  = self.f_data, self.z_data_raw
+        guess = self.guess(z)
+        self.conjugate = guess['Ql'] < 0
+        if self.conjugate:
+            z, guess = np.conj(z), self.guess(np.conj(z))
+
+        names = ('a', 'alpha', 'delay', 'fr', 'Ql', 'Qc', 'phi0')
+        p0    = np.array([guess.get(name, 0.0) for name in names])
+        cols  = list(self.params)
+        def model(p):
+            full = p0.copy()
+            full[cols] = p
+            return resonator_model(f, *full, self.diameter_ratio)
+        def residuals(p):
+            diff = model(p)[0]-z
+            return np.concatenate([diff.real, diff.imag])
+        def jac(p):
+            J = model(p)[1][:, cols]
+            return np.concatenate([J.real, J.imag])
+        fit = optimize.least_squares(residuals, p0[cols], jac=jac, method='lm', x_scale='jac')
+
+        dof = max(2*len(f)-len(cols), 1)
+        try:
+            cov = np.linalg.inv(fit.jac.T @ fit.jac)*np.sum(fit.fun**2)/dof
+        except np.linalg.LinAlgError:
+            cov = np.full((len(cols), len(cols)), np.inf)
+        err = dict(zip((names[i] for i in cols), np.sqrt(np.abs(np.diag(cov)))))
+        p = p0.copy()
+        p[cols] = fit.x
+        res = dict(zip(names, p))
+        res['Ql'], res['Qc'] = abs(res['Ql']), abs(res['Qc'])
+        res['alpha'] = np.angle(np.exp(1j*res['alpha']))
+
+        self.fitresults = {
+            'fr':     res['fr'],
+            'fr_err': err['fr'],
+            'Ql':     res['Ql'],
+            'Ql_err': err['Ql'],
+            'Qc':     res['Qc'],
+            'Qc_err': err['Qc'],
+            'Qi':     1/(1/res['Ql']-np.cos(res['phi0'])/res['Qc']),
+            'delay':  -res['delay'] if self.conjugate else res['delay'],
+            'a':      res['a'],
+            'alpha':  -res['alpha'] if self.conjugate else res['alpha']
+        }
+        if 6 in cols:
+            self.fitresults['phi0'] = res['phi0']
+        self.z_data_sim = self.model(f)
+        self.fitresults['chi_square'] = np.sum(fit.fun**2)/dof/res['a']**2
+        return self.fitresults
+
+    def quality_factors(self, Ql: float, center: complex, radius: float) -> Dict[str, float]:
+        """
+        Args:
+            Ql: Loaded quality factor.
+            center: Center of the normalized circle.
+            radius: Radius of the normalized circle.
+
+        Returns:
+            Initial estimates of the coupling quality factor (and impedance mismatch).
+        """
+        return {'Qc': self.diameter_ratio*Ql/(2*radius)}
+
+    def model(self, f: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            f: Frequencies.
+
+        Returns:
+            Fitted model including the environment (amplitude, phase and delay).
+        """
+        res = self.fitresults
+        m, _ = resonator_model(f, res['a'], -res['alpha'] if self.conjugate else res['alpha'],
+                               -res['delay'] if self.conjugate else res['delay'],
+                               res['fr'], res['Ql'], res['Qc'], res.get('phi0', 0.0),
+                               self.diameter_ratio)
+        return np.conj(m) if self.conjugate else m
+
+    def environment(self, f: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            f: Frequencies.
+
+        Returns:
+            Fitted environment (amplitude, phase and delay), to normalize the data.
+        """
+        res = self.fitresults
+        return res['a']*np.exp(1j*res['alpha'])*np.exp(-2j*np.pi*f*res['delay'])
+
+    def plotall(self) -> None:
+        """Plots the data and the fitted model (IQ plane, amplitude and phase)
+        in the current figure.
+
+        """
+        import matplotlib.pyplot as plt
+
+        res  = self.fitresults
+        f, z, sim = self.f_data, self.z_data_raw, self.z_data_sim
+        norm = self.environment(f)
+        fig  = plt.gcf()
+        fig.clf()
+        axes = fig.subplots(2, 2)
+        for ax, data, fit in ((axes[0, 0], z, sim), (axes[1, 1], z/norm, sim/norm)):
+            ax.plot(data.real, data.imag, '.')
+            ax.plot(fit.real, fit.imag)
+            ax.set_aspect('equal', 'datalim')
+        axes[0, 0].set_title('Raw data')
+        axes[1, 1].set_title('Normalized data')
+        axes[0, 1].plot(f, np.abs(z), '.', f, np.abs(sim))
+        axes[0, 1].set_title('Amplitude')
+        axes[1, 0].plot(f, np.unwrap(np.angle(z/norm)), '.', f, np.unwrap(np.angle(sim/norm)))
+        axes[1, 0].set_title(f'Phase (fr = {res["fr"]:.6f})')
+        fig.tight_layout()
+
+class reflection_port(CirclePort):
+    """Resonator measured in reflection: ``S11 = 1 - 2 (Ql/Qc)/(1 + 2i Ql (f/fr - 1))``."""
+
+    diameter_ratio = 2.0
+
+class notch_port(CirclePort):
+    """Resonator side-coupled to a transmission line, with impedance
+    mismatch ``phi0`` (diameter correction method):
+    ``S21 = 1 - (Ql/|Qc|) exp(i phi0)/(1 + 2i Ql (f/fr - 1))``.
+
+    """
+
+    params = (0, 1, 2, 3, 4, 5, 6)
+
+    def quality_factors(self, Ql: float, center: complex, radius: float) -> Dict[str, float]:
+        return {'Qc': Ql/(2*radius), 'phi0': -np.arcsin(np.clip(center.imag/radius, -1, 1))}
+
+######################################################################
+
+def synthetic(f: np.ndarray, port: str = 'reflection', fr: float = 6.34, Ql: float = 5e3,
+              Qc: float = 8e3, phi0: float = 0.0, a: float = 0.1, alpha: float = 0.3,
+              delay: float = 5.0, noise: float = 1e-3, rng: np.random.Generator = None) -> np.ndarray:
+    """Synthetic resonator data (see :py:class:`reflection_port` and :py:class:`notch_port`).
+
+    Args:
+        f: Frequencies (GHz).
+        port: ``'reflection'`` or ``'notch'``.
+        noise: Standard deviation of the complex Gaussian noise, relative to ``a``.
+        rng: Optional. Random generator.
+
+    Returns:
+        Complex data.
+    """
+    rng = rng or np.random.default_rng()
+    ratio = 2*Ql/Qc if port == 'reflection' else Ql/Qc*np.exp(1j*phi0)
+    z = a*np.exp(1j*alpha)*np.exp(-2j*np.pi*f*delay)*(1-ratio/(1+2j*Ql*(f/fr-1)))
+    return z+a*noise*(rng.standard_normal(len(f))+1j*rng.standard_normal(len(f)))/np.sqrt(2)
+
+def benchmark(traces: int = 20, npoints: int = 401, port: str = 'reflection',
+              qkit_url: str = '', timeout: float = 10.0, seed: int = 0) -> Dict[str, Any]:
+    """Fits synthetic resonator data with this module and, if ``qkit_url`` is
+    given (e.g. :py:data:`QKIT_URL`), with the former path of
+    ``template_spectro_ro.ipynb``: downloading and executing qkit's ``circuit.py``.
+    Only pass a URL you trust, as the downloaded code is executed.
+
+    Args:
+        traces: Number of synthetic traces (random resonance frequencies).
+        npoints: Number of frequencies per trace.
+        port: ``'reflection'`` or ``'notch'``.
+        qkit_url: Optional. URL of qkit's ``circuit.py`` (not downloaded by default).
+        timeout: Timeout of the download in seconds.
+        seed: Seed of the random generator.
+
+    Returns:
+        Timings (s/trace) and accuracy of each path: RMS ``fr`` error in
+        units of the linewidth, and RMS ``fr`` error in units of ``fr_err``
+        (close to 1 if the uncertainties are reliable).
+    """
+    rng   = np.random.default_rng(seed)
+    f     = np.linspace(6.335, 6.345, npoints)
+    frs   = rng.uniform(6.338, 6.342, traces)
+    data  = [synthetic(f, port, fr=fr, rng=rng) for fr in frs]
+    ports = {'qualib': reflection_port if port == 'reflection' else notch_port}
+
+    results: Dict[str, Any] = {'traces': traces, 'npoints': npoints, 'port': port}
+    if qkit_url:
+        try:
+            import requests
+            start = time.perf_counter()
+            namespace: Dict[str, Any] = {}
+            exec(requests.get(qkit_url, timeout=timeout).text, namespace)
+            results['qkit_download'] = time.perf_counter()-start
+            ports['qkit'] = namespace[f'{port}_port']
+        except Exception as e: # e.g. air-gapped computer
+            results['qkit_error'] = f'{type(e).__name__}: {e}'
+
+    for name, Port in ports.items():
+        fitted = []
+        start  = time.perf_counter()
+        for z in data:
+            circ = Port(f, z)
+            circ.autofit()
+            fitted.append((circ.fitresults['fr'], circ.fitresults['fr_err'], circ.fitresults['Ql']))
+        elapsed = time.perf_counter()-start
+        fr, fr_err, Ql = np.array(fitted).T
+        results[name] = {
+            'time_per_trace': elapsed/traces,
+            'fr_rms_error':   float(np.sqrt(np.mean(((fr-frs)*Ql/fr)**2))), # In linewidths
+            'fr_pull':        float(np.sqrt(np.mean(((fr-frs)/fr_err)**2)))
+        }
+    return results
+
+if __name__ == '__main__':
+    import sys
+    import json
+    qkit_url = QKIT_URL if '--qkit' in sys.argv[1:] else '' # Opt-in download of qkit's circuit.py
+    print(json.dumps({port: benchmark(port=port, qkit_url=qkit_url) for port in ('reflection', 'notch')}, indent=4))
@@ -0,0 +1,158 @@
+from __future__ import annotations
+from collections.abc import Mapping
+from typing import Dict, Iterator, Union
+import numpy as np
+
+def read(dataset) -> np.ndarray:
+    """Reads a dataset without copying it when possible: contiguous,
+    uncompressed numeric datasets are memory-mapped (read-only), other
+    datasets are read in a single call.
+
+    Args:
+        dataset (h5py.Dataset): HDF5 dataset.
+
+    Returns:
+        Array (``np.memmap`` for memory-mapped datasets).
+    """
+    if (dataset.shape and dataset.size and dataset.chunks is None and dataset.compression is None
+        and dataset.external is None and dataset.dtype.kind in 'biufc'):
+        offset = dataset.id.get_offset()
+        if offset is not None:
+            return np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r',
+                             offset=offset, shape=dataset.shape)
+    return dataset[()]
+
+class Group(Mapping):
+    """Lazy read-only view of an HDF5 group: each dataset is read (or
+    memory-mapped, see :py:func:`read`) on first access, then cached.
+
+    Args:
+        group (h5py.Group): HDF5 group.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self.items: Dict[str, Union[np.ndarray, Group]] = {}
+
+    def __getitem__(self, name: str) -> Union[np.ndarray, Group]:
+        if name not in self.items:
+            import h5py
+            obj = self.group[name]
+            self.items[name] = Group(obj) if isinstance(obj, h5py.Group) else read(obj)
+        return self.items[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.group)
+
+    def __len__(self) -> int:
+        return len(self.group)
+
+class Measurement:
+    """Lazy read-only access to an Exopy measurement file: the file is
+    opened (in SWMR mode) on first access, and its ``parameters`` and
+    ``data`` groups are exposed as :py:class:`Group` objects.
+
+    Usage in templates (the calibration closes the file after processing,
+    see :py:func:`open_measurement`)::
+
+        f    = open_measurement('{HDF5_PATH}')
+        amp  = f.data['amp']
+        data = f.iq_diff('I1', 'Q1', 'I2', 'Q2')
+
+    Args:
+        path (str): Path to the HDF5 file.
+        swmr (bool): Optional. Open the file in SWMR mode.
+
+    Attributes:
+        file (h5py.File): Open HDF5 file (``None`` until the first access).
+    """
+
+    def __init__(self, path: str, swmr: bool = True):
+        self.path = path
+        self.swmr = swmr
+        self.file = None
+        self.root = None
+
+    def __getitem__(self, name: str) -> Union[np.ndarray, Group]:
+        if self.file is None:
+            import h5py
+            self.file = h5py.File(self.path, 'r', swmr=self.swmr)
+            self.root = Group(self.file)
+        return self.root[name]
+
+    @property
+    def parameters(self) -> Group:
+        return self['parameters']
+
+    @property
+    def data(self) -> Group:
+        return self['data']
+
+    def iq(self, i: str = 'I', q: str = 'Q', group: str = 'data') -> np.ndarray:
+        """
+        Args:
+            i: Name of the in-phase dataset.
+            q: Name of the quadrature dataset.
+            group: Optional. Name of the group of the datasets.
+
+        Returns:
+            ``I + 1j*Q``, written into a single complex array (no temporaries).
+        """
+        I, Q = self[group][i], self[group][q]
+        out  = np.empty(np.broadcast_shapes(I.shape, Q.shape), dtype=np.result_type(I, Q, 1j))
+        np.copyto(out.real, I)
+        np.copyto(out.imag, Q)
+        return out
+
+    def iq_diff(self, i1: str = 'I1', q1: str = 'Q1', i2: str = 'I2', q2: str = 'Q2',
+                group: str = 'data') -> np.ndarray:
+        """
+        Args:
+            i1, q1: Names of the datasets of the first trace.
+            i2, q2: Names of the datasets of the reference trace.
+            group: Optional. Name of the group of the datasets.
+
+        Returns:
+            ``(I1 + 1j*Q1) - (I2 + 1j*Q2)``, written into a single complex array (no temporaries).
+        """
+        g   = self[group]
+        out = np.empty(np.broadcast_shapes(g[i1].shape, g[q1].shape, g[i2].shape, g[q2].shape),
+                       dtype=np.result_type(g[i1], g[q1], g[i2], g[q2], 1j))
+        np.subtract(g[i1], g[i2], out=out.real)
+        np.subtract(g[q1], g[q2], out=out.imag)
+        return out
+
+    def close(self) -> None:
+        """Closes the file (memory-mapped arrays remain valid)."""
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.root = None
+
+measurements: Dict[str, Measurement] = {} # Open measurement files by path
+
+def open_measurement(path: str, swmr: bool = True) -> Measurement:
+    """
+    Args:
+        path: Path to the HDF5 file.
+        swmr: Optional. Open the file in SWMR mode.
+
+    Returns:
+        Cached :py:class:`Measurement` of ``path``, shared by the code cells of a
+        calibration until :py:func:`close_measurements` is called (at the end of
+        :py:meth:`qualib.calibrations.default.DefaultCalibration.process`).
+    """
+    if path not in measurements:
+        measurements[path] = Measurement(path, swmr)
+    return measurements[path]
+
+def close_measurements(path: str = None) -> None:
+    """Closes a cached measurement file, or all of them.
+
+    Args:
+        path: Optional. Path to the HDF5 file (all files by default).
+    """
+    for key in [path] if path else list(measurements):
+        measurement = measurements.pop(key, None)
+        if measurement is not None:
+            measurement.close()
@@ -0,0 +1,297 @@
+from __future__ import annotations
+from typing import Tuple, Dict
+import numpy as np
+from scipy import optimize
+
+def columns(*cols: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        cols: Derivatives with respect to each parameter (broadcastable).
+
+    Returns:
+        Jacobian of shape ``(..., N, P)``.
+    """
+    return np.stack(np.broadcast_arrays(*cols), axis=-1)
+
+def fft_frequency(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Frequency of the highest non-zero peak of the FFT of evenly spaced
+    traces, refined by parabolic interpolation between FFT bins.
+
+    Args:
+        x: Evenly spaced abscissae of shape ``(..., N)``.
+        y: Traces of shape ``(..., N)``.
+
+    Returns:
+        Frequencies of shape ``(...)``.
+    """
+    x, y = np.broadcast_arrays(x, y)
+    n    = y.shape[-1]
+    step = (x[..., -1]-x[..., 0])/(n-1)
+    rfft = np.abs(np.fft.rfft(y-y.mean(axis=-1, keepdims=True), axis=-1))
+    i    = np.argmax(rfft[..., 1:], axis=-1)+1
+    left, peak, right = (np.take_along_axis(rfft, np.clip(i+k, 0, rfft.shape[-1]-1)[..., None], axis=-1)[..., 0]
+                         for k in (-1, 0, 1))
+    den   = left-2*peak+right
+    shift = np.where((den != 0) & (i < rfft.shape[-1]-1), 0.5*(left-right)/np.where(den != 0, den, 1), 0)
+    return (i+shift)/(n*np.abs(step))
+
+def project(y: np.ndarray, basis: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Linear least squares of ``y ~ amplitude*basis + offset`` along the last axis.
+
+    Returns:
+        Amplitudes and offsets.
+    """
+    y, basis = np.broadcast_arrays(y, basis)
+    bc = basis-basis.mean(axis=-1, keepdims=True)
+    norm = np.sum(bc*bc, axis=-1)
+    amplitude = np.sum(bc*(y-y.mean(axis=-1, keepdims=True)), axis=-1)/np.where(norm > 0, norm, 1)
+    return amplitude, y.mean(axis=-1)-amplitude*basis.mean(axis=-1)
+
+class Model:
+    """Fit model with an analytic Jacobian and an automatic initial guess.
+
+    Models are vectorized: parameters may be scalars (single trace) or
+    arrays of shape ``(..., 1)`` broadcast against ``x`` (stack of traces,
+    see :py:func:`batch_fit`).
+
+    Attributes:
+        params (tuple): Names of the parameters, in order.
+    """
+
+    params: Tuple[str, ...] = ()
+
+    def __call__(self, x: np.ndarray, *p) -> np.ndarray:
+        raise NotImplementedError
+
+    def jac(self, x: np.ndarray, *p) -> np.ndarray:
+        """
+        Returns:
+            Derivatives with respect to each parameter, of shape ``(..., N, P)``.
+        """
+        raise NotImplementedError
+
+    def guess(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            x: Abscissae of shape ``(..., N)`` (sorted).
+            y: Traces of shape ``(..., N)``.
+
+        Returns:
+            Initial parameters of shape ``(..., P)``.
+        """
+        raise NotImplementedError
+
+class Cosine(Model):
+    """Rabi oscillation: ``amplitude*cos(2 pi x/period) + offset``."""
+
+    params = ('period', 'amplitude', 'offset')
+
+    def __call__(self, x, period, amplitude, offset):
+        return amplitude*np.cos(2*np.pi*x/period)+offset
+
+    def jac(self, x, period, amplitude, offset):
+        theta = 2*np.pi*x/period
+        return columns(amplitude*np.sin(theta)*theta/period, np.cos(theta), 1.0)
+
+    def guess(self, x, y):
+        period = 1/fft_frequency(x, y)
+        amplitude, offset = project(y, np.cos(2*np.pi*x/period[..., None]))
+        return np.stack([period, amplitude, offset], axis=-1)
+
+class Ramsey(Model):
+    """Damped oscillation: ``amplitude*exp(-x/t2)*cos(2 pi delta x + phase) + offset``."""
+
+    params = ('t2', 'delta', 'phase', 'amplitude', 'offset')
+
+    def __call__(self, x, t2, delta, phase, amplitude, offset):
+        return amplitude*np.exp(-x/t2)*np.cos(2*np.pi*delta*x+phase)+offset
+
+    def jac(self, x, t2, delta, phase, amplitude, offset):
+        decay = np.exp(-x/t2)
+        cos, sin = np.cos(2*np.pi*delta*x+phase), np.sin(2*np.pi*delta*x+phase)
+        return columns(amplitude*decay*cos*x/t2**2, -amplitude*decay*sin*2*np.pi*x,
+                       -amplitude*decay*sin, decay*cos, 1.0)
+
+    def guess(self, x, y):
+        x, y   = np.broadcast_arrays(x, y)
+        n      = y.shape[-1]
+        delta  = fft_frequency(x, y)
+        offset = y.mean(axis=-1)
+        # Complex amplitudes of both halves: phase, amplitude and decay
+        demod  = (y-offset[..., None])*np.exp(-2j*np.pi*delta[..., None]*x)
+        first, second = demod[..., :n//2].mean(axis=-1), demod[..., n//2:].mean(axis=-1)
+        centers = x[..., :n//2].mean(axis=-1), x[..., n//2:].mean(axis=-1)
+        ratio  = np.abs(first)/np.maximum(np.abs(second), 1e-300)
+        span   = np.abs(x[..., -1]-x[..., 0])
+        t2     = np.where(ratio > 1, (centers[1]-centers[0])/np.log(np.maximum(ratio, 1+1e-12)), span)
+        t2     = np.clip(t2, span/20, 10*span)
+        amplitude = 2*np.abs(first)*np.exp((centers[0]-x[..., 0])/t2)
+        return np.stack([t2, delta, np.angle(first), amplitude, offset], axis=-1)
+
+class Exponential(Model):
+    """Exponential decay (T1): ``amplitude*exp(-x/t1) + offset``."""
+
+    params = ('t1', 'amplitude', 'offset')
+
+    def __call__(self, x, t1, amplitude, offset):
+        return amplitude*np.exp(-x/t1)+offset
+
+    def jac(self, x, t1, amplitude, offset):
+        decay = np.exp(-x/t1)
+        return columns(amplitude*decay*x/t1**2, decay, 1.0)
+
+    def guess(self, x, y):
+        x, y   = np.broadcast_arrays(x, y)
+        tail   = max(y.shape[-1]//10, 1)
+        offset = y[..., -tail:].mean(axis=-1)
+        span   = np.abs(x[..., -1]-x[..., 0])
+        # Area under the decay: amplitude*t1 (for a trace long compared to t1)
+        height = y[..., 0]-offset
+        area   = np.sum((y[..., 1:]+y[..., :-1]-2*offset[..., None])*np.diff(x, axis=-1), axis=-1)/2
+        t1     = np.clip(area/np.where(height != 0, height, 1), span/50, 10*span)
+        amplitude = height*np.exp(x[..., 0]/t1)
+        return np.stack([t1, amplitude, offset], axis=-1)
+
+class Arctan(Model):
+    """Phase response of a resonator: ``2*arctan(slope*(x - f0)) + offset``."""
+
+    params = ('f0', 'slope', 'offset')
+
+    def __call__(self, x, f0, slope, offset):
+        return 2*np.arctan(slope*(x-f0))+offset
+
+    def jac(self, x, f0, slope, offset):
+        den = 1+(slope*(x-f0))**2
+        return columns(-2*slope/den, 2*(x-f0)/den, 1.0)
+
+    def guess(self, x, y):
+        x, y  = np.broadcast_arrays(x, y)
+        grad  = np.gradient(y, axis=-1)/np.gradient(x, axis=-1)
+        i     = np.argmax(np.abs(grad), axis=-1)[..., None]
+        f0    = np.take_along_axis(x, i, axis=-1)[..., 0]
+        slope = np.take_along_axis(grad, i, axis=-1)[..., 0]/2 # dy/dx = 2*slope at f0
+        offset = (y.max(axis=-1)+y.min(axis=-1))/2
+        return np.stack([f0, slope, offset], axis=-1)
+
+class Lorentzian(Model):
+    """Resonance peak (or dip): ``amplitude/(1 + (2 (x - f0)/fwhm)^2) + offset``."""
+
+    params = ('f0', 'fwhm', 'amplitude', 'offset')
+
+    def __call__(self, x, f0, fwhm, amplitude, offset):
+        return amplitude/(1+(2*(x-f0)/fwhm)**2)+offset
+
+    def jac(self, x, f0, fwhm, amplitude, offset):
+        v   = 2*(x-f0)/fwhm
+        lor = 1/(1+v*v)
+        dv  = -2*amplitude*v*lor*lor # d/dv
+        return columns(dv*(-2/fwhm), dv*(-v/fwhm), lor, 1.0)
+
+    def guess(self, x, y):
+        x, y   = np.broadcast_arrays(x, y)
+        offset = np.median(y, axis=-1)
+        i      = np.argmax(np.abs(y-offset[..., None]), axis=-1)[..., None]
+        f0     = np.take_along_axis(x, i, axis=-1)[..., 0]
+        amplitude = np.take_along_axis(y, i, axis=-1)[..., 0]-offset
+        # Points above half maximum
+        above  = (y-offset[..., None])*np.sign(amplitude)[..., None] > np.abs(amplitude)[..., None]/2
+        step   = np.abs(x[..., -1]-x[..., 0])/(x.shape[-1]-1)
+        fwhm   = np.maximum(np.sum(above, axis=-1), 1)*step
+        return np.stack([f0, fwhm, amplitude, offset], axis=-1)
+
+cosine      = Cosine()
+ramsey      = Ramsey()
+exponential = Exponential()
+arctan      = Arctan()
+lorentzian  = Lorentzian()
+
+def curve_fit(model: Model, x: np.ndarray, y: np.ndarray, p0: np.ndarray = None,
+              fixed: Dict[str, float] = {}, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+    """Fits a single trace with :py:func:`scipy.optimize.curve_fit` and the
+    analytic Jacobian of the model.
+
+    Args:
+        model: Fit model (e.g. :py:data:`cosine`).
+        x: Abscissae.
+        y: Trace.
+        p0: Optional. Initial values of all the parameters (:py:meth:`Model.guess` by default).
+        fixed: Optional. Values of the parameters kept constant, by name
+               (e.g. ``{'offset': 0}``).
+        kwargs: Other arguments of :py:func:`scipy.optimize.curve_fit`.
+
+    Returns:
+        Optimal values of the other parameters and their covariance.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if p0 is None:
+        p0 = model.guess(x, y)
+    free = [i for i, name in enumerate(model.params) if name not in fixed]
+    def params(p):
+        values = [fixed.get(name) for name in model.params]
+        for i, value in zip(free, p):
+            values[i] = value
+        return values
+    return optimize.curve_fit(lambda x, *p: model(x, *params(p)), x, y, np.asarray(p0, dtype=float)[free],
+                              jac=lambda x, *p: model.jac(x, *params(p))[..., free], **kwargs)
+
+def batch_fit(model: Model, x: np.ndarray, y: np.ndarray, p0: np.ndarray = None,
+              max_iter: int = 200, tol: float = 1e-10) -> Tuple[np.ndarray, np.ndarray]:
+    """Fits a stack of traces at once (e.g. all the flux points of a sweep)
+    with a Levenberg-Marquardt algorithm vectorized over the traces: each
+    iteration evaluates the model, its Jacobian and the damped normal
+    equations of all the traces in single NumPy calls.
+
+    Args:
+        model: Fit model (e.g. :py:data:`ramsey`).
+        x: Abscissae of shape ``(N,)`` (shared) or ``(..., N)``.
+        y: Traces of shape ``(..., N)``.
+        p0: Optional. Initial parameters of shape ``(P,)`` or ``(..., P)``
+            (:py:meth:`Model.guess` of each trace by default).
+        max_iter: Optional. Maximum number of iterations.
+        tol: Optional. Relative decrease of the residuals (predicted by a Gauss-Newton
+             step) below which a trace has converged.
+
+    Returns:
+        Optimal parameters ``(..., P)`` and their covariances ``(..., P, P)``
+        (same scaling as :py:func:`scipy.optimize.curve_fit`).
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    n, k = y.shape[-1], len(model.params)
+    p = model.guess(x, y) if p0 is None else np.array(np.broadcast_to(p0, y.shape[:-1]+(k,)), dtype=float)
+
+    def unpack(p):
+        return np.moveaxis(p[..., None], -2, 0) # P arrays of shape (..., 1)
+    def normal(p):
+        r = model(x, *unpack(p))-y
+        J = model.jac(x, *unpack(p))
+        return np.sum(r*r, axis=-1), np.swapaxes(J, -1, -2) @ J, np.einsum('...np,...n->...p', J, r)
+
+    cost, A, g = normal(p)
+    lam  = np.full(y.shape[:-1], 1e-3)
+    done = np.zeros(y.shape[:-1], dtype=bool)
+    eye  = np.eye(k)
+    for _ in range(max_iter):
+        diag = np.maximum(np.diagonal(A, axis1=-2, axis2=-1), 1e-300) # Scale of each parameter
+        # Converged when the Gauss-Newton step would no longer decrease the residuals
+        newton = np.linalg.solve(A+eye*(1e-12*diag)[..., None, :], -g[..., None])[..., 0]
+        done  |= -np.sum(g*newton, axis=-1) <= tol*cost
+        if done.all():
+            break
+        step  = np.linalg.solve(A+eye*(lam[..., None]*diag)[..., None, :], -g[..., None])[..., 0]
+        trial = np.where(done[..., None], p, p+step)
+        with np.errstate(all='ignore'):
+            new_cost, new_A, new_g = normal(trial)
+        better = np.isfinite(new_cost) & (new_cost < cost) & ~done
+        done  |= ~better & (lam > 1e10)
+        p    = np.where(better[..., None], trial, p)
+        A    = np.where(better[..., None, None], new_A, A)
+        g    = np.where(better[..., None], new_g, g)
+        cost = np.where(better, new_cost, cost)
+        lam  = np.where(better, np.maximum(lam/10, 1e-12), lam*10)
+
+    # Invert the normal matrix scaled to a unit diagonal (parameters of very different magnitudes)
+    scale = 1/np.sqrt(np.maximum(np.diagonal(A, axis1=-2, axis2=-1), 1e-300))
+    outer = scale[..., :, None]*scale[..., None, :]
+    pcov  = np.linalg.pinv(A*outer)*outer*(cost/max(n-k, 1))[..., None, None]
+    return p, pcov
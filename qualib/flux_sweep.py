@@ -1,8 +1,11 @@
 import numpy as np
 import time
+import json
 import datetime
 from copy import deepcopy
+from typing import List, Dict
 from qualib.load import load_assumptions
+from qualib.history import to_json
 from qualib.main import Qualib
 from qualib.log import Log
 
@@ -10,9 +13,16 @@ qualib = Qualib()
 log = Log()
 
 def flux_sweep(calibration_scheme: list = [], min_flux: float = -0.5, max_flux: float = 0.5,
-               curr_flux: float = 0.0, flux_step:float = 0.1, npoints: int = -1):
+               curr_flux: float = 0.0, flux_step:float = 0.1, npoints: int = -1,
+               pipeline: bool = True, trace: bool = False, predict: bool = False):
     """Scan a flux range and execute a given calibration sequence.
 
+    If ``pipeline`` is ``True``, the post-processing and reporting of each
+    calibration overlap with the measurement of the next one
+    (see :py:meth:`qualib.main.Qualib.run_all`). If ``trace`` is ``True``,
+    every phase of every calibration is exported to ``logs/TIMESTAMP.trace.json``.
+    If ``predict`` is ``True``, the calibrations at each flux point start from
+    the values extrapolated from the previous points (see :py:class:`qualib.predict.Predictor`).
     """
     neg = np.arange(curr_flux, min_flux-flux_step, -flux_step)
     pos = np.arange(curr_flux, max_flux, flux_step)+flux_step
@@ -36,8 +46,164 @@ def flux_sweep(calibration_scheme: list = [], min_flux: float = -0.5, max_flux:
     assumptions = load_assumptions(log, 'flux_sweep_assumptions.py')
 
     start_time = time.perf_counter()
-    qualib.run_all(all_calibs, assumptions)
+    qualib.run_all(all_calibs, assumptions, pipeline=pipeline, trace=trace, predict=predict)
     stop_time = time.perf_counter()
 
     print(f'{(stop_time-start_time)/60:.2f} min (total)')
-    print(f'{(stop_time-start_time)/60/pt:.2f} min/pt')
\ No newline at end of file
+    print(f'{(stop_time-start_time)/60/pt:.2f} min/pt ({"pipelined" if pipeline else "serial"})')
+
+def flux_scheme(calibration_scheme: list, fluxes: List[float]) -> list:
+    """
+    Args:
+        calibration_scheme: Calibration sequence.
+        fluxes: Flux points, in the order of the measurements.
+
+    Returns:
+        Calibration sequence repeated for each flux point (``$flux`` substitution).
+    """
+    all_calibs = []
+    for flux in fluxes:
+        for calib in calibration_scheme:
+            calib = deepcopy(calib)
+            calib["substitutions"] = {**(calib.get("substitutions") or {}), "$flux": str(flux)}
+            all_calibs.append(calib)
+    return all_calibs
+
+def get_leaf(assumptions: dict, key: str) -> float:
+    """
+    Args:
+        assumptions: Assumptions.
+        key: ``'section/parameter'`` key (e.g. ``'qubit/freq'``).
+
+    Returns:
+        Value of the leaf.
+    """
+    section, _, parameter = key.partition('/')
+    return assumptions[section][parameter] if parameter else assumptions[section]
+
+def seed(points: Dict[float, dict], flux: float, keys: List[str]) -> dict:
+    """
+    Args:
+        points: Assumptions after the calibration sequence, by flux point.
+        flux: Flux point between two calibrated points (see :py:func:`refine`).
+        keys: ``'section/parameter'`` keys to interpolate (e.g. ``['qubit/freq']``).
+
+    Returns:
+        Starting assumptions at ``flux``: those of the nearest calibrated point below,
+        with the ``keys`` linearly interpolated between the neighbouring calibrated points.
+    """
+    below = max(point for point in points if point < flux)
+    above = min(point for point in points if point > flux)
+    assumptions = deepcopy(points[below])
+    for key in keys:
+        section, _, parameter = key.partition('/')
+        low, high = float(get_leaf(points[below], key)), float(get_leaf(points[above], key))
+        value = low+(high-low)*(flux-below)/(above-below)
+        if parameter:
+            assumptions[section][parameter] = value
+        else:
+            assumptions[section] = value
+    return assumptions
+
+def interpolation_errors(fluxes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Estimates the error of the linear interpolation of ``values`` at the
+    middle of each flux interval, from the curvature of the neighbouring
+    points: ``|f''| h²/8``, with ``f''/2`` the second divided difference of
+    the triplets of consecutive points containing the interval.
+
+    Args:
+        fluxes: Sorted flux points (at least 3).
+        values: Values at the flux points.
+
+    Returns:
+        Estimated error for each of the ``len(fluxes)-1`` intervals.
+    """
+    h  = np.diff(fluxes)
+    d1 = np.diff(values)/h
+    d2 = np.abs(np.diff(d1)/(fluxes[2:]-fluxes[:-2])) # Second divided differences (f''/2)
+    curvature = np.maximum(np.append(d2, d2[-1]), np.insert(d2, 0, d2[0])) # Both triplets of each interval
+    return curvature*h**2/4
+
+def refine(points: Dict[float, dict], tolerances: Dict[str, float], min_step: float) -> List[float]:
+    """
+    Args:
+        points: Assumptions after the calibration sequence, by flux point.
+        tolerances: Maximum interpolation error by ``'section/parameter'`` key
+                    (e.g. ``{'qubit/freq': 1e-3}``).
+        min_step: Minimum distance between two flux points.
+
+    Returns:
+        Middles of the flux intervals whose estimated interpolation error
+        (see :py:func:`interpolation_errors`) exceeds the tolerance of any key,
+        by decreasing ratio of the error to the tolerance.
+    """
+    fluxes = np.array(sorted(points))
+    if len(fluxes) < 3:
+        return []
+    ratios = np.zeros(len(fluxes)-1)
+    for key, tolerance in tolerances.items():
+        values = np.array([float(get_leaf(points[flux], key)) for flux in fluxes])
+        ratios = np.maximum(ratios, interpolation_errors(fluxes, values)/tolerance)
+    ratios[np.diff(fluxes)/2 < min_step] = 0
+    order  = np.argsort(-ratios, kind='stable')
+    return [float(fluxes[i]+(fluxes[i+1]-fluxes[i])/2) for i in order if ratios[i] > 1]
+
+def adaptive_flux_sweep(calibration_scheme: list = [], min_flux: float = -0.5, max_flux: float = 0.5,
+                        curr_flux: float = 0.0, npoints: int = 5,
+                        tolerances: Dict[str, float] = {'qubit/freq': 1e-3},
+                        min_step: float = 0.01, max_points: int = 100,
+                        pipeline: bool = True, predict: bool = False) -> Dict[float, dict]:
+    """Scan a flux range adaptively: execute a given calibration sequence on
+    a coarse grid of ``npoints`` flux points, then, round after round, at the
+    middle of the flux intervals where the calibrated parameters (``tolerances``
+    keys, e.g. ``qubit/freq``, ``qubit/T1``, ``qubit/T2``) vary too quickly to be
+    interpolated linearly (see :py:func:`refine`), until the estimated
+    interpolation errors are below the tolerances, the intervals reach
+    ``2*min_step``, or ``max_points`` flux points have been calibrated.
+
+    The coarse grid is one calibration sequence (see :py:meth:`qualib.main.Qualib.run_all`,
+    ``predict`` as in :py:func:`flux_sweep`). Each point of the next rounds is a
+    calibration sequence (``roundN_I`` in the log, report and history file names)
+    starting from the assumptions of its neighbouring calibrated points (see :py:func:`seed`).
+    The results (``tolerances`` keys by flux point) are written to
+    ``adaptive_sweep_resultsYYYYMMDD-HHMMSS.json`` after each round.
+
+    Returns:
+        Assumptions after the calibration sequence, by flux point.
+    """
+    results_filename = "adaptive_sweep_results" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    coarse = np.linspace(min_flux, max_flux, npoints)
+    fluxes = [*coarse[coarse <= curr_flux][::-1], *coarse[coarse > curr_flux]] # From curr_flux, as flux_sweep
+    assumptions = load_assumptions(log, 'flux_sweep_assumptions.py')
+
+    points: Dict[float, dict] = {}
+    start_time = time.perf_counter()
+    rounds = 0
+    while fluxes:
+        fluxes = fluxes[:max_points-len(points)] # Largest errors first
+        print(f'Round {rounds}: {len(fluxes)} flux point{"s" if len(fluxes) > 1 else ""}',
+              [f'{flux:.4f}' for flux in fluxes])
+        if not points:
+            history = qualib.run_all(flux_scheme(calibration_scheme, fluxes), assumptions,
+                                     pipeline=pipeline, predict=predict, name=f'round{rounds}')
+            for i, flux in enumerate(fluxes):
+                points[float(flux)] = history[(i+1)*len(calibration_scheme)-1]
+        else:
+            seeds = {flux: seed(points, flux, list(tolerances)) for flux in fluxes} # Before this round
+            for i, flux in enumerate(sorted(fluxes)):
+                history = qualib.run_all(flux_scheme(calibration_scheme, [flux]), seeds[flux],
+                                         pipeline=pipeline, name=f'round{rounds}_{i}')
+                points[float(flux)] = history[len(calibration_scheme)-1]
+        rounds += 1
+
+        with open(results_filename, 'w') as f:
+            json.dump({f'{flux:.6f}': {key: get_leaf(points[flux], key) for key in tolerances}
+                       for flux in sorted(points)}, f, indent=1, default=to_json)
+        fluxes = refine(points, tolerances, min_step) if len(points) < max_points else []
+    stop_time = time.perf_counter()
+
+    uniform = int(round((max_flux-min_flux)/min_step))+1
+    print(f'{(stop_time-start_time)/60:.2f} min (total)')
+    print(f'{(stop_time-start_time)/60/len(points):.2f} min/pt ({"pipelined" if pipeline else "serial"})')
+    print(f'{len(points)} flux points in {rounds} rounds ({uniform} at min_step on a uniform grid)')
+    return points
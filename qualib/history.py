@@ -0,0 +1,299 @@
+from __future__ import annotations
+import json
+from collections.abc import Sequence
+from typing import Dict, Tuple, Any, List, Iterator, Union
+
+Leaf = Tuple[str, ...] # ('section', 'parameter') or ('parameter',)
+
+class Deleted:
+    """Marks a leaf removed from the assumptions by a calibration."""
+
+    def __repr__(self) -> str:
+        return 'DELETED'
+
+DELETED = Deleted()
+
+def flatten(assumptions: dict) -> Dict[Leaf, Any]:
+    """
+    Args:
+        assumptions: Assumptions (dictionary of depth 1 or 2).
+
+    Returns:
+        Dictionary of ``(section, parameter): value`` and ``(parameter,): value`` pairs.
+    """
+    flat = {}
+    for root, value in assumptions.items():
+        if type(value) is dict and value:
+            for leaf, val in value.items():
+                flat[(root, leaf)] = val
+        else:
+            flat[(root,)] = value
+    return flat
+
+def unflatten(flat: Dict[Leaf, Any]) -> dict:
+    """Inverse of :py:func:`flatten`: leaves are shared, sections are new dictionaries.
+
+    Args:
+        flat: Flattened assumptions.
+
+    Returns:
+        Assumptions.
+    """
+    assumptions = {}
+    for key, val in flat.items():
+        if len(key) == 1:
+            assumptions[key[0]] = dict(val) if type(val) is dict else val
+        else:
+            assumptions.setdefault(key[0], {})[key[1]] = val
+    return assumptions
+
+def changed(prev: Any, next: Any) -> bool:
+    """
+    Args:
+        prev: Previous value of a leaf.
+        next: Next value of a leaf.
+
+    Returns:
+        ``True`` if the leaf has changed.
+    """
+    if prev is next:
+        return False
+    try:
+        return bool(prev != next) or type(prev) is not type(next)
+    except ValueError: # e.g. arrays
+        return True
+
+def diff(prev: Dict[Leaf, Any], next: Dict[Leaf, Any]) -> Dict[Leaf, Any]:
+    """
+    Args:
+        prev: Flattened assumptions before a calibration.
+        next: Flattened assumptions after the calibration.
+
+    Returns:
+        Leaves changed by the calibration (``DELETED`` for removed leaves).
+    """
+    changes = {key: val for key, val in next.items()
+               if key not in prev or changed(prev[key], val)}
+    changes.update({key: DELETED for key in prev.keys() - next.keys()})
+    return changes
+
+def leaf_key(leaf: Leaf) -> str:
+    """
+    Args:
+        leaf: Leaf of the assumptions.
+
+    Returns:
+        ``'section/parameter'`` or ``'parameter'`` (same syntax as the pre-placeholders).
+    """
+    return '/'.join(leaf)
+
+def to_json(value: Any) -> Any:
+    """``default`` of :py:func:`json.dumps` for non-native values (e.g. NumPy scalars and arrays)."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+class History(Sequence):
+    """Versioned assumptions store: keeps the initial assumptions and, for each
+    calibration, only the leaves it changed. Leaves (assumptions values) are
+    shared between versions and should be treated as immutable.
+
+    Any historical snapshot can be materialized on demand: ``history[i]``
+    returns the assumptions after the ``i``-th recorded calibration, and
+    iterating over the history materializes the snapshots incrementally.
+
+    If a ``path`` is given, the history is also written incrementally to a
+    JSON Lines file: the first line holds the initial assumptions, then each
+    recorded calibration appends one line holding only the leaves it changed
+    (``{"step": i, "name": ..., "set": {"section/parameter": value, ...}, "deleted": [...]}``).
+    See :py:func:`read_columns` and :py:func:`load_history`.
+
+    Args:
+        assumptions (dict): Initial assumptions.
+        path (str): Optional. Path to the JSON Lines file (e.g. ``logs/TIMESTAMP.jsonl``).
+
+    Attributes:
+        base (dict): Flattened initial assumptions.
+        flat (dict): Flattened assumptions after the last recorded calibration.
+        changes (list): Leaves changed by each recorded calibration
+                        (``DELETED`` for removed leaves).
+    """
+
+    def __init__(self, assumptions: dict, path: str = None):
+        self.base    = flatten(assumptions)
+        self.flat    = dict(self.base)
+        self.changes: List[Dict[Leaf, Any]] = []
+        self.path    = path
+        if path:
+            with open(path, 'w') as f: # Truncate
+                f.write(self.entry(0, '', self.base))
+
+    def entry(self, step: int, name: str, diff: Dict[Leaf, Any]) -> str:
+        """
+        Args:
+            step: Number of recorded calibrations (``0`` for the initial assumptions).
+            name: Name of the calibration.
+            diff: Leaves changed by the calibration.
+
+        Returns:
+            Line of the JSON Lines file.
+        """
+        return json.dumps({
+            'step':    step,
+            'name':    name,
+            'set':     {leaf_key(key): val for key, val in diff.items() if val is not DELETED},
+            'deleted': [leaf_key(key) for key, val in diff.items() if val is DELETED]
+        }, default=to_json)+'\n'
+
+    def head(self) -> dict:
+        """
+        Returns:
+            New copy of the current assumptions, e.g. for the next calibration to update.
+        """
+        return unflatten(self.flat)
+
+    def record(self, assumptions: dict, overrides: Dict[Leaf, Any] = {},
+               name: str = '', base: dict = None) -> Dict[Leaf, Any]:
+        """Records the assumptions after a calibration (and appends them to
+        the JSON Lines file, if any).
+
+        Args:
+            assumptions: Assumptions after the calibration.
+            overrides: Optional. Leaves to set in the recorded version
+                       (e.g. variables such as ``$flux``).
+            name: Optional. Name of the calibration.
+            base: Optional. Assumptions the calibration started from, if not the
+                  current version (e.g. calibrations processed concurrently, see
+                  :py:class:`qualib.scheduler.Scheduler`): only the leaves changed
+                  since ``base`` are applied to the current version.
+
+        Returns:
+            Leaves changed by the calibration.
+        """
+        flat = flatten(assumptions)
+        if base is not None:
+            flat = self.apply(dict(self.flat), diff(flatten(base), flat))
+        flat.update(overrides)
+        changes = diff(self.flat, flat)
+        self.changes.append(changes)
+        self.flat = flat
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(self.entry(len(self.changes), name, changes))
+        return changes
+
+    def apply(self, flat: Dict[Leaf, Any], diff: Dict[Leaf, Any]) -> Dict[Leaf, Any]:
+        """Applies the leaves changed by a calibration to flattened assumptions (in place).
+
+        Args:
+            flat: Flattened assumptions.
+            diff: Leaves changed by a calibration.
+
+        Returns:
+            ``flat``
+        """
+        for key, val in diff.items():
+            if val is DELETED:
+                flat.pop(key, None)
+            else:
+                flat[key] = val
+        return flat
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def __getitem__(self, step: Union[int, slice]) -> Union[dict, List[dict]]:
+        if type(step) is slice:
+            return [self[i] for i in range(*step.indices(len(self)))]
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError('History index out of range')
+        if step == len(self)-1:
+            return self.head()
+        flat = dict(self.base)
+        for diff in self.changes[:step+1]:
+            self.apply(flat, diff)
+        return unflatten(flat)
+
+    def __iter__(self) -> Iterator[dict]:
+        flat = dict(self.base)
+        for diff in self.changes:
+            yield unflatten(self.apply(flat, diff))
+
+def read_entries(path: str) -> Iterator[Tuple[Dict[str, Any], List[str]]]:
+    """
+    Args:
+        path: Path to a JSON Lines history file (see :py:class:`History`).
+
+    Returns:
+        Iterator over the ``(set, deleted)`` entries, initial assumptions first.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['set'], entry['deleted']
+
+def load_history(path: str) -> History:
+    """Rebuilds a history from its JSON Lines file (values come back as JSON
+    types, e.g. lists instead of arrays).
+
+    Args:
+        path: Path to a JSON Lines history file (see :py:class:`History`).
+
+    Returns:
+        History (not attached to the file).
+    """
+    entries = read_entries(path)
+    history = History({})
+    for step, (values, deleted) in enumerate(entries):
+        diff = {tuple(key.split('/')): val for key, val in values.items()}
+        diff.update({tuple(key.split('/')): DELETED for key in deleted})
+        if step == 0:
+            history.base = {key: val for key, val in diff.items() if val is not DELETED}
+            history.flat = dict(history.base)
+        else:
+            history.changes.append(diff)
+            history.apply(history.flat, diff)
+    return history
+
+def read_columns(path: str, *keys: str, initial: bool = False) -> Dict[str, Any]:
+    """Reads the values of given leaves after each calibration from a JSON
+    Lines history file, e.g. to plot ``qubit/freq`` versus ``$flux``::
+
+        columns = read_columns('logs/TIMESTAMP.jsonl', 'qubit/freq', '$flux')
+        plt.plot(columns['$flux'], columns['qubit/freq'])
+
+    Only the lines changing one of the leaves are decoded; the other steps
+    repeat the previous values. Leaves that are not defined yet (or have been
+    deleted) are ``nan``.
+
+    Args:
+        path: Path to a JSON Lines history file (see :py:class:`History`).
+        keys: ``'section/parameter'`` or ``'parameter'``, with or without a leading ``$``.
+        initial: Optional. Also return the initial values as the first row.
+
+    Returns:
+        Dictionary of ``key: array`` pairs (one value per calibration).
+    """
+    import numpy as np
+
+    leaves  = [key.lstrip('$') for key in keys]
+    needles = [json.dumps(leaf) for leaf in leaves]
+    current = [np.nan]*len(leaves)
+    rows    = []
+    with open(path) as f:
+        for step, line in enumerate(f):
+            if not line.strip():
+                continue
+            if any(needle in line for needle in needles):
+                entry = json.loads(line)
+                for i, leaf in enumerate(leaves):
+                    if leaf in entry['set']:
+                        current[i] = entry['set'][leaf]
+                    elif leaf in entry['deleted']:
+                        current[i] = np.nan
+            if step or initial:
+                rows.append(list(current))
+    return {key: np.array([row[i] for row in rows]) for i, key in enumerate(keys)}
@@ -1,10 +1,39 @@
 from __future__ import annotations
 import importlib
 import os
-from typing import Tuple
+from typing import Tuple, Dict, Callable, Any, List, TYPE_CHECKING
 from .calibrations.CALIBRATION_NAME_utils import Calibration
+from .calibrations.default import DefaultCalibration
 from .log import Log
 
+if TYPE_CHECKING:
+    import nbformat as nb # Imported on first use (startup time)
+
+# Template registry: path -> (modification time, loaded and validated object)
+registry: Dict[str, Tuple[float, Any]] = {}
+
+def load_cached(log: Log, prefix: str, path: str, loader: Callable[[], Any]) -> Any:
+    """Loads a calibration file once per process, and again only if it has
+    been modified since (e.g. a template edited in the middle of a campaign).
+    
+    Args:
+        log: Logging object.
+        prefix: Prefix of the log entry.
+        path: Path to the file to load.
+        loader: Function loading and validating the file.
+    
+    Returns:
+        Object returned by ``loader``, possibly from the registry.
+    """
+    mtime = os.path.getmtime(path)
+    entry = registry.get(path)
+    if entry and entry[0] == mtime:
+        return entry[1]
+    if entry:
+        log.info(prefix, f'"{path}" has been modified since it was loaded: reloading it')
+    registry[path] = (mtime, loader())
+    return registry[path][1]
+
 def load_calibration_scheme(log: Log, path: str) -> Tuple[list, str]:
     """
     Args:
@@ -53,10 +82,18 @@ def load_utils(log: Log, name: str, prefix: str) -> Calibration:
         Calibration class from ``CALIBRATION_NAME_utils.py``.
     """
     path = f'qualib.calibrations.{name}.{name}_utils'
+    file = os.path.join(os.path.dirname(__file__), f'calibrations/{name}/{name}_utils.py')
     log.info(prefix, f'Importing Calibration class from "qualib/calibrations/{name}/{name}_utils.py"')
-    try:
+    def loader():
         module = importlib.import_module(path)
-        return getattr(module, 'Calibration')
+        if file in registry: # Modified since the last import
+            module = importlib.reload(module)
+        calibration = getattr(module, 'Calibration')
+        assert issubclass(calibration, DefaultCalibration),\
+               f'{path}.Calibration should inherit from DefaultCalibration'
+        return calibration
+    try:
+        return load_cached(log, prefix, file, loader)
     except:
         log.error(f'Unable to import Calibration class from {path}')
         log.exc()
@@ -74,10 +111,42 @@ def load_exopy_template(log: Log, name: str, prefix: str) -> str:
     """
     path = os.path.join(os.path.dirname(__file__), f'calibrations/{name}/{name}_template.meas.ini')
     log.info(prefix, f'Loading Exopy measurements template "{path}"')
-    try:
+    def loader():
         with open(path, encoding='utf-8') as f:
-            return f.read()
+            templ = f.read()
+        assert '[root_task]' in templ, f'{path} is not an Exopy measurement file'
+        return templ
+    try:
+        return load_cached(log, prefix, path, loader)
+    except:
+        log.error(f'Unable to load {path}')
+        log.exc()
+        raise
+
+def load_report_template(log: Log, name: str, prefix: str) -> List[nb.NotebookNode]:
+    """
+    Args:
+        log: Logging object.
+        name: Name of the calibration. The report template to load should be named ``template_{name}.ipynb`` under ``qualib/calibrations/{name}``.
+        prefix: Prefix of the log entry (whose format will be ``[timestamp] [INFO] prefix: message``).
+    
+    Returns:
+        Copy of the cells of the report template for a given calibration name.
+    """
+    import nbformat as nb # Imported on first use (startup time)
+
+    path = os.path.join(os.path.dirname(__file__), f'calibrations/{name}/template_{name}.ipynb')
+    log.info(prefix, f'Loading report template "{path}"')
+    def loader():
+        cells = nb.read(path, as_version=4).cells
+        if not any('_results' in cell['source'] for cell in cells if cell['cell_type'] == 'code'):
+            log.warn(prefix, f'{path} does not define the mandatory _results interface')
+        return cells
+    try:
+        cells = load_cached(log, prefix, path, loader)
     except:
         log.error(f'Unable to load {path}')
         log.exc()
-        raise
\ No newline at end of file
+        raise
+    # Cells sources are rendered in place: copy the cells, not their contents
+    return [nb.NotebookNode(cell) for cell in cells]
\ No newline at end of file
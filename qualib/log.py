@@ -1,8 +1,14 @@
 from __future__ import annotations
+import sys
 import json
+import time
+import queue
+import atexit
+import threading
 import traceback
-from datetime import datetime, time
+from datetime import datetime
 from typing import Union
+from .profiling import Profile
 
 class Log():
     """Logs timestamped and labeled informations ("info"), debug informations
@@ -10,13 +16,22 @@ class Log():
     
     Keyword arguments ``**kwargs`` are not supported yet, but may be added in
     future versions.
+
+    Log entries are queued and written by a dedicated writer thread, which
+    opens the log file once and flushes it every ``flush_interval`` seconds,
+    so that logging never blocks on the filesystem. Call :py:meth:`Log.flush`
+    or :py:meth:`Log.close` to make sure that all the entries have been written.
+
+    ``log.profile`` aggregates the durations of the spans of the run (see
+    :py:class:`qualib.profiling.Profile`), including the writes of the log file.
     """
 
-    def initialize(self, timestamp: str, max_label_len: int = 5) -> Log:
+    def initialize(self, timestamp: str, max_label_len: int = 5, flush_interval: float = 1.0) -> Log:
         """
         Args:
             timestamp: Timestamp string
             max_label_len: Maximum label length in characters (e.g. ``5`` if the possible labels are ``DEBUG``, ``INFO``, ``WARN`` and ``ERROR``). Log entries (``prefix: message`` or ``message``) are aligned according to this constant: set ``max_label_len`` to ``0`` to disable log entries alignment.
+            flush_interval: Maximum delay in seconds between the logging of an entry and its writing to the log file.
             
         Returns:
             A logging object.
@@ -24,6 +39,77 @@ class Log():
         self.show_debug_messages = False
         self.path = f'logs/{timestamp}.log'
         self.max_label_len = max_label_len
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.writer = None
+        self.profile = Profile()
+        return self
+
+    def start(self) -> Log:
+        """Starts the writer thread, unless it is already running.
+
+        Returns:
+            ``self``
+        """
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(target=self.write, name=f'Log({self.path})', daemon=True)
+            self.writer.start()
+            atexit.register(self.close)
+        return self
+
+    def write(self) -> None:
+        """Writer thread loop: writes queued entries to ``self.path`` until
+        :py:meth:`Log.close` is called.
+
+        """
+        try:
+            f = open(self.path, 'a', encoding='utf-8')
+        except OSError as e:
+            print(f'Unable to open "{self.path}": {e}', file=sys.stderr)
+            f = sys.stderr
+        flushed = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ''
+            if type(item) is str and item:
+                with self.profile.span('log/write'):
+                    f.write(item)
+            if item is None or type(item) is threading.Event or time.monotonic() - flushed >= self.flush_interval:
+                with self.profile.span('log/flush'):
+                    f.flush()
+                flushed = time.monotonic()
+            if type(item) is threading.Event:
+                item.set()
+            if item is None:
+                break
+        if f is not sys.stderr:
+            f.close()
+
+    def flush(self) -> Log:
+        """Blocks until all the queued entries have been written and flushed.
+
+        Returns:
+            ``self``
+        """
+        if self.writer is not None and self.writer.is_alive():
+            flushed = threading.Event()
+            self.queue.put(flushed)
+            flushed.wait()
+        return self
+
+    def close(self) -> Log:
+        """Writes all the queued entries, then stops the writer thread.
+        The writer thread is restarted by the next log entry, if any.
+
+        Returns:
+            ``self``
+        """
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        atexit.unregister(self.close)
         return self
     
     def debug(self, prefix: str, *lines: str, **kwargs) -> Log:
@@ -106,11 +192,24 @@ class Log():
                        ' '*(self.max_label_len - len(label)),
                        f'{" "+prefix if prefix else ""}'])
         
-        with open(self.path, 'a', encoding='utf-8') as f:
-            for line in lines:
-                f.write(f'{pre} {line}\n')
+        self.start()
+        self.queue.put(''.join([f'{pre} {line}\n' for line in lines]))
+        return self
+
+    def entries(self, entries: str) -> Log:
+        """Logs entries formatted by another logging object (e.g. in a worker process).
+
+        Args:
+            entries: Formatted log entries.
+
+        Returns:
+            ``self``
+        """
+        if entries:
+            self.start()
+            self.queue.put(entries)
         return self
-                
+
     def json(self, obj: list|dict) -> str:
         """Returns an indented string representation of an object.
         
@@ -1,31 +1,86 @@
 import os
-from re import sub, findall, MULTILINE
+from re import findall, MULTILINE
 import sys
 import json
 import traceback
-import subprocess
-from copy import deepcopy
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import wait as wait_futures
 
-from pathlib import Path
-from datetime import datetime, time
-from typing import List, Dict, Union
+from datetime import datetime
+from typing import List, Dict, Tuple, Union
 
-from numpy.lib.function_base import place
 from .load import load_calibration_scheme, load_assumptions
 from .load import load_exopy_template, load_utils
 from .log import Log
-from .calibrations.default import Report
+from .backends import Backend, SubprocessBackend
+from .history import History, load_history, flatten, unflatten, diff, leaf_key, to_json
+from .checkpoint import Checkpoint, load_checkpoint, save_scheme, load_scheme, truncate_lines
+from .scheduler import Scheduler
+from .predict import Predictor
+from .retry import classify, process, ANALYSIS, FIT
+from .replay import load_run, hdf5_filename, prepare, start_worker, analyze
+from .calibrations.default import Report, Kernel, get_json_log
+
+def get_variables(substitutions: Dict[str, str]) -> Tuple[List[Tuple[str, str, str]], dict]:
+    """Handles variables (``$parameter`` in ``substitutions``, such as ``$flux``).
+
+    Args:
+        substitutions: Dictionary of substitutions.
+
+    Returns:
+        Variables (``('$section/parameter', 'section', 'parameter')``),
+        leaves to set in the history (see :py:meth:`qualib.history.History.record`).
+    """
+    variables = findall(r'(\$([a-z0-9_]+)(?:/([a-z0-9_]+))?)',
+                               " ".join(substitutions.keys()),
+                               MULTILINE)
+    overrides = {}
+    for tree, root, leaf in variables:
+        overrides[(root, leaf) if leaf else (root,)] = float(substitutions[tree])
+    return variables, overrides
+
+class PipelineError(Exception):
+    """Raised when the pipelined post-processing of a calibration fails
+    (see ``pipeline`` in :py:meth:`Qualib.run_all`).
+    
+    """
 
 class Qualib:
     """Wrapper supclass.
 
+    Args:
+        backend (Backend): Optional. Measurement backend
+                           (:py:class:`qualib.backends.SubprocessBackend` by default).
     """
 
-    retries = 0
+    executor: ThreadPoolExecutor = None # Post-processing worker (pipelined mode)
+    pending: Future = None              # Post-processing of the previous calibration
+    stream_interval = 0.0               # Delay between partial analyses (streaming mode)
+    checkpoint: Checkpoint = None       # State of the sequence, saved after each calibration
+    measured = frozenset()              # Ranks of the calibrations measured before a resume
+    predictor: Predictor = None         # Predictions from the run history (warm start)
+
+    def __init__(self, backend: Backend = None):
+        self.backend = backend or SubprocessBackend()
+
+    def close(self) -> None:
+        """Releases the measurement backend (e.g. stops a resident Exopy server).
+
+        """
+        self.backend.close()
     
     def run(self, log: Log, report: Report, assumptions: dict, id: int,
-            name: str, substitutions: Dict[str, str], timestamp: str) -> None:
+            name: str, substitutions: Dict[str, str], timestamp: str,
+            kernel: Kernel = None, scheduler: Scheduler = None, failure: str = None) -> None:
         """Runs a single calibration with given assumptions and Exopy template.
+
+        Failed calibrations are retried according to their failure (see
+        :py:func:`qualib.retry.classify`): failed analyses are first retried on
+        the same measurement file (see :py:func:`qualib.retry.process`), and the
+        calibration is only measured again, up to ``assumptions['retries']``
+        times, if no analysis succeeded (with a wider scan, see ``widen`` in
+        :py:class:`qualib.calibrations.default.DefaultCalibration`) or after any
+        other failure (with the same scan).
         
         Args:
             log: Logging object.
@@ -36,6 +91,11 @@ class Qualib:
             name: Name of the calibration to run (in lowercase).
             substitutions: Dictionary of substitutions.
             timestamp: Timestamp used to create the log and report files.
+            kernel: Optional. Analysis kernel shared by the calibrations of the sequence.
+            scheduler: Optional. If given, the calibration is only measured here, then
+                       processed concurrently and committed in order by the scheduler.
+            failure: Optional. Failure of a previous attempt processed by the
+                     scheduler (see :py:mod:`qualib.retry`): the calibration is measured again.
         """
         subs_name = substitutions['NAME']
         full      = f'{name}_{subs_name}' if subs_name else name
@@ -44,84 +104,227 @@ class Qualib:
         def log_info(*lines):
             log.info(prefix, *lines) # Define calibration prefix here
 
+        def span(name):
+            return log.profile.span(name, prefix) # Time a phase of the calibration
+
         log_info(f'Starting calibration with {len(substitutions)} '
                  f'substitution{"s" if len(substitutions) > 1 else ""}')
         log_info(*log.json(substitutions))
-        
-        try:
-            Calibration = load_utils(log, name, prefix)
-            exopy_templ = load_exopy_template(log, name, prefix)
-            
-            log_info('Initializing calibration')
-            calibration = Calibration(log, report, assumptions, id, name,
-                                      substitutions, exopy_templ, prefix,
-                                      timestamp)
-            
-            log_info('Handling substitutions')
-            calibration.handle_substitutions()
 
-            log_info('Pre-processing (handling pre-placeholders)')
-            calibration.pre_process()
+        retries = assumptions.get('retries') or 0
+        retry   = 0 # Re-measurements
+        widen   = 0 # Re-measurements after failed analyses
+        while True:
+            if failure:
+                retry += 1
+                widen += failure in (ANALYSIS, FIT)
+                log_info(f'Measuring again after a {failure} failure ({retry}/{retries})')
+                failure = None
+            phase, calibration = 'setup', None
+            try:
+                with span('load'):
+                    Calibration = load_utils(log, name, prefix)
+                    exopy_templ = load_exopy_template(log, name, prefix)
+                
+                log_info('Initializing calibration')
+                with span('initialize'):
+                    calibration = Calibration(log, report, assumptions, id, name,
+                                              substitutions, exopy_templ, prefix,
+                                              timestamp, kernel)
+                    calibration.predictor = self.predictor
+                    calibration.widen     = widen
+                
+                log_info('Handling substitutions')
+                with span('substitutions'):
+                    calibration.handle_substitutions()
 
-            log_info('Updating report')
-            report.add_calibration(calibration)
+                log_info('Pre-processing (handling pre-placeholders)')
+                with span('pre_process'):
+                    calibration.pre_process()
 
-            log_info('Calling Exopy')
-            part_one = Path(os.path.realpath(__file__)).parent
-            part_two = f'calibrations/{name}/{name}.meas.ini'
-            ini_path = str(part_one / part_two)
-            subprocess.run(['python', '-m', 'exopy', '-s', '--measurement-execute', ini_path],
-                           capture_output=True, shell=True)
-            
-            log_info('Processing (fetching results and updating assumptions)')
-            calibration.process()
+                phase = 'measure'
+                if id in self.measured and os.path.exists(calibration.hdf5_path):
+                    log_info(f'Reusing "{calibration.hdf5_path}" (measured before the interruption)')
+                    self.measured = self.measured - {id} # Measure again if retried
+                elif self.stream_interval:
+                    log_info('Calling Exopy')
+                    with span('measure'):
+                        job = self.backend.submit(log, prefix, calibration.meas_path)
+                        stopped = calibration.stream(job, self.stream_interval)
+                        if job.wait() and not stopped:
+                            log.warn(prefix, f'Measurement exited with status {job.returncode}')
+                    if stopped:
+                        log_info('Measurement stopped early')
+                else:
+                    log_info('Calling Exopy')
+                    with span('measure'):
+                        self.backend.execute(log, prefix, calibration.meas_path)
+                if self.checkpoint:
+                    self.checkpoint.measured(id)
+
+                phase = 'process'
+                if scheduler:
+                    log_info('Processing in a worker thread')
+                    scheduler.submit(calibration)
+                    return assumptions
+
+                with span('wait'):
+                    self.wait() # The report is updated in order
+                log_info('Updating report')
+                with span('report'):
+                    report.add_calibration(calibration)
+                
+                log_info('Processing (fetching results and updating assumptions)')
+                with span('process'):
+                    process(calibration)
+                assumptions = calibration.assumptions
+
+                phase = 'finish'
+                if self.executor:
+                    # Post-process and report while the next calibration is measured
+                    self.pending = self.executor.submit(self.finish, calibration)
+                else:
+                    self.finish(calibration)
+                return assumptions
+            except PipelineError:
+                log.error(prefix, 'Post-processing of the previous calibration failed')
+                for line in traceback.format_exc().splitlines():
+                    log.error('', line)
+                raise
+            except KeyboardInterrupt:
+                self.wait(raise_errors=False)
+                report.checkpoint(render=True)
+                log.error(prefix, f'{sys.exc_info()[1]}')
+                for line in traceback.format_exc().splitlines():
+                    log.error('', line)
+                raise # Propagate the exception to show the stack
+                      # trace and prevent the next calibration
+            except:
+                self.wait(raise_errors=False)
+                report.checkpoint(render=True)
+                log.error(prefix, *str(sys.exc_info()[1]).splitlines())
+                for line in traceback.format_exc().splitlines():
+                    log.error('', line)
+                failure = classify(phase, calibration, sys.exc_info()[1])
+                if retry >= retries:
+                    raise # Propagate the exception to show the stack
+                          # trace and prevent the next calibration
+
+    def finish(self, calibration) -> None:
+        """Post-processes a calibration and reports its results.
 
-            log_info('Post-processing')
+        Args:
+            calibration: Processed instance of a Calibration class.
+        """
+        profile = calibration.log.profile
+        calibration.log.info(calibration.pre, 'Post-processing')
+        with profile.span('post_process', calibration.pre):
             calibration.post_process()
 
-            log_info('Reporting results')
-            report.add_results(calibration)
-            assumptions = deepcopy(calibration.assumptions)
-            Qualib.retries = 0
-            return deepcopy(assumptions)
-        except KeyboardInterrupt:
-            log.error(prefix, f'{sys.exc_info()[1]}')
-            for line in traceback.format_exc().splitlines():
-                log.error('', line)
-            raise # Propagate the exception to show the stack
-                  # trace and prevent the next calibration
-        except:
-            log.error(prefix, *str(sys.exc_info()[1]).splitlines())
-            for line in traceback.format_exc().splitlines():
-                log.error('', line)
-            if Qualib.retries < (assumptions.get('retries') or 0):
-                log_info('Retrying ')
-                Qualib.retries += 1
-                return self.run(log, report, assumptions, id,
-                                name, substitutions, timestamp)
-            Qualib.retries = 0
-            raise # Propagate the exception to show the stack
-                  # trace and prevent the next calibration
-        
+        calibration.log.info(calibration.pre, 'Reporting results')
+        with profile.span('results', calibration.pre):
+            calibration.report.add_results(calibration)
+
+    def save(self, id: int, history: History) -> None:
+        """Saves the checkpoint of the sequence after a successful calibration,
+        once its results have been reported (after the pending post-processing, if pipelined).
+
+        Args:
+            id: Rank of the calibration.
+            history: History of the assumptions.
+        """
+        if not self.checkpoint:
+            return
+        state = (id, len(history))
+        if not self.pending:
+            self.checkpoint.save(*state)
+            return
+        def save_after(finish: Future):
+            finish.result() # Raise post-processing errors
+            self.checkpoint.save(*state)
+        self.pending = self.executor.submit(save_after, self.pending)
+
+    def wait(self, raise_errors: bool = True) -> None:
+        """Waits for the post-processing of the previous calibration, if pipelined.
+
+        Args:
+            raise_errors: Raise a :py:class:`PipelineError` if the post-processing failed.
+        """
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return
+        wait_futures([pending])
+        if raise_errors and pending.exception():
+            raise PipelineError(str(pending.exception())) from pending.exception()
     
-    def run_all(self, pkg_calib_scheme: Union[str, list] = '', assumptions: dict = {}) -> list:
+    def run_all(self, pkg_calib_scheme: Union[str, list] = '', assumptions: dict = {},
+                pipeline: bool = False, stream_interval: float = 0.0, workers: int = 0,
+                resume: str = '', trace: bool = False, predict: bool = False, name: str = '') -> History:
         """Runs a calibration sequence whose path is either passed:
         
             * As ``pkg_calib_scheme`` --- package usage examples:
               ``Qualib().run_all('calibration_scheme.py', assumptions_dict)``, ``Qualib().run_all(calibration_scheme_list)``
             * Or in ``sys.argv`` --- CLI/module usage:
               ``python -m qualib.main calibration_scheme.py``.
+
+        ``sys.argv`` is ignored when both ``pkg_calib_scheme`` and ``assumptions``
+        (or ``resume``) are passed, e.g. when several sequences are run by
+        :py:class:`qualib.session.Session` or from a script with its own arguments.
+
+        An interrupted sequence can be resumed from its last successful calibration
+        (see :py:class:`qualib.checkpoint.Checkpoint`) with ``resume`` or
+        ``python -m qualib.main --resume TIMESTAMP``: the log, report and history
+        files of the interrupted run are continued.
         
         Args:
             pkg_calib_scheme: Path to the Python file defining
                               the calibration sequence to run (``str``)
                               or calibration sequence to run (``list``).
             assumptions: Optional. Custom assumptions ``dict``.
+            pipeline: Optional. Post-process and report each calibration in a
+                      worker thread while the next one is being measured
+                      (processing still happens before the next measurement,
+                      since it updates the assumptions).
+            stream_interval: Optional. If nonzero, analyze each measurement file every
+                             ``stream_interval`` seconds while it is being acquired, and stop
+                             the measurement as soon as the fit passes the checks
+                             (see :py:meth:`qualib.calibrations.default.DefaultCalibration.stream`).
+            workers: Optional. If nonzero, process up to ``workers`` calibrations concurrently
+                     when they do not depend on each other's assumptions, while the
+                     next ones are measured (see :py:class:`qualib.scheduler.Scheduler`).
+                     Results are identical to a serial run. Not compatible with ``pipeline``.
+            resume: Optional. Timestamp of an interrupted sequence to resume
+                    (``logs/TIMESTAMP.checkpoint.json``): the calibration sequence is read
+                    from ``logs/TIMESTAMP.scheme.json``, the assumptions from the history
+                    truncated at the checkpoint, and the HDF5 files of the
+                    calibrations measured after the last successful one are reused.
+            trace: Optional. Also export every span (phase of a calibration, report
+                   and log writes) to ``logs/TIMESTAMP.trace.json``, in the Chrome
+                   trace event format (see :py:meth:`qualib.profiling.Profile.save_trace`).
+            predict: Optional. Warm-start the calibrations of a sweep (``$flux``) from the
+                     values measured at the previous points (see :py:class:`qualib.predict.Predictor`):
+                     e.g. ``spectro_qubit`` scans a narrower window around the extrapolated
+                     ``qubit/freq``, and fits start from extrapolated parameters.
+                     Not compatible with ``workers``.
+            name: Optional. Name of the sequence (e.g. qubit), appended to the timestamp
+                  of its files (``TIMESTAMP_NAME``), so that several sequences can run
+                  concurrently (see :py:class:`qualib.session.Session`).
+
+        The durations of the spans are aggregated in ``logs/TIMESTAMP.profile.json``
+        (see :py:class:`qualib.profiling.Profile`), and summarized in a table
+        printed at the end of the sequence.
+
+        Returns:
+            History of the assumptions (``history[i]`` gives the assumptions
+            after the ``i+1``-th calibration), also appended to
+            ``logs/TIMESTAMP.jsonl`` after each calibration.
         """
-        assert len(sys.argv) > 1 or pkg_calib_scheme, '\n'.join([
+        explicit = bool(pkg_calib_scheme and assumptions or resume)
+        assert len(sys.argv) > 1 or pkg_calib_scheme or resume, '\n'.join([
             'Missing calibration scheme\n',
             '  CLI usage:',
-            '    python -m qualib.main calibration_scheme.py\n',
+            '    python -m qualib.main calibration_scheme.py',
+            '    python -m qualib.main --resume TIMESTAMP\n',
             '  Package usage:',
             '      pip install qualib',
             '    then',
@@ -131,21 +334,40 @@ class Qualib:
         ])
 
         calib_scheme_path = ''
-        if len(sys.argv) > 1:
+        if explicit:
+            calib_scheme_path = pkg_calib_scheme
+        elif len(sys.argv) > 2 and sys.argv[1] == '--resume':
+            resume = sys.argv[2]
+        elif len(sys.argv) > 1:
             calib_scheme_path = sys.argv[1]
         else:
             calib_scheme_path = pkg_calib_scheme
             
-        timestamp = datetime.now().strftime('%y_%m_%d_%H%M%S')
+        timestamp = resume or datetime.now().strftime('%y_%m_%d_%H%M%S')+(f'_{name}' if name else '')
+        checkpoint_path = f'logs/{timestamp}.checkpoint.json'
+        scheme_path     = f'logs/{timestamp}.scheme.json'
+        history_path    = f'logs/{timestamp}.jsonl'
 
         log = Log()
         log.initialize(timestamp)
         log.show_debug_messages = True
+        log.profile.trace = trace
         
         def log_info(*lines):
             log.info('', *lines) # Define global prefix here
 
-        if type(pkg_calib_scheme) is list:
+        state = {}
+        if resume:
+            log_info(f'Resuming from "{checkpoint_path}"')
+            state    = load_checkpoint(checkpoint_path)
+            seq_list = load_scheme(scheme_path)
+            seq_str  = json.dumps(seq_list, indent=4)
+            truncate_lines(history_path, state['history']+1) # Drop the entries after the checkpoint
+            history  = load_history(history_path)
+            history.path = history_path
+            assumptions  = unflatten(history.base)
+            log_info(f'{state["index"]}/{len(seq_list)} calibrations done')
+        elif type(pkg_calib_scheme) is list:
             seq_list, seq_str = pkg_calib_scheme, json.dumps(pkg_calib_scheme, indent=4)
         else:
             log_info(f'Reading and parsing "{calib_scheme_path}"')
@@ -157,39 +379,178 @@ class Qualib:
 
         report_path = f'reports/report_{timestamp}.ipynb'
         log_info(f'Initializing "{report_path}"')
-        report = Report(log, report_path, assumptions, seq_str, timestamp)
+        report = Report(log, report_path, assumptions, seq_str, timestamp, state.get('report'))
+        kernel = Kernel(log, report.header, get_json_log(timestamp))
 
+        assert not (pipeline and workers), 'pipeline and workers are mutually exclusive'
+        assert not (predict and workers), 'predict and workers are mutually exclusive'
+        self.executor = ThreadPoolExecutor(max_workers=1) if pipeline else None
+        self.stream_interval = stream_interval
         log_info('Starting calibration sequence')
-        assumptions_ls = []
-        with open(f"logs/{timestamp}.json", "w") as f:
-            f.write(json.dumps(assumptions_ls, indent=4))
-        for id, calibration in enumerate(seq_list, start=1):
-            substitutions = calibration.get('substitutions') or {}
-            if not substitutions.get('NAME'):
-                substitutions['NAME'] = ''
-            assumptions_ls += [self.run(log, report, assumptions, id, calibration['name'],
-                                       substitutions, timestamp)]
-
-            # Handle variables ("$parameter" in "substitutions", such as "$flux")
-            variables = findall(r'(\$([a-z0-9_]+)(?:/([a-z0-9_]+))?)',
-                                       " ".join(substitutions.keys()),
-                                       MULTILINE)
-            log.info(f'{calibration["name"]}:', f'Updating variables in "logs/{timestamp}.json"')
-            log.info(f'{calibration["name"]}:', *variables)
-            for tree, root, leaf in variables:
-                log.debug(f'{calibration["name"]}:', str((tree, root, leaf)))
-                if leaf:
-                    assumptions_ls[-1][root][leaf] = float(substitutions[tree])
-                else:
-                    assumptions_ls[-1][root] = float(substitutions[tree])
+        if not resume:
+            history = History(assumptions, history_path)
+        self.checkpoint = Checkpoint(checkpoint_path, report, {
+            'timestamp': timestamp, 'index': 0, 'history': 0, 'report': {}, 'measured': [], **state
+        })
+        self.measured = frozenset(state.get('measured', []))
+        self.predictor = Predictor(history) if predict else None
+        if not resume:
+            save_scheme(scheme_path, seq_list)
+            self.checkpoint.save(0, 0)
+        scheduler = Scheduler(self, log, report, kernel, history, timestamp, workers) if workers else None
+        try:
+            steps = []
+            for id, calibration in enumerate(seq_list, start=1):
+                if id <= state.get('index', 0):
+                    continue # Done before the interruption
+                substitutions = calibration.get('substitutions') or {}
+                if not substitutions.get('NAME'):
+                    substitutions['NAME'] = ''
+
+                variables, overrides = get_variables(substitutions)
+                for variable in variables:
+                    log.debug(f'{calibration["name"]}:', str(variable))
+                steps.append((id, calibration['name'], substitutions, variables, overrides))
+
+            if scheduler:
+                for id, name, substitutions, _, overrides in steps:
+                    scheduler.plan(id, name, substitutions, overrides)
+                for wave, wave_steps in enumerate(scheduler.waves()):
+                    log_info(f'Wave {wave}: {", ".join(map(repr, wave_steps))}')
+
+            for id, name, substitutions, variables, overrides in steps:
+                if scheduler:
+                    scheduler.run(scheduler.steps[id])
+                    continue
+                assumptions = self.run(log, report, history.head(), id, name,
+                                       substitutions, timestamp, kernel)
+                log.info(f'{name}:', f'Updating variables in "logs/{timestamp}.jsonl"')
+                log.info(f'{name}:', *variables)
+                prefix = f'{name}_{substitutions["NAME"]}:' if substitutions['NAME'] else f'{name}:'
+                with log.profile.span('history', prefix):
+                    history.record(assumptions, overrides, name)
+                self.save(id, history)
+            if scheduler:
+                scheduler.commit()
+            self.wait()
+            log_info('Done')
+        finally:
+            if scheduler:
+                scheduler.close()
+            self.wait(raise_errors=False)
+            if self.executor:
+                self.executor.shutdown()
+                self.executor = None
+            self.checkpoint = None
+            self.measured   = frozenset()
+            self.predictor  = None
+            report.close()
+            summary = log.profile.summary()
+            log_info(f'Profile (see "logs/{timestamp}.profile.json")', *summary)
+            log.close() # Write pending log entries, even on errors and KeyboardInterrupt
+            log.profile.save(f'logs/{timestamp}.profile.json')
+            if trace:
+                log.profile.save_trace(f'logs/{timestamp}.trace.json')
+            print('\n'.join(summary))
+        return history
+
+    def replay(self, timestamp: str, workers: int = None) -> History:
+        """Analyzes the HDF5 files of a stored run again, without measuring
+        (e.g. to test a modified report template over many measurements):
+        ``Qualib().replay(TIMESTAMP)`` or ``python -m qualib.main --replay TIMESTAMP``.
+
+        Each calibration recorded in ``logs/TIMESTAMP.jsonl`` is processed from the
+        assumptions it started from in the stored run, so that the calibrations are
+        independent and processed in parallel, in a pool of worker processes. The
+        results and log entries are then post-processed, reported, logged and
+        recorded in order, in a new report, log and history; the leaves updated
+        differently than in the stored run are logged as warnings.
+
+        Args:
+            timestamp: Timestamp of the stored run.
+            workers: Optional. Number of worker processes (number of CPUs by default).
+
+        Returns:
+            History of the assumptions of the replay.
+        """
+        replay_timestamp = datetime.now().strftime('%y_%m_%d_%H%M%S')
+
+        log = Log()
+        log.initialize(replay_timestamp)
+        log.show_debug_messages = True
+
+        def log_info(*lines):
+            log.info('', *lines) # Define global prefix here
+
+        report = None
+        try:
+            log_info(f'Replaying "logs/{timestamp}.jsonl"')
+            seq_list, stored = load_run(timestamp)
+            assumptions = unflatten(stored.base)
+
+            report_path = f'reports/report_{replay_timestamp}.ipynb'
+            log_info(f'Initializing "{report_path}"')
+            report  = Report(log, report_path, assumptions, json.dumps(seq_list, indent=4), replay_timestamp)
+            kernel  = Kernel(log, report.header, get_json_log(replay_timestamp))
+            history = History(assumptions, f'logs/{replay_timestamp}.jsonl')
+            if len(stored) < len(seq_list):
+                log.warn('', f'Only {len(stored)}/{len(seq_list)} calibrations recorded: '
+                             f'skipping the next ones')
+
+            steps = []
+            for id, (calibration, before) in enumerate(zip(seq_list, [assumptions, *stored]), start=1):
+                if id > len(stored):
+                    break
+                substitutions = calibration.get('substitutions') or {}
+                if not substitutions.get('NAME'):
+                    substitutions['NAME'] = ''
+                filename = hdf5_filename(timestamp, id, calibration['name'], substitutions)
+                steps.append((id, calibration['name'], substitutions, before, filename))
+
+            # Pre-process in order, then process in parallel
+            calibrations = [prepare(log, report, before, id, name, substitutions, replay_timestamp, kernel, filename)
+                            for id, name, substitutions, before, filename in steps]
+            failed = []
+            with ProcessPoolExecutor(workers, initializer=start_worker, initargs=(replay_timestamp,)) as pool:
+                futures = [pool.submit(analyze, *step) for step in steps]
+                for (id, name, substitutions, before, _), calibration, future in zip(steps, calibrations, futures):
+                    results, after, error, entries = future.result()
+                    log.entries(entries)
+                    _, overrides = get_variables(substitutions)
+                    if error:
+                        failed.append(id)
+                        for line in error.splitlines():
+                            log.error(calibration.pre, line)
+                        report.add_calibration(calibration)
+                        history.record(before, overrides, name, base=before)
+                        continue
+
+                    # Compare with the stored run (as JSON values)
+                    changes = json.loads(json.dumps({leaf_key(key): val for key, val in
+                                                     diff(flatten(before), flatten(after)).items()}, default=to_json))
+                    expected = json.loads(json.dumps({leaf_key(key): val for key, val in
+                                                      stored.changes[id-1].items()}, default=to_json))
+                    for key in sorted((changes.keys() | expected.keys()) - {leaf_key(key) for key in overrides}):
+                        if changes.get(key) != expected.get(key):
+                            log.warn(calibration.pre, f'{key}: {expected.get(key)} (stored run) -> {changes.get(key)}')
 
-            with open(f"logs/{timestamp}.json", "w") as f:
-                f.write(json.dumps(assumptions_ls, indent=4))
-            assumptions = {}
-            assumptions = deepcopy(assumptions_ls[-1])
-        log_info('Done')
-        return assumptions_ls
+                    calibration.results = results
+                    report.add_calibration(calibration)
+                    history.record(after, overrides, name, base=before)
+                    calibration.assumptions = history.head()
+                    self.finish(calibration)
+            if failed:
+                log.error('', f'Processing failed for calibrations {", ".join(map(str, failed))}')
+            log_info('Done')
+        finally:
+            if report:
+                report.close()
+            log.close()
+        return history
 
 if __name__ == '__main__':
     qualib = Qualib()
-    qualib.run_all()
\ No newline at end of file
+    if len(sys.argv) > 2 and sys.argv[1] == '--replay':
+        qualib.replay(sys.argv[2])
+    else:
+        qualib.run_all()
\ No newline at end of file
@@ -0,0 +1,99 @@
+from __future__ import annotations
+from typing import List, Dict, Tuple, Optional
+
+from .history import History, DELETED
+
+Prediction = Tuple[float, Optional[float]] # Value, uncertainty (None if unknown)
+
+def extrapolate(x: List[float], y: List[float], at: float, degree: int = 2) -> Prediction:
+    """Extrapolates (or interpolates) ``y(x)`` at ``at`` with a polynomial.
+
+    Args:
+        x: Abscissae (distinct).
+        y: Values.
+        at: Abscissa of the prediction.
+        degree: Optional. Maximum degree of the polynomial (``len(x)-1`` at most).
+
+    Returns:
+        Predicted value and its uncertainty, estimated as the difference with
+        the prediction of degree ``degree-1`` (``None`` from a single sample).
+    """
+    import numpy as np # Imported on first use (startup time)
+
+    x, y   = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    degree = min(degree, len(x)-1)
+    if degree == 0:
+        return float(y[-1]), None
+    center = x.mean() # Better conditioned
+    values = [float(np.polyval(np.polyfit(x-center, y, d), at-center)) for d in (degree, degree-1)]
+    return values[0], abs(values[0]-values[1])
+
+class Predictor:
+    """Predicts assumptions at the next point of a sweep (e.g. ``qubit/freq``
+    at the next ``$flux``) from the values measured so far in the run, to
+    warm-start the calibrations: centers and widths of the scans, initial
+    guesses of the fits (see :py:meth:`qualib.calibrations.default.DefaultCalibration.predict`).
+
+    A sample is recorded for each calibration that changed the predicted
+    leaf, at the value of the sweep variable after this calibration (the last
+    sample wins at a given point). The prediction is a polynomial extrapolation
+    of the ``window`` samples closest to the next point.
+
+    Args:
+        history (History): History of the assumptions of the run.
+        variable (str): Optional. Sweep variable (substitution, e.g. ``'$flux'``).
+        window (int): Optional. Number of samples used by the extrapolation.
+        degree (int): Optional. Maximum degree of the extrapolation polynomial.
+    """
+
+    def __init__(self, history: History, variable: str = '$flux', window: int = 4, degree: int = 2):
+        self.history  = history
+        self.variable = variable
+        self.window   = window
+        self.degree   = degree
+
+    def samples(self, key: str) -> Dict[float, float]:
+        """
+        Args:
+            key: ``'section/parameter'`` key of a leaf (e.g. ``'qubit/freq'``).
+
+        Returns:
+            Last value of the leaf set by a calibration at each value of the sweep variable.
+        """
+        leaf     = tuple(key.split('/'))
+        var_leaf = tuple(self.variable.lstrip('$').split('/'))
+        var      = self.history.base.get(var_leaf)
+        samples  = {}
+        for changes in self.history.changes:
+            var = changes.get(var_leaf, var)
+            if var is DELETED:
+                var = None
+            val = changes.get(leaf)
+            if var is None or val is None or val is DELETED:
+                continue
+            try:
+                samples[float(var)] = float(val)
+            except (TypeError, ValueError):
+                pass # Not a number
+        return samples
+
+    def predict(self, key: str, substitutions: Dict[str, str]) -> Optional[Prediction]:
+        """
+        Args:
+            key: ``'section/parameter'`` key of a leaf (e.g. ``'qubit/freq'``).
+            substitutions: Substitutions of the next calibration, with the
+                           value of the sweep variable (e.g. ``{'$flux': '0.1'}``).
+
+        Returns:
+            Predicted value of the leaf and its uncertainty, or ``None`` if the
+            calibration is not part of a sweep, if the leaf has not been measured
+            yet, or if it has already been measured at this point.
+        """
+        if self.variable not in substitutions:
+            return None
+        at      = float(substitutions[self.variable])
+        samples = self.samples(key)
+        if not samples or at in samples:
+            return None
+        closest = sorted(samples, key=lambda x: abs(x-at))[:self.window]
+        return extrapolate(closest, [samples[x] for x in closest], at, self.degree)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Iterator
+
+class Profile:
+    """Aggregates the durations of named spans (phases of a calibration,
+    report writes, log writes...), timed with :py:meth:`Profile.span`::
+
+        with log.profile.span('process', calibration.pre):
+            calibration.process()
+
+    Spans may be nested (e.g. ``exec`` within ``process``) and opened from
+    several threads. Only aggregates (count, total and maximum duration per
+    calibration and span name) are kept, unless ``trace`` is ``True``: every
+    span is then also kept as a Chrome trace event (see :py:meth:`Profile.save_trace`).
+
+    Args:
+        trace (bool): Optional. Keep every span as a trace event.
+
+    Attributes:
+        trace (bool): Keep every span as a trace event.
+        totals (dict): ``[count, total, max]`` (seconds) by ``(calibration, name)``.
+        events (list): Chrome trace events (if ``trace`` is ``True``).
+        start (float): Time origin of the trace events (``time.perf_counter()``).
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace  = trace
+        self.totals: Dict[Tuple[str, str], List[float]] = {}
+        self.events: List[dict] = []
+        self.start  = time.perf_counter()
+        self.lock   = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, prefix: str = '') -> Iterator[None]:
+        """Times the body of a ``with`` statement, even if it raises.
+
+        Args:
+            name: Name of the span (e.g. ``'process'``, ``'report/flush'``).
+            prefix: Optional. Log entry prefix of the calibration (e.g. ``'rabi_uncond_pi2:'``).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, prefix, start, time.perf_counter()-start)
+
+    def add(self, name: str, prefix: str, start: float, duration: float) -> None:
+        """Records a span.
+
+        Args:
+            name: Name of the span.
+            prefix: Log entry prefix of the calibration (``''`` outside calibrations).
+            start: Start of the span (``time.perf_counter()``).
+            duration: Duration of the span in seconds.
+        """
+        calibration = prefix.rstrip(':')
+        with self.lock:
+            totals = self.totals.setdefault((calibration, name), [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2]  = max(totals[2], duration)
+            if self.trace:
+                self.events.append({'name': name, 'cat': calibration or 'qualib', 'ph': 'X',
+                                    'ts': (start-self.start)*1e6, 'dur': duration*1e6,
+                                    'pid': os.getpid(), 'tid': threading.get_ident(),
+                                    'args': {'calibration': calibration}})
+
+    def aggregate(self) -> Dict[str, dict]:
+        """
+        Returns:
+            ``{'wall': ..., 'phases': {name: stats}, 'calibrations': {calibration: {name: stats}}}``,
+            with ``stats = {'count': ..., 'total': ..., 'mean': ..., 'max': ...}`` in seconds.
+            ``wall`` is the time elapsed since the creation of the profile.
+        """
+        def stats(count: int, total: float, longest: float) -> Dict[str, float]:
+            return {'count': count, 'total': total, 'mean': total/count, 'max': longest}
+
+        phases: Dict[str, List[float]] = {}
+        calibrations: Dict[str, dict] = {}
+        with self.lock:
+            for (calibration, name), (count, total, longest) in self.totals.items():
+                if calibration:
+                    calibrations.setdefault(calibration, {})[name] = stats(count, total, longest)
+                totals = phases.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += count
+                totals[1] += total
+                totals[2]  = max(totals[2], longest)
+        return {'wall':         time.perf_counter()-self.start,
+                'phases':       {name: stats(*totals) for name, totals in phases.items()},
+                'calibrations': calibrations}
+
+    def summary(self) -> List[str]:
+        """
+        Returns:
+            Lines of a table of the spans, by decreasing total duration
+            (nested spans are also counted in their parent span).
+        """
+        profile = self.aggregate()
+        wall    = profile['wall'] or 1.0
+        lines   = [f'{"span":<16} {"count":>6} {"total (s)":>10} {"mean (ms)":>10} {"max (ms)":>10} {"wall %":>7}']
+        for name, stats in sorted(profile['phases'].items(), key=lambda item: -item[1]['total']):
+            lines.append(f'{name:<16} {stats["count"]:>6} {stats["total"]:>10.3f} {stats["mean"]*1e3:>10.1f} '
+                         f'{stats["max"]*1e3:>10.1f} {100*stats["total"]/wall:>7.1f}')
+        lines.append(f'{"wall time":<16} {"":>6} {profile["wall"]:>10.3f}')
+        return lines
+
+    def save(self, path: str) -> Profile:
+        """Writes the aggregates (see :py:meth:`Profile.aggregate`) as JSON.
+
+        Args:
+            path: Path to the JSON file (``logs/TIMESTAMP.profile.json``).
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.aggregate(), f, indent=1)
+        return self
+
+    def save_trace(self, path: str) -> Profile:
+        """Writes the spans in the Chrome trace event format, which can be
+        opened in ``chrome://tracing`` or https://ui.perfetto.dev.
+
+        Args:
+            path: Path to the JSON file (``logs/TIMESTAMP.trace.json``).
+        """
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return self
+
+def load_profile(path: str) -> Dict[str, dict]:
+    """
+    Args:
+        path: Path to a profile file (``logs/TIMESTAMP.profile.json``).
+
+    Returns:
+        Aggregates of the spans of a run (see :py:meth:`Profile.aggregate`).
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import os
+import sys
+import ast
+import json
+import traceback
+from typing import Dict, Tuple
+
+from .log import Log
+from .history import History, load_history
+from .checkpoint import load_scheme
+from .load import load_exopy_template, load_utils
+from .retry import process
+from .calibrations.default import Report, Kernel, load_header, load_journal, get_json_log
+
+def load_run(timestamp: str) -> Tuple[list, History]:
+    """Loads the calibration sequence and the assumptions history of a stored run.
+
+    Args:
+        timestamp: Timestamp of the run.
+
+    Returns:
+        Calibration sequence (from ``logs/TIMESTAMP.scheme.json``, or from the
+        report journal of runs without checkpoint), history of the assumptions
+        (from ``logs/TIMESTAMP.jsonl``).
+    """
+    scheme_path = f'logs/{timestamp}.scheme.json'
+    if os.path.exists(scheme_path):
+        scheme = load_scheme(scheme_path)
+    else:
+        cells  = load_journal(f'reports/report_{timestamp}.jsonl', 2)
+        source = cells[1]['source'].strip().rstrip(';') # Calibration sequence cell
+        try:
+            scheme = json.loads(source)
+        except ValueError:
+            scheme = ast.literal_eval(source) # Python literal (older reports)
+    return scheme, load_history(f'logs/{timestamp}.jsonl')
+
+def hdf5_filename(timestamp: str, id: int, name: str, substitutions: Dict[str, str]) -> str:
+    """
+    Args:
+        timestamp: Timestamp of the run.
+        id: Rank of the calibration.
+        name: Name of the calibration.
+        substitutions: Dictionary of substitutions.
+
+    Returns:
+        Name of the HDF5 file of the calibration (see :py:class:`qualib.calibrations.default.DefaultCalibration`).
+    """
+    subs_name = substitutions.get('NAME')
+    full      = f'{name}_{subs_name}' if subs_name else name
+    return f'{timestamp}_{id:03d}_{full}.h5'
+
+def prepare(log: Log, report: Report, assumptions: dict, id: int, name: str,
+            substitutions: Dict[str, str], timestamp: str, kernel: Kernel, filename: str):
+    """Initializes a calibration on a stored HDF5 file, then handles its
+    substitutions and pre-placeholders (without measuring it).
+
+    Args:
+        log: Logging object.
+        report: Default report object (``None`` in worker processes).
+        assumptions: Assumptions before the calibration.
+        id: Rank of the calibration.
+        name: Name of the calibration.
+        substitutions: Dictionary of substitutions.
+        timestamp: Timestamp of the replay.
+        kernel: Analysis kernel.
+        filename: Name of the stored HDF5 file (see :py:func:`hdf5_filename`).
+
+    Returns:
+        Instance of the Calibration class, ready to be processed.
+    """
+    subs_name   = substitutions.get('NAME')
+    prefix      = f'{name}_{subs_name}:' if subs_name else f'{name}:'
+    Calibration = load_utils(log, name, prefix)
+    exopy_templ = load_exopy_template(log, name, prefix)
+    calibration = Calibration(log, report, assumptions, id, name, substitutions,
+                              exopy_templ, prefix, timestamp, kernel)
+    calibration.hdf5_filename = filename
+    calibration.hdf5_path     = f'{assumptions["default_path"]}/{filename}'
+    calibration.handle_substitutions()
+    calibration.pre_process()
+    return calibration
+
+class WorkerLog(Log):
+    """Logging object of a worker process: the log entries are kept in memory
+    and sent back to the parent process with the results (see :py:func:`analyze`),
+    which writes them to the log file of the replay in order.
+    """
+
+    def start(self) -> WorkerLog:
+        return self # No writer thread
+
+    def take(self) -> str:
+        """
+        Returns:
+            Log entries logged since the last call, removed from the queue.
+        """
+        entries = []
+        while not self.queue.empty():
+            item = self.queue.get()
+            if type(item) is str:
+                entries.append(item)
+        return ''.join(entries)
+
+# State of a worker process (see start_worker)
+worker: Dict[str, object] = {}
+
+def start_worker(timestamp: str) -> None:
+    """Initializes a worker process: logging object (see :py:class:`WorkerLog`)
+    and analysis kernel.
+
+    Args:
+        timestamp: Timestamp of the replay.
+    """
+    import matplotlib
+    matplotlib.use('Agg') # No display in worker processes
+    log = WorkerLog()
+    log.initialize(timestamp)
+    log.show_debug_messages = True
+    worker.update(timestamp=timestamp, log=log,
+                  kernel=Kernel(log, load_header(), get_json_log(timestamp)))
+
+def analyze(id: int, name: str, substitutions: Dict[str, str], assumptions: dict,
+            filename: str) -> Tuple[dict, dict, str, str]:
+    """Processes a stored calibration in a worker process (see :py:func:`start_worker`).
+
+    Args:
+        id: Rank of the calibration.
+        name: Name of the calibration.
+        substitutions: Dictionary of substitutions.
+        assumptions: Assumptions before the calibration, as recorded by the stored run.
+        filename: Name of the stored HDF5 file.
+
+    Returns:
+        Results, assumptions after the calibration, error (``''`` on success), and
+        log entries of the calibration (see :py:class:`WorkerLog`).
+    """
+    log = worker['log']
+    try:
+        calibration = prepare(log, None, assumptions, id, name, substitutions,
+                              worker['timestamp'], worker['kernel'], filename)
+        calibration.concurrent = True
+        process(calibration)
+        results, after, error = calibration.results, calibration.assumptions, ''
+    except Exception:
+        results, after, error = {}, assumptions, traceback.format_exc()
+    finally:
+        if 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close('all')
+    return results, after, error, log.take()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import os
+
+MEASUREMENT = 'measurement' # No measurement file: measured again with the same scan
+ANALYSIS    = 'analysis'    # Analysis code raised: re-analyzed, then measured again with a wider scan
+FIT         = 'fit'         # Fit quality checks failed: as ANALYSIS
+OTHER       = 'other'       # Before the measurement or after the analysis: run again with the same scan
+
+class FitQualityError(AssertionError):
+    """Raised when the results of a calibration fail the fit quality checks
+    (standard deviations of ``_opt``, user-defined ``_err``, see
+    :py:meth:`qualib.calibrations.default.DefaultCalibration.check`).
+
+    """
+
+def classify(phase: str, calibration, error: BaseException) -> str:
+    """Classifies the failure of a calibration, to retry it with the cheapest remedy:
+
+        * ``OTHER`` --- failures before the measurement (templates, substitutions,
+          placeholders) or after the analysis (post-processing, report): the
+          calibration is run again with the same scan.
+        * ``MEASUREMENT`` --- the measurement failed or produced no file:
+          measured again with the same scan.
+        * ``ANALYSIS`` (the analysis code raised, e.g. a fit did not converge) and
+          ``FIT`` (see :py:class:`FitQualityError`): re-analyzed with the alternatives
+          of the Calibration class (see :py:func:`process`), then measured again with
+          a wider scan (see ``widen`` in :py:class:`qualib.calibrations.default.DefaultCalibration`).
+
+    Args:
+        phase: Phase of the calibration that failed (``'setup'``, ``'measure'``,
+               ``'process'`` or ``'finish'``).
+        calibration: Instance of the Calibration class (``None`` if not initialized).
+        error: Exception raised.
+
+    Returns:
+        ``MEASUREMENT``, ``ANALYSIS``, ``FIT`` or ``OTHER``.
+    """
+    if phase == 'measure' or (phase == 'process' and not os.path.exists(calibration.hdf5_path)):
+        return MEASUREMENT
+    if phase != 'process':
+        return OTHER
+    return FIT if isinstance(error, FitQualityError) else ANALYSIS
+
+def process(calibration) -> None:
+    """Processes a measured calibration. If the analysis fails (see :py:func:`classify`),
+    re-analyzes the same measurement file with each alternative of the Calibration
+    class (e.g. other initial guesses, see
+    :py:meth:`qualib.calibrations.default.DefaultCalibration.alternatives`), until one succeeds.
+    The scan budget is then adjusted once, from the successful analysis (see
+    :py:meth:`qualib.calibrations.default.DefaultCalibration.adjust_budget`).
+
+    Args:
+        calibration: Measured instance of a Calibration class.
+
+    Raises:
+        The error of the first analysis, if all the alternatives fail.
+    """
+    try:
+        calibration.process()
+    except Exception as error:
+        log, pre = calibration.log, calibration.pre
+        failure  = classify('process', calibration, error)
+        if failure == MEASUREMENT:
+            raise
+        alternatives = calibration.alternatives()
+        for i, mapping in enumerate(alternatives):
+            log.warn(pre, f'{failure.capitalize()} failure: {error}'.splitlines()[0])
+            log.info(pre, f'Re-analyzing "{calibration.hdf5_path}" ({i+1}/{len(alternatives)})',
+                          *log.json(mapping))
+            try:
+                with log.profile.span('reanalyze', pre):
+                    calibration.reanalyze(mapping)
+                break
+            except Exception as retry_error:
+                error = retry_error
+        else:
+            raise
+    calibration.adjust_budget()
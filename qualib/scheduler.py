@@ -0,0 +1,323 @@
+from __future__ import annotations
+import sys
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Set, Iterable, Optional
+
+from .log import Log
+from .history import History, flatten, diff, leaf_key
+from .load import load_exopy_template, load_utils
+from .template import compile_template, keys_pattern, fields, PLACEHOLDER, FIELD
+from .retry import classify, process
+from .calibrations.default import Report, Kernel
+
+Keys = Optional[Set[str]] # 'section/parameter' or 'section' keys (None: any key)
+
+def template_reads(exopy_templ: str, substitutions: Dict[str, str]) -> Set[str]:
+    """
+    Args:
+        exopy_templ: Content of the Exopy measurement template.
+        substitutions: Dictionary of substitutions of the calibration.
+
+    Returns:
+        Keys of the pre-placeholders of the template (``$section/parameter``
+        and ``$parameter``, without ``$``), once substituted.
+    """
+    if substitutions:
+        exopy_templ, _ = compile_template(exopy_templ, keys_pattern(substitutions)).render(substitutions)
+    return {tree[1:] for tree in compile_template(exopy_templ, PLACEHOLDER).placeholders}
+
+def declared(keys: Optional[Iterable[str]], substitutions: Dict[str, str]) -> Keys:
+    """
+    Args:
+        keys: Keys declared by a Calibration class (``reads`` or ``writes``),
+              possibly with ``{KEY}`` substitutions (e.g. ``'qubit/{PULSE}_amp'``).
+        substitutions: Dictionary of substitutions of the calibration.
+
+    Returns:
+        Substituted keys (``None`` if undeclared).
+    """
+    if keys is None:
+        return None
+    values = fields(substitutions)
+    return {compile_template(key, FIELD).render(values)[0] for key in keys}
+
+def overlap(keys: Keys, others: Keys) -> bool:
+    """
+    Args:
+        keys: First set of keys.
+        others: Second set of keys.
+
+    Returns:
+        ``True`` if a key of ``keys`` and a key of ``others`` designate the same
+        leaf (``'section'`` covers every ``'section/parameter'``).
+    """
+    if keys is None or others is None:
+        return keys != set() and others != set()
+    return any(key == other or key.startswith(other+'/') or other.startswith(key+'/')
+               for key in keys for other in others)
+
+class Step:
+    """Calibration of a sequence, as scheduled by :py:class:`Scheduler`.
+
+    Args:
+        id (int): Rank of the calibration in the sequence.
+        name (str): Name of the calibration.
+        substitutions (dict): Dictionary of substitutions.
+        overrides (dict): Variables set after the calibration (e.g. ``$flux``).
+        reads (set): Keys of the assumptions read by the calibration
+                     (``None`` if unknown).
+        writes (set): Keys of the assumptions updated by the calibration
+                      (``None`` if unknown).
+
+    Attributes:
+        deps (list): Previous steps whose updates the calibration depends on.
+        wave (int): Depth of the step in the dependency graph (``0`` for independent steps).
+        base (dict): Assumptions the calibration started from.
+        calibration: Measured instance of the Calibration class.
+        future (Future): Processing of the calibration.
+    """
+
+    def __init__(self, id: int, name: str, substitutions: Dict[str, str],
+                 overrides: dict, reads: Keys, writes: Keys):
+        self.id            = id
+        self.name          = name
+        self.substitutions = substitutions
+        self.overrides     = overrides
+        self.reads         = reads
+        self.writes        = writes
+        self.deps: List[Step] = []
+        self.wave          = 0
+        self.base: dict    = None
+        self.calibration   = None
+        self.future: Future = None
+
+    def __repr__(self) -> str:
+        subs_name = self.substitutions.get('NAME')
+        return f'{self.id}:{self.name}_{subs_name}' if subs_name else f'{self.id}:{self.name}'
+
+    def depends_on(self, prev: Step) -> bool:
+        """
+        Args:
+            prev: Previous step of the sequence.
+
+        Returns:
+            ``True`` if ``prev`` updates assumptions read or updated by this step.
+        """
+        keys = None if self.reads is None or self.writes is None else self.reads | self.writes
+        return overlap(prev.writes, keys)
+
+class Scheduler:
+    """Runs a calibration sequence as a dependency graph: measurements are
+    still performed one by one, in order, but the processing (analysis code
+    and assumptions update) of a calibration runs in a worker thread while
+    the next calibrations are measured, unless they depend on it.
+
+    A calibration depends on a previous one if the latter updates assumptions
+    it reads or updates. The assumptions read are the pre-placeholders
+    (``$section/parameter``) of its ``.meas.ini`` template, and the ``reads``
+    declared by its Calibration class (assumptions used by
+    ``handle_substitutions``, ``pre_process`` and ``process``); the assumptions
+    updated are the ``writes`` declared by its Calibration class, and the
+    variables of its substitutions (e.g. ``$flux``). Calibrations without
+    declarations depend on all the previous ones, and vice versa.
+
+    Each calibration thus starts from assumptions that agree with the serial
+    order on every key it reads, and the calibrations are committed (reported,
+    recorded in the history, and post-processed) in the order of the sequence:
+    the report, history and results are identical to a serial run. The analyses
+    of independent calibrations run concurrently, each in its own child scope
+    of the kernel, with its own ``matplotlib.pyplot`` figures (see
+    :py:meth:`qualib.calibrations.default.Kernel.isolate_figures`).
+
+    Args:
+        qualib (Qualib): Qualib instance running the measurements.
+        log (Log): Logging object.
+        report (Report): Default report object.
+        kernel (Kernel): Analysis kernel shared by the calibrations of the sequence.
+        history (History): History of the assumptions.
+        timestamp (str): Timestamp used to create the log and report files.
+        workers (int): Maximum number of calibrations processed concurrently.
+
+    Attributes:
+        steps (dict): Scheduled steps by rank (see :py:meth:`Scheduler.plan`).
+        pending (list): Measured steps not committed yet, in order.
+    """
+
+    def __init__(self, qualib, log: Log, report: Report, kernel: Kernel,
+                 history: History, timestamp: str, workers: int):
+        self.qualib    = qualib
+        self.log       = log
+        self.report    = report
+        self.kernel    = kernel
+        self.history   = history
+        self.timestamp = timestamp
+        self.executor  = ThreadPoolExecutor(max_workers=workers)
+        self.kernel.isolate_figures()
+        self.steps: Dict[int, Step] = {}
+        self.pending: List[Step]    = []
+
+    def plan(self, id: int, name: str, substitutions: Dict[str, str], overrides: dict) -> Step:
+        """Adds a calibration to the dependency graph.
+
+        Args:
+            id: Rank of the calibration in the sequence.
+            name: Name of the calibration.
+            substitutions: Dictionary of substitutions.
+            overrides: Variables set after the calibration (e.g. ``$flux``).
+
+        Returns:
+            Scheduled step.
+        """
+        subs_name   = substitutions.get('NAME')
+        prefix      = f'{name}_{subs_name}:' if subs_name else f'{name}:'
+        Calibration = load_utils(self.log, name, prefix)
+        exopy_templ = load_exopy_template(self.log, name, prefix)
+        reads       = declared(Calibration.reads, substitutions)
+        if reads is not None:
+            reads |= template_reads(exopy_templ, substitutions)
+        writes      = declared(Calibration.writes, substitutions)
+        if writes is not None:
+            writes |= {leaf_key(key) for key in overrides}
+        step = Step(id, name, substitutions, overrides, reads, writes)
+        step.deps = [prev for prev in self.steps.values() if step.depends_on(prev)]
+        step.wave = max([prev.wave+1 for prev in step.deps], default=0)
+        self.steps[id] = step
+        return step
+
+    def waves(self) -> List[List[Step]]:
+        """
+        Returns:
+            Scheduled steps grouped by depth in the dependency graph: the steps
+            of a wave only depend on steps of the previous waves.
+        """
+        waves = [[] for _ in range(1+max([step.wave for step in self.steps.values()], default=-1))]
+        for step in self.steps.values():
+            waves[step.wave].append(step)
+        return waves
+
+    def run(self, step: Step) -> None:
+        """Waits for the steps ``step`` depends on, then measures the
+        calibration and submits its processing.
+
+        Args:
+            step: Scheduled step (see :py:meth:`Scheduler.plan`).
+        """
+        if step.deps:
+            with self.log.profile.span('wait'):
+                self.commit(until=step.deps[-1].id)
+        step.base = self.history.head()
+        self.pending.append(step)
+        try:
+            self.qualib.run(self.log, self.report, self.history.head(), step.id, step.name,
+                            step.substitutions, self.timestamp, self.kernel, self)
+        except:
+            self.pending.remove(step)
+            raise
+
+    def submit(self, calibration) -> None:
+        """Processes a measured calibration in a worker thread (called by
+        :py:meth:`qualib.main.Qualib.run`).
+
+        Args:
+            calibration: Measured instance of a Calibration class.
+        """
+        step = self.pending[-1]
+        step.calibration = calibration
+        calibration.concurrent = True
+        self.kernel.start(calibration.pre) # Execute the header once, in this thread
+        step.future = self.executor.submit(self.process, calibration)
+
+    def process(self, calibration) -> None:
+        """Processes a measured calibration (in a worker thread), re-analyzing
+        its measurement if needed (see :py:func:`qualib.retry.process`).
+
+        Args:
+            calibration: Measured instance of a Calibration class.
+        """
+        with self.log.profile.span('process', calibration.pre):
+            process(calibration)
+
+    def commit(self, until: int = None, raise_errors: bool = True) -> None:
+        """Commits the processed calibrations in order: updates the report,
+        records the assumptions, then post-processes and reports the results.
+
+        Args:
+            until: Optional. Rank of the last calibration to commit (all by default).
+            raise_errors: Raise if the processing of a calibration failed
+                          (otherwise, stop committing).
+        """
+        while self.pending and (until is None or self.pending[0].id <= until):
+            step = self.pending[0]
+            if step.future is None: # Not measured
+                break
+            try:
+                self.finish(step)
+            except:
+                self.pending.clear() # Discard the next calibrations, as in a serial run
+                if raise_errors:
+                    raise
+                break
+            self.pending.pop(0)
+
+    def finish(self, step: Step) -> None:
+        """Commits a processed calibration, or measures it again serially if
+        its processing failed (see :py:meth:`qualib.main.Qualib.run`).
+
+        Args:
+            step: Measured step.
+        """
+        calibration = step.calibration
+        try:
+            step.future.result()
+        except:
+            self.report.checkpoint(render=True)
+            self.log.error(calibration.pre, *str(sys.exc_info()[1]).splitlines())
+            for line in traceback.format_exc().splitlines():
+                self.log.error('', line)
+            if step.base.get('retries'):
+                # All the previous calibrations are committed: measure again serially
+                failure     = classify('process', calibration, sys.exc_info()[1])
+                step.base   = self.history.head()
+                assumptions = self.qualib.run(self.log, self.report, self.history.head(), step.id,
+                                              step.name, step.substitutions, self.timestamp, self.kernel,
+                                              failure=failure)
+                self.record(step, assumptions)
+                self.qualib.save(step.id, self.history)
+                return
+            raise
+
+        self.log.info(calibration.pre, 'Updating report')
+        with self.log.profile.span('report', calibration.pre):
+            self.report.add_calibration(calibration)
+        with self.log.profile.span('history', calibration.pre):
+            calibration.assumptions = self.record(step, calibration.assumptions)
+        self.qualib.finish(calibration)
+        self.qualib.save(step.id, self.history)
+
+    def record(self, step: Step, assumptions: dict) -> dict:
+        """Records the assumptions updated by a calibration in the history.
+
+        Args:
+            step: Processed step.
+            assumptions: Assumptions after the calibration.
+
+        Returns:
+            Assumptions after the calibration, in the order of the sequence.
+        """
+        if step.writes is not None:
+            undeclared = [leaf_key(key) for key in diff(flatten(step.base), flatten(assumptions))
+                          if not overlap({leaf_key(key)}, step.writes)]
+            assert not undeclared, f'Assumptions updated by "{step.name}" but missing from '\
+                                   f'the writes of its Calibration class: {", ".join(sorted(undeclared))}'
+        self.log.info(f'{step.name}:', f'Updating variables in "logs/{self.timestamp}.jsonl"')
+        self.log.info(f'{step.name}:', *[leaf_key(key) for key in step.overrides])
+        self.history.record(assumptions, step.overrides, step.name, base=step.base)
+        return self.history.head()
+
+    def close(self) -> None:
+        """Commits the calibrations processed successfully, then stops the workers.
+
+        """
+        self.commit(raise_errors=False)
+        self.executor.shutdown()
@@ -0,0 +1,265 @@
+from __future__ import annotations
+import re
+import sys
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import List, Dict, Set, Union, Callable, Iterable
+
+from .log import Log
+from .load import load_calibration_scheme, load_assumptions
+from .history import History
+from .backends import Backend, Job, SubprocessBackend
+
+# selected_instrument = "('SGS3', 'exopy_hqc_legacy.Legacy.RohdeSchwarzSMB100A', 'VisaTCPIP', None)"
+INSTRUMENT = re.compile(r"^\s*selected_instrument\s*=\s*\"\(\s*'([^']+)'", re.MULTILINE)
+
+def selected_instruments(meas_path: str) -> Set[str]:
+    """
+    Args:
+        meas_path: Path to an Exopy measurement file (``NAME.meas.ini``).
+
+    Returns:
+        Names of the instruments selected by the tasks of the measurement
+        (``selected_instrument``, e.g. ``'SGS3'``).
+    """
+    with open(meas_path, encoding='utf-8') as f:
+        return set(INSTRUMENT.findall(f.read()))
+
+class Instruments:
+    """Per-instrument locks shared by the sequences of a :py:class:`Session`.
+
+    Args:
+        shared (Iterable[str]): Optional. Names of the instruments which can be used
+                                by several measurements at once (e.g. separate
+                                channels of a multi-output source): never locked.
+
+    Attributes:
+        shared (frozenset): Names of the instruments which are never locked.
+        locks (dict): Lock of each instrument, by name.
+        usage (dict): ``[measurements, waited]`` (seconds) by instrument name.
+    """
+
+    def __init__(self, shared: Iterable[str] = ()):
+        self.shared = frozenset(shared)
+        self.locks: Dict[str, threading.Lock] = {}
+        self.usage: Dict[str, List[float]] = {}
+        self.lock   = threading.Lock()
+
+    def acquire(self, names: Iterable[str]) -> List[threading.Lock]:
+        """Blocks until all the instruments are available, then locks them
+        (always in the same order, so that measurements cannot deadlock).
+
+        Args:
+            names: Names of the instruments used by a measurement.
+
+        Returns:
+            Locks to release at the end of the measurement.
+        """
+        names = sorted(set(names) - self.shared)
+        with self.lock:
+            locks = [self.locks.setdefault(name, threading.Lock()) for name in names]
+        start = time.perf_counter()
+        for lock in locks:
+            lock.acquire()
+        waited = time.perf_counter()-start
+        with self.lock:
+            for name in names:
+                usage = self.usage.setdefault(name, [0, 0.0])
+                usage[0] += 1
+                usage[1] += waited
+        return locks
+
+    def summary(self) -> List[str]:
+        """
+        Returns:
+            Lines of a table of the measurements and waiting times by instrument.
+        """
+        lines = [f'{"instrument":<16} {"count":>6} {"waited (s)":>10}']
+        with self.lock:
+            for name, (count, waited) in sorted(self.usage.items(), key=lambda item: -item[1][1]):
+                lines.append(f'{name:<16} {count:>6} {waited:>10.3f}')
+        return lines
+
+class LockedJob(Job):
+    """Measurement holding the locks of its instruments until it is over.
+
+    """
+
+    def __init__(self, job: Job, locks: List[threading.Lock]):
+        super().__init__(job.meas_path)
+        self.job   = job
+        self.locks = locks
+        self.guard = threading.Lock()
+
+    def release(self) -> None:
+        with self.guard:
+            locks, self.locks = self.locks, []
+        for lock in reversed(locks):
+            lock.release()
+
+    def done(self) -> bool:
+        if self.job.done():
+            self.returncode = self.job.returncode
+            self.release()
+        return super().done()
+
+    def wait(self) -> int:
+        self.returncode = self.job.wait()
+        self.release()
+        return self.returncode
+
+    def stop(self) -> None:
+        self.job.stop()
+        self.done()
+
+class LockingBackend(Backend):
+    """Runs the measurements of a sequence on another backend, once the
+    instruments selected by their Exopy measurement file (see
+    :py:func:`selected_instruments`) are available: only the measurements
+    of concurrent sequences which share an instrument are serialized.
+
+    Args:
+        backend (Backend): Backend of the sequence.
+        instruments (Instruments): Locks shared by the sequences of the session.
+    """
+
+    def __init__(self, backend: Backend, instruments: Instruments):
+        self.backend     = backend
+        self.instruments = instruments
+
+    def submit(self, log: Log, pre: str, meas_path: str) -> Job:
+        names = selected_instruments(meas_path) - self.instruments.shared
+        if names:
+            log.info(pre, f'Waiting for {", ".join(sorted(names))}')
+        with log.profile.span('instruments', pre):
+            locks = self.instruments.acquire(names)
+        try:
+            return LockedJob(self.backend.submit(log, pre, meas_path), locks)
+        except:
+            for lock in locks:
+                lock.release()
+            raise
+
+    def close(self) -> None:
+        self.backend.close()
+
+class Session:
+    """Runs several calibration sequences concurrently, e.g. one per qubit of a
+    chip, each with its own assumptions::
+
+        session = Session()
+        session.add('q1', 'calibration_scheme.py', 'assumptions_q1.py')
+        session.add('q2', 'calibration_scheme.py', 'assumptions_q2.py', pipeline=True)
+        session.run()
+
+    Each sequence is run by its own :py:class:`qualib.main.Qualib` instance
+    in a thread, with its own log, report and history files
+    (``TIMESTAMP_NAME``, see ``name`` in :py:meth:`qualib.main.Qualib.run_all`).
+    Measurements wait for the locks of the instruments selected by their Exopy
+    measurement file (see :py:class:`LockingBackend`): measurements on disjoint
+    instruments overlap, and a shared instrument (e.g. a digitizer) is time-shared
+    between the sequences, while the others analyze their results. The instrument
+    names of the ``.meas.ini`` templates may be pre-placeholders
+    (e.g. ``'$qubit/drive_source'``) to be resolved from the assumptions of each qubit.
+
+    Args:
+        backend (Callable): Optional. Factory of the measurement backend of each sequence
+                            (:py:class:`qualib.backends.SubprocessBackend` by default,
+                            e.g. one resident Exopy server per sequence with
+                            :py:class:`qualib.backends.ServerBackend`).
+        shared (Iterable[str]): Optional. Names of the instruments which are never locked
+                                (see :py:class:`Instruments`).
+
+    Attributes:
+        instruments (Instruments): Locks shared by the sequences.
+        sequences (dict): Calibration sequence, assumptions and options of
+                          :py:meth:`qualib.main.Qualib.run_all` by name.
+    """
+
+    def __init__(self, backend: Callable[[], Backend] = SubprocessBackend, shared: Iterable[str] = ()):
+        self.backend     = backend
+        self.instruments = Instruments(shared)
+        self.sequences: Dict[str, dict] = {}
+
+    def add(self, name: str, pkg_calib_scheme: Union[str, list],
+            assumptions: Union[str, dict] = 'assumptions.py', **options) -> Session:
+        """Adds a calibration sequence to the session.
+
+        Args:
+            name: Name of the sequence (e.g. ``'q1'``, alphanumeric).
+            pkg_calib_scheme: Path to the Python file defining the calibration
+                              sequence (``str``) or calibration sequence (``list``).
+            assumptions: Optional. Path to the assumptions file (``str``) or assumptions (``dict``).
+            options: Optional. Keyword arguments of :py:meth:`qualib.main.Qualib.run_all`
+                     (e.g. ``pipeline``, ``workers``).
+        """
+        assert re.fullmatch(r'[A-Za-z0-9_]+', name), f'Invalid sequence name "{name}" (alphanumeric)'
+        assert name not in self.sequences, f'Sequence "{name}" already added'
+        self.sequences[name] = {'scheme': pkg_calib_scheme, 'assumptions': assumptions, 'options': options}
+        return self
+
+    def run(self) -> Dict[str, History]:
+        """Runs the sequences concurrently, until they are all over. A failed
+        sequence does not stop the others. The measurements and waiting times
+        by instrument are logged in ``logs/TIMESTAMP_session.log``.
+
+        Returns:
+            History of the assumptions of each sequence, by name
+            (see :py:meth:`qualib.main.Qualib.run_all`).
+
+        Raises:
+            The error of the first failed sequence, once all the sequences are over.
+        """
+        from .main import Qualib # Circular import
+
+        timestamp = datetime.now().strftime('%y_%m_%d_%H%M%S')
+        log = Log()
+        log.initialize(f'{timestamp}_session')
+        log.show_debug_messages = True
+
+        def run(name: str, scheme: Union[str, list], assumptions: dict, options: dict) -> History:
+            qualib = Qualib(LockingBackend(self.backend(), self.instruments))
+            try:
+                return qualib.run_all(scheme, assumptions, name=name, **options)
+            finally:
+                qualib.close()
+
+        try:
+            sequences = {}
+            for name, sequence in self.sequences.items():
+                scheme, assumptions = sequence['scheme'], sequence['assumptions']
+                if type(scheme) is str:
+                    scheme, _ = load_calibration_scheme(log, scheme)
+                if type(assumptions) is str:
+                    assumptions = load_assumptions(log, assumptions)
+                sequences[name] = (scheme, assumptions, sequence['options'])
+            log.info('', f'Starting {len(sequences)} sequences: {", ".join(sequences)}')
+            with ThreadPoolExecutor(max_workers=len(sequences) or 1) as pool:
+                futures = {name: pool.submit(run, name, *sequence) for name, sequence in sequences.items()}
+                wait_futures(futures.values())
+            for name, future in futures.items():
+                error = future.exception()
+                if error:
+                    log.error(f'{name}:', *f'{type(error).__name__}: {error}'.splitlines())
+                else:
+                    log.info(f'{name}:', 'Done')
+            log.info('', 'Instruments', *self.instruments.summary())
+            for future in futures.values():
+                future.result() # Raise the first error
+            return {name: future.result() for name, future in futures.items()}
+        finally:
+            log.close()
+
+if __name__ == '__main__':
+    # python -m qualib.session session.py, where session.py is a Python list of
+    # {'name': ..., 'scheme': ..., 'assumptions': ..., **options} dictionaries
+    assert len(sys.argv) > 1, 'Usage: python -m qualib.session session.py'
+    session = Session()
+    with open(sys.argv[1], encoding='utf-8') as f:
+        for sequence in eval(f.read()):
+            session.add(sequence.pop('name'), sequence.pop('scheme'),
+                        sequence.pop('assumptions', 'assumptions.py'), **sequence)
+    session.run()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple, Iterable
+
+# $parameter or $section/parameter (pre-placeholders of Exopy templates)
+PLACEHOLDER = r'\$[a-z0-9_]+(?:/[a-z0-9_]+)?'
+# {KEY} (substitutions and placeholders of report templates)
+FIELD = r'\{[A-Za-z0-9_]+\}'
+
+class Template:
+    """Template compiled once into a list of literal strings and placeholders,
+    then rendered in a single linear pass.
+
+    Args:
+        text (str): Template text.
+        pattern (str): Regular expression matching the placeholders.
+
+    Attributes:
+        text (str): Template text.
+        tokens (list): Literal strings (``str``) and placeholders (``(str,)``), in order.
+        placeholders (set): Distinct placeholders of the template.
+    """
+
+    def __init__(self, text: str, pattern: str):
+        self.text   = text
+        self.tokens = []
+        pos = 0
+        for match in re.finditer(pattern, text):
+            if match.start() > pos:
+                self.tokens.append(text[pos:match.start()])
+            self.tokens.append((match.group(0),))
+            pos = match.end()
+        if pos < len(text):
+            self.tokens.append(text[pos:])
+        self.placeholders = {token[0] for token in self.tokens if type(token) is tuple}
+
+    def render(self, values: Dict[str, str]) -> Tuple[str, List[str]]:
+        """Replaces each placeholder with its value; placeholders without
+        values are left untouched.
+
+        Args:
+            values: Dictionary of ``placeholder: value`` pairs
+                    (e.g. ``{'{HDF5_PATH}': 'path/to/file.h5'}``).
+
+        Returns:
+            Rendered text, unresolved placeholders.
+        """
+        parts   = []
+        missing = []
+        for token in self.tokens:
+            if type(token) is str:
+                parts.append(token)
+            elif token[0] in values:
+                parts.append(values[token[0]])
+            else:
+                parts.append(token[0])
+                missing.append(token[0])
+        return ''.join(parts), missing
+
+@lru_cache(maxsize=512)
+def compile_template(text: str, pattern: str) -> Template:
+    """Compiles a template, or returns the cached compiled template if the
+    same text has already been compiled with the same pattern (e.g. for a
+    previous run of the same calibration).
+
+    Args:
+        text: Template text.
+        pattern: Regular expression matching the placeholders.
+
+    Returns:
+        Compiled template.
+    """
+    return Template(text, pattern)
+
+def keys_pattern(keys: Iterable[str]) -> str:
+    """
+    Args:
+        keys: Literal placeholders (e.g. substitutions keys).
+
+    Returns:
+        Regular expression matching any of ``keys``, longest first.
+    """
+    return '|'.join(re.escape(key) for key in sorted(keys, key=len, reverse=True))
+
+def fields(mapping: Dict[str, str]) -> Dict[str, str]:
+    """
+    Args:
+        mapping: Dictionary of ``'KEY': value`` pairs.
+
+    Returns:
+        Dictionary of ``'{KEY}': value`` pairs.
+    """
+    return {'{'+key+'}': val for key, val in mapping.items()}
@@ -14,6 +14,7 @@ setup(
       'numpy',
       'scipy',
       'nbformat',
+      'h5py',
       'requests'
    ],
    scripts=['qualib/main.py']
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs a test in an empty directory with ``logs``, ``reports`` and ``data``
+    folders, and returns the assumptions of the repository for synthetic data
+    in ``data`` (see :py:func:`qualib.bench.device_assumptions`).
+    """
+    import matplotlib
+    from qualib.bench import device_assumptions
+
+    matplotlib.use('Agg') # No display
+
+    monkeypatch.chdir(tmp_path)
+    for folder in ('logs', 'reports', 'data'):
+        os.makedirs(folder)
+    with open(os.path.join(ROOT, 'assumptions.py'), encoding='utf-8') as f:
+        assumptions = eval(f.read())
+    return device_assumptions(assumptions, str(tmp_path/'data'))
+
+def snapshot(timestamp: str):
+    """
+    Returns:
+        History and report journal of a run, with its timestamp replaced.
+    """
+    from qualib.calibrations.default import load_journal
+
+    with open(f'logs/{timestamp}.jsonl', encoding='utf-8') as f:
+        history = f.read().replace(timestamp, 'TIMESTAMP')
+    report = json.dumps(load_journal(f'reports/report_{timestamp}.jsonl')).replace(timestamp, 'TIMESTAMP')
+    return history, report
+
+def timestamp(name: str) -> str:
+    """
+    Returns:
+        Timestamp of the last run named ``name`` (see ``name`` in :py:meth:`qualib.main.Qualib.run_all`).
+    """
+    return sorted(path for path in os.listdir('logs') if path.endswith(f'_{name}.jsonl'))[-1][:-len('.jsonl')]
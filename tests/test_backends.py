@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import threading
+from multiprocessing import Pipe
+
+from qualib.log import Log
+from qualib.main import Qualib
+from qualib.bench import Synthetic
+from qualib.backends import FakeBackend, ServerBackend, SubprocessBackend, SubprocessJob
+
+from conftest import ROOT
+
+SCHEME = [{'name': 't1_qubit'}, {'name': 'ramsey_t2'}]
+
+class ThreadServer(ServerBackend):
+    """:py:class:`ServerBackend` whose worker is a thread speaking the same
+    protocol as :py:func:`qualib.backends.serve`, with a fake measurement.
+
+    Args:
+        measure (Callable): Called with each measurement file, returns the exit
+                            status (``None`` to close the connection instead).
+        error (str): Optional. Error sent instead of ``None`` (Exopy not loaded).
+    """
+
+    def __init__(self, measure, error=None):
+        super().__init__()
+        self.measure = measure
+        self.error   = error
+        self.paths   = []
+
+    def start(self, log, pre):
+        if self.conn is not None:
+            return self
+        self.conn, worker = Pipe()
+        def serve():
+            worker.send(self.error)
+            while not self.error:
+                try:
+                    meas_path = worker.recv()
+                except EOFError:
+                    break
+                self.paths.append(meas_path)
+                returncode = self.measure(meas_path)
+                if returncode is None:
+                    worker.close()
+                    break
+                worker.send(returncode)
+        threading.Thread(target=serve, daemon=True).start()
+        return self.connected(log, pre)
+
+def log():
+    return Log().initialize('test')
+
+def run(backend, assumptions):
+    return Qualib(backend).run_all(json.loads(json.dumps(SCHEME)), assumptions)
+
+def test_fake_backend(workdir):
+    backend = FakeBackend(Synthetic(workdir['default_path'], points=101))
+    history = run(backend, workdir)
+    assert [os.path.basename(path) for path in backend.jobs] == ['t1_qubit.meas.ini', 'ramsey_t2.meas.ini']
+    assert history[0]['qubit']['T1'] != workdir['qubit']['T1']
+    assert history[1]['qubit']['T2'] != workdir['qubit']['T2']
+
+def test_server_protocol(workdir):
+    synthetic = Synthetic(workdir['default_path'], points=101)
+    backend   = ThreadServer(lambda meas_path: synthetic(meas_path) or 0)
+    history   = run(backend, workdir)
+    assert [os.path.basename(path) for path in backend.paths] == ['t1_qubit.meas.ini', 'ramsey_t2.meas.ini']
+    assert history[1]['qubit']['T2'] != workdir['qubit']['T2']
+    assert backend.fallback is None
+
+def test_server_job_status(workdir):
+    backend = ThreadServer(lambda meas_path: 3)
+    job = backend.submit(log(), '', 'a.meas.ini')
+    assert job.wait() == 3 and job.done()
+    job = backend.submit(log(), '', 'b.meas.ini')
+    job.wait()
+    assert job.done() and job.returncode == 3
+
+def test_server_death(workdir):
+    backend = ThreadServer(lambda meas_path: None) # Closes the connection while measuring
+    job = backend.submit(log(), '', 'a.meas.ini')
+    assert job.wait() == -1
+    assert backend.conn is None # A new server is started for the next measurement
+    job = backend.submit(log(), '', 'b.meas.ini')
+    while not job.done():
+        time.sleep(0.01)
+    assert job.returncode == -1
+
+def test_server_error_falls_back_to_subprocess(workdir, tmp_path):
+    backend = ThreadServer(lambda meas_path: 0, error='ImportError: No module named exopy')
+    backend.start(log(), '')
+    assert isinstance(backend.fallback, SubprocessBackend) and backend.conn is None
+    meas_path = str(tmp_path/'a.meas.ini')
+    open(meas_path, 'w').close()
+    job = backend.submit(log(), '', meas_path)
+    assert isinstance(job, SubprocessJob)
+    job.wait()
+    assert os.path.exists(tmp_path/'exopy.log')
+
+def test_worker_reports_missing_exopy(workdir, monkeypatch):
+    try:
+        import exopy
+    except ImportError:
+        pass
+    else:
+        return # The worker would start Exopy
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    backend = ServerBackend(timeout=60)
+    try:
+        backend.start(log(), '')
+        assert isinstance(backend.fallback, SubprocessBackend)
+        assert backend.process is None and backend.conn is None
+        assert backend.fallback.python == sys.executable
+    finally:
+        backend.close()
@@ -0,0 +1,14 @@
+import sys
+
+from qualib.circle_fit import benchmark
+
+def test_benchmark_does_not_download_qkit_by_default(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'requests', None) # Any import of requests fails
+    results = benchmark(traces=3, npoints=201)
+    assert 'qkit' not in results and 'qkit_download' not in results and 'qkit_error' not in results
+    assert results['qualib']['fr_rms_error'] < 1e-2
+
+def test_benchmark_reports_qkit_failures(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'requests', None)
+    results = benchmark(traces=3, npoints=201, qkit_url='https://example.invalid/circuit.py')
+    assert 'requests' in results['qkit_error'] and 'qkit' not in results
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from qualib.fitting import cosine, ramsey, exponential, arctan, lorentzian, curve_fit, batch_fit
+
+TRACES = 40
+
+def traces(model, x, centers, spreads, noise, seed=0):
+    """
+    Returns:
+        Parameters ``(TRACES, P)`` drawn around ``centers`` and noisy traces ``(TRACES, N)``.
+    """
+    rng = np.random.default_rng(seed)
+    p   = np.asarray(centers)*(1+np.asarray(spreads)*rng.uniform(-1, 1, (TRACES, len(centers))))
+    y   = model(x, *np.moveaxis(p[..., None], -2, 0))
+    return p, y+noise*rng.standard_normal(y.shape)
+
+CASES = [
+    (cosine,      np.linspace(0, 0.4, 101),    [0.2, 1.0, 0.5],               [0.2, 0.2, 0.2]),
+    (ramsey,      np.linspace(20, 2e4, 201),   [1.3e4, 5e-4, 0.2, 1.0, 0.1],  [0.3, 0.3, 0.5, 0.2, 0.5]),
+    (exponential, np.linspace(20, 3.2e4, 101), [6e3, 1.0, 0.3],               [0.3, 0.2, 0.2]),
+    (arctan,      np.linspace(6.335, 6.345, 201), [6.34, 2e3, 0.0],           [1e-4, 0.3, 0.0]),
+    (lorentzian,  np.linspace(4.40, 4.48, 201),   [4.44, 4e-3, 1.0, 0.1],     [1e-3, 0.3, 0.2, 0.5]),
+]
+
+@pytest.mark.parametrize('model, x, centers, spreads', CASES,
+                         ids=[type(case[0]).__name__ for case in CASES])
+def test_batch_fit_matches_curve_fit(model, x, centers, spreads):
+    p, y = traces(model, x, centers, spreads, noise=0.02)
+    popt, pcov = batch_fit(model, x, y)
+    assert popt.shape == p.shape and pcov.shape == p.shape+(p.shape[-1],)
+    for i in range(TRACES):
+        ref, ref_cov = curve_fit(model, x, y[i])
+        std = np.sqrt(np.diag(ref_cov))
+        assert np.all(np.abs(popt[i]-ref) <= 1e-3*std+1e-9*np.abs(ref)), (i, popt[i], ref)
+        assert np.allclose(np.sqrt(np.diag(pcov[i])), std, rtol=1e-2)
+
+def test_batch_fit_shared_and_stacked_abscissae():
+    x = np.linspace(20, 3.2e4, 101)
+    _, y = traces(exponential, x, [6e3, 1.0, 0.3], [0.3, 0.2, 0.2], noise=0.02)
+    shared, _  = batch_fit(exponential, x, y)
+    stacked, _ = batch_fit(exponential, np.broadcast_to(x, y.shape), y)
+    assert np.allclose(shared, stacked)
+
+def test_curve_fit_fixed_parameters():
+    x = np.linspace(6.335, 6.345, 201)
+    y = arctan(x, 6.3402, 2e3, 0.0)+0.01*np.random.default_rng(0).standard_normal(x.shape)
+    popt, pcov = curve_fit(arctan, x, y, fixed={'offset': 0})
+    assert popt.shape == (2,) and pcov.shape == (2, 2)
+    assert abs(popt[0]-6.3402) < 1e-5
@@ -0,0 +1,22 @@
+import os
+import sys
+import subprocess
+
+from qualib.bench import IMPORT_BUDGET, import_time
+
+from conftest import ROOT
+
+HEAVY = ('numpy', 'scipy', 'requests', 'nbformat')
+
+def test_heavy_dependencies_imported_on_first_use():
+    env  = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')]))}
+    code = f'import sys, qualib.main; print(" ".join(name for name in {HEAVY!r} if name in sys.modules))'
+    run  = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          env=env, capture_output=True, text=True, check=True)
+    assert run.stdout.split() == []
+    assert 'qualib.main' in run.stderr # Import time report of -X importtime
+
+def test_import_time_within_budget():
+    results = import_time('qualib.main')
+    assert not results['heavy'], results['heavy']
+    assert results['time'] <= IMPORT_BUDGET, f'qualib.main startup: {results["time"]:.3f} s (budget: {IMPORT_BUDGET} s)'
@@ -0,0 +1,34 @@
+import os
+import json
+
+from qualib.main import Qualib
+from qualib.backends import FakeBackend
+from qualib.bench import Synthetic
+from qualib.replay import load_run
+
+from conftest import timestamp
+
+SCHEME = [{'name': 't1_qubit'}, {'name': 'ramsey_t2'}]
+
+def stored_run(assumptions):
+    backend = Synthetic(assumptions['default_path'], points=101)
+    history = Qualib(FakeBackend(backend)).run_all(json.loads(json.dumps(SCHEME)), assumptions, name='stored')
+    return list(history), timestamp('stored')
+
+def test_replay_logs_worker_entries_in_order(workdir):
+    history, stored = stored_run(workdir)
+    replay = Qualib().replay(stored, workers=2)
+    assert json.dumps(list(replay), default=str) == json.dumps(history, default=str)
+    logs = [path for path in os.listdir('logs') if path.endswith('.log') and not path.startswith(stored)]
+    assert len(logs) == 1 # No log file per worker process
+    with open(f'logs/{logs[0]}', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    starts = [i for i, line in enumerate(lines) if 'Importing Calibration class' in line]
+    assert [lines[i].split()[3] for i in starts] == ['t1_qubit:', 'ramsey_t2:']*2 # Pre-processing, then workers
+    assert not any('[ERROR]' in line or '[WARN]' in line for line in lines)
+
+def test_load_run_from_report_journal(workdir):
+    _, stored = stored_run(workdir)
+    scheme, _ = load_run(stored)
+    os.remove(f'logs/{stored}.scheme.json') # Run without checkpoint
+    assert load_run(stored)[0] == scheme == SCHEME
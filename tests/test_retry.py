@@ -0,0 +1,70 @@
+import os
+import json
+
+from qualib.log import Log
+from qualib.main import Qualib
+from qualib.backends import FakeBackend
+from qualib.bench import Synthetic
+from qualib.retry import FitQualityError, process
+from qualib.calibrations.default import DefaultCalibration
+
+class Stub:
+    """Calibration whose ``process`` fails after the analysis code (as in a
+    Calibration class, after ``super().process()``) until ``failures`` is 0.
+    """
+
+    def __init__(self, hdf5_path, failures, alternatives=2):
+        self.log       = Log().initialize('test')
+        self.pre       = 'stub:'
+        self.hdf5_path = hdf5_path
+        self.failures  = failures
+        self.mappings  = [{'{GUESS}': str(i)} for i in range(alternatives)]
+        self.analyses  = 0
+        self.budgets   = 0
+
+    def process(self):
+        self.analyses += 1
+        if self.failures:
+            self.failures -= 1
+            raise FitQualityError('Standard deviation too large')
+
+    def alternatives(self):
+        return self.mappings
+
+    def reanalyze(self, mapping):
+        self.process()
+
+    def adjust_budget(self):
+        self.budgets += 1
+
+def test_budget_adjusted_once_after_reanalysis(tmp_path):
+    open(tmp_path/'a.h5', 'w').close()
+    calibration = Stub(str(tmp_path/'a.h5'), failures=2)
+    process(calibration)
+    assert calibration.analyses == 3 and calibration.budgets == 1
+
+def test_budget_not_adjusted_after_failed_analyses(tmp_path):
+    open(tmp_path/'a.h5', 'w').close()
+    calibration = Stub(str(tmp_path/'a.h5'), failures=3)
+    try:
+        process(calibration)
+    except FitQualityError:
+        pass
+    else:
+        assert False, 'FitQualityError not raised'
+    assert calibration.analyses == 3 and calibration.budgets == 0
+
+def test_other_failures_run_again(workdir, monkeypatch):
+    calls = []
+    handle_substitutions = DefaultCalibration.handle_substitutions
+    def fail_once(self):
+        calls.append(self.name)
+        if len(calls) == 1:
+            raise KeyError('SUBSTITUTION') # Before the measurement: 'other' failure
+        return handle_substitutions(self)
+    monkeypatch.setattr(DefaultCalibration, 'handle_substitutions', fail_once)
+    workdir['retries'] = 1
+    backend = FakeBackend(Synthetic(workdir['default_path'], points=101))
+    history = Qualib(backend).run_all(json.loads(json.dumps([{'name': 't1_qubit'}])), workdir)
+    assert calls == ['t1_qubit', 't1_qubit'] and len(backend.jobs) == 1
+    assert history[0]['qubit']['T1'] != workdir['qubit']['T1']
@@ -0,0 +1,49 @@
+import json
+import time
+import builtins
+
+from qualib.main import Qualib
+from qualib.backends import FakeBackend
+from qualib.bench import Synthetic
+from qualib.calibrations import default
+
+from conftest import snapshot, timestamp
+
+def rabi(pulse, name):
+    return {'name': 'rabi', 'substitutions': {'NAME': name, 'PULSE': pulse, 'TYPE': pulse}}
+
+SCHEME = [
+    {'name': 'spectro_ro', 'substitutions': {'NAME': 'circle_fit', 'TYPE': 'circle fit', '$flux': '0.1'}},
+    rabi('unconditional_pi2_pulse', 'pi2'),
+    {'name': 't1_qubit'},
+    rabi('unconditional_pi_pulse', 'pi'),
+    {'name': 'ramsey_t2'},
+    rabi('conditional_pi_pulse', 'cpi'),
+    {'name': 'spectro_ro', 'substitutions': {'NAME': 'phase_only', 'TYPE': 'phase only'}}
+]
+
+def run(assumptions, name, **options):
+    backend = Synthetic(assumptions['default_path'], points=101)
+    history = Qualib(FakeBackend(backend)).run_all(json.loads(json.dumps(SCHEME)), assumptions,
+                                                   name=name, **options)
+    return list(history), snapshot(timestamp(name))
+
+def test_workers_identical_to_serial(workdir):
+    serial   = run(workdir, 'serial')
+    parallel = run(workdir, 'workers', workers=3)
+    assert json.dumps(parallel[0], default=str) == json.dumps(serial[0], default=str)
+    assert parallel[1] == serial[1] # History and report
+
+def test_independent_analyses_overlap(workdir, monkeypatch):
+    running, overlap = [], []
+    def slow_exec(code, globals, locals):
+        running.append(code)
+        overlap.append(len(running))
+        try:
+            time.sleep(0.2)
+            return builtins.exec(code, globals, locals)
+        finally:
+            running.remove(code)
+    monkeypatch.setattr(default, 'exec', slow_exec, raising=False) # Kernel.start and Kernel.run
+    run(workdir, 'workers', workers=3)
+    assert max(overlap) > 1